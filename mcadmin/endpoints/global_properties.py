@@ -43,18 +43,28 @@ async def global_properties_update(request: web.Request):
 
     post_data = await request.post()
 
-    properties = {key: value for key, value in post_data.items()}
+    properties = {key: value for key, value in post_data.items() if key != "restart"}
+    restart = post_data.get("restart", "now")
     whitelist = properties.get("enforce-whitelist", None)
 
-    if whitelist:
+    if whitelist is not None:
         properties["white-list"] = whitelist
 
+    if restart not in ("now", "idle"):
+        return web.json_response({"status": "error", "message": "Invalid restart mode"}, status=400)
+
     try:
         instances_service.validate_properties(properties)
 
-        await instances_service.set_properties(properties)
+        applied = await instances_service.set_properties(properties, restart=restart)
     except Exception as e:
         logger.exception(f"Failed to update global properties ({e})")
         return web.json_response({"status": "error", "message": f"Failed to update global properties ({e})"}, status=500)
 
-    return web.json_response({"status": "success", "message": "Global properties updated successfully"})
+    messages = {
+        "applied": "Global properties updated and applied without restart",
+        "restarted": "Global properties updated, server restarted",
+        "restart_pending": "Global properties updated, server will restart once no players are online",
+    }
+
+    return web.json_response({"status": "success", "message": messages.get(applied, "Global properties updated successfully")})
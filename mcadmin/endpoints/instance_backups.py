@@ -1,9 +1,11 @@
 import logging
 import aiohttp_jinja2
 from aiohttp import web
-from mcadmin.utils.web import get_di
+from mcadmin.utils.web import get_di, stream_tar_response
+from mcadmin.libraries.tar_stream import TarStream
 from mcadmin.services.instances import InstancesService
-from mcadmin.utils.validate import require_roles
+from mcadmin.utils.validate import validate_request, require_roles
+from mcadmin.schemas.instances import RestoreBackupPartialSchema
 
 instance_backups_routes = web.RouteTableDef()
 logger = logging.getLogger(__name__)
@@ -54,6 +56,7 @@ async def instance_backups_get(request: web.Request):
                 "created_at": str(b.created_at),
                 "type": b.type,
                 "server_version": b.metadata.get("instance", {}).get("server_version", ""),
+                "stats": b.metadata.get("stats", {}),
             }
         )
 
@@ -133,3 +136,105 @@ async def instance_backup_restore(request: web.Request):
         return web.json_response({"status": "error", "message": "Failed to restore backup"}, status=500)
 
     return web.json_response({"status": "success", "message": "Backup successfully restored"})
+
+
+@instance_backups_routes.get("/api/instances/{instance_id}/backups/{backup_id}/contents")
+@require_roles(["user", "admin"])
+async def instance_backup_contents_get(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    instance_id = int(request.match_info.get("instance_id", 0))
+    backup_id = int(request.match_info.get("backup_id", 0))
+    prefix = request.query.get("path", "")
+
+    instance = await instances_service.get_instance(id=instance_id)
+
+    if not instance:
+        return web.json_response({"status": "error", "message": "Instance not found"}, status=404)
+
+    backup = await instances_service.get_backup(instance, backup_id)
+
+    if not backup:
+        return web.json_response({"status": "error", "message": "Backup not found"}, status=404)
+
+    try:
+        contents = await instances_service.list_backup_contents(instance, backup, prefix=prefix)
+    except Exception as e:
+        logger.error(f"Error listing backup {backup.id} contents for instance {instance.id}: {e}")
+        return web.json_response({"status": "error", "message": "Failed to list backup contents"}, status=500)
+
+    return web.json_response(contents)
+
+
+@instance_backups_routes.post("/api/instances/{instance_id}/backups/{backup_id}/restore-partial")
+@require_roles(["user", "admin"])
+@validate_request(RestoreBackupPartialSchema)
+async def instance_backup_restore_partial(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    post_data = await request.post()
+
+    instance_id = int(request.match_info.get("instance_id", 0))
+    backup_id = int(request.match_info.get("backup_id", 0))
+    paths = [p.strip() for p in str(post_data.get("paths", "")).split(",") if p.strip()]
+    dimension = str(post_data.get("dimension", ""))
+    chunk_from = post_data.get("chunk_from", None)
+    chunk_to = post_data.get("chunk_to", None)
+
+    instance = await instances_service.get_instance(id=instance_id)
+
+    if not instance:
+        return web.json_response({"status": "error", "message": "Instance not found"}, status=404)
+
+    backup = await instances_service.get_backup(instance, backup_id)
+
+    if not backup:
+        return web.json_response({"status": "error", "message": "Backup not found"}, status=404)
+
+    try:
+        await instances_service.restore_backup_partial(
+            instance,
+            backup,
+            paths=paths,
+            dimension=dimension,
+            chunk_from=tuple(int(c) for c in str(chunk_from).split(",")) if chunk_from else None,  # type: ignore
+            chunk_to=tuple(int(c) for c in str(chunk_to).split(",")) if chunk_to else None,  # type: ignore
+        )
+    except Exception as e:
+        logger.error(f"Error partially restoring backup {backup.id} for instance {instance.id}: {e}")
+        return web.json_response({"status": "error", "message": f"Failed to restore backup ({e})"}, status=500)
+
+    return web.json_response({"status": "success", "message": "Backup successfully restored"})
+
+
+@instance_backups_routes.get("/api/instances/{instance_id}/backups/{backup_id}/download")
+@require_roles(["user", "admin"])
+async def instance_backup_download(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    instance_id = int(request.match_info.get("instance_id", 0))
+    backup_id = int(request.match_info.get("backup_id", 0))
+
+    instance = await instances_service.get_instance(id=instance_id)
+
+    if not instance:
+        return web.json_response({"status": "error", "message": "Instance not found"}, status=404)
+
+    backup = await instances_service.get_backup(instance, backup_id)
+
+    if not backup:
+        return web.json_response({"status": "error", "message": "Backup not found"}, status=404)
+
+    try:
+        (archive_path, members) = instances_service.get_backup_download(instance, backup)
+    except Exception as e:
+        logger.error(f"Error downloading backup {backup.id} for instance {instance.id}: {e}")
+        return web.json_response({"status": "error", "message": "Failed to download backup"}, status=500)
+
+    filename = f"instance-{instance.id}-backup-{backup.id}"
+
+    # archive backups are already a single file, serve them as is
+    if archive_path:
+        return web.FileResponse(archive_path, headers={"Content-Disposition": f'attachment; filename="{filename}.tar.zst"'})
+
+    return await stream_tar_response(request, TarStream(members), filename=f"{filename}.tar")
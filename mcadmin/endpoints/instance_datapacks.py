@@ -1,9 +1,9 @@
 import logging
 import aiohttp_jinja2
 from aiohttp import web
-from mcadmin.utils.web import get_di, get_filename
+from mcadmin.utils.web import get_di, get_filename, get_max_upload_size, read_multipart
 from mcadmin.services.instances import InstancesService
-from mcadmin.utils.validate import validate_request, require_roles
+from mcadmin.utils.validate import validate_data, require_roles
 from mcadmin.schemas.instances import AddInstanceDatapackSchema
 
 instance_datapacks_routes = web.RouteTableDef()
@@ -52,6 +52,12 @@ async def instance_datapacks_get(request: web.Request):
     if not datapacks:
         return web.json_response([])
 
+    try:
+        issues = await instances_service.check_datapacks(instance, datapacks)
+    except Exception as e:
+        logger.error(f"Error checking datapacks for instance {instance.id}: {e}")
+        issues = {}
+
     datapacks_list = []
 
     for b in datapacks:
@@ -60,6 +66,10 @@ async def instance_datapacks_get(request: web.Request):
                 "id": b.id,
                 "name": b.name,
                 "enabled": b.enabled,
+                "pack_format": b.pack_format,
+                "description": b.description or "",
+                "namespaces": b.namespaces or [],
+                "issues": issues.get(b.id, []),
                 "added_at": str(b.added_at),
                 "modified_at": str(b.modified_at),
             }
@@ -70,14 +80,10 @@ async def instance_datapacks_get(request: web.Request):
 
 @instance_datapacks_routes.post("/api/instances/{instance_id}/datapacks")
 @require_roles(["user", "admin"])
-@validate_request(AddInstanceDatapackSchema)
 async def instance_datapack_add(request: web.Request):
     instances_service: InstancesService = get_di(request).instances_service
 
-    post_data = await request.post()
-
     instance_id = int(request.match_info.get("instance_id", 0))
-    datapack_archive = post_data.get("datapack_archive", None)
 
     instance = await instances_service.get_instance(id=instance_id)
 
@@ -87,18 +93,29 @@ async def instance_datapack_add(request: web.Request):
     if not "datapacks" in instances_service.get_server_capabilities(instance.server_type):
         return web.json_response({"status": "error", "message": "Datapacks are not supported for this instance type"}, status=403)
 
-    if not datapack_archive or not isinstance(datapack_archive, web.FileField):
-        return web.json_response({"status": "error", "message": "No datapack archive provided"}, status=403)
+    datapack_upload = instances_service.create_datapack_upload(instance, max_size=get_max_upload_size(request))
 
     try:
-        await instances_service.add_datapack(
+        post_data = await read_multipart(request, {"datapack_archive": datapack_upload})
+        validate_data(AddInstanceDatapackSchema, post_data)
+
+        datapack = await instances_service.add_datapack(
             instance,
-            datapack_archive=datapack_archive.file,
-            name=get_filename(datapack_archive, strip_ext=True),
+            datapack_upload=datapack_upload,
+            name=get_filename(post_data["datapack_archive"], strip_ext=True),
         )
+
+        issues = (await instances_service.check_datapacks(instance, [datapack]))[datapack.id]
+    except ValueError as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=403)
     except Exception as e:
         logger.error(f"Error adding datapack for instance {instance.id}: {e}")
         return web.json_response({"status": "error", "message": "Failed to add datapack"}, status=500)
+    finally:
+        await datapack_upload.discard()
+
+    if issues:
+        return web.json_response({"status": "success", "message": f"Datapack added with warnings: {'; '.join(issues)}"})
 
     return web.json_response({"status": "success", "message": "Datapack successfully added"})
 
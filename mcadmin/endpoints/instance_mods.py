@@ -1,9 +1,9 @@
 import logging
 import aiohttp_jinja2
 from aiohttp import web
-from mcadmin.utils.web import get_di, get_filename
+from mcadmin.utils.web import get_di, get_filename, get_max_upload_size, read_multipart
 from mcadmin.services.instances import InstancesService
-from mcadmin.utils.validate import validate_request, require_roles
+from mcadmin.utils.validate import validate_data, require_roles
 from mcadmin.schemas.instances import AddInstanceModSchema
 
 instance_mods_routes = web.RouteTableDef()
@@ -52,14 +52,26 @@ async def instance_mods_get(request: web.Request):
     if not mods:
         return web.json_response([])
 
+    try:
+        metadata = await instances_service.get_mods_metadata(instance, mods)
+    except Exception as e:
+        logger.error(f"Error reading mods metadata for instance {instance.id}: {e}")
+        metadata = {}
+
     mods_list = []
 
     for b in mods:
+        mod_metadata = metadata.get(b.sha256)
+
         mods_list.append(
             {
                 "id": b.id,
                 "name": b.name,
                 "enabled": b.enabled,
+                "mod_id": mod_metadata.mod_id if mod_metadata else "",
+                "version": mod_metadata.version if mod_metadata else "",
+                "loader": mod_metadata.loader if mod_metadata else "",
+                "mc_versions": mod_metadata.mc_versions if mod_metadata else "",
                 "added_at": str(b.added_at),
                 "modified_at": str(b.modified_at),
             }
@@ -68,16 +80,36 @@ async def instance_mods_get(request: web.Request):
     return web.json_response(mods_list)
 
 
+@instance_mods_routes.get("/api/instances/{instance_id}/mods/check")
+@require_roles(["user", "admin"])
+async def instance_mods_check(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    instance_id = int(request.match_info.get("instance_id", 0))
+
+    instance = await instances_service.get_instance(id=instance_id)
+
+    if not instance:
+        return web.json_response({"status": "error", "message": "Instance not found"}, status=404)
+
+    if not "mods" in instances_service.get_server_capabilities(instance.server_type):
+        return web.json_response({"status": "error", "message": "Mods are not supported for this instance type"}, status=403)
+
+    try:
+        issues = await instances_service.check_mods(instance)
+    except Exception as e:
+        logger.error(f"Error checking mods for instance {instance.id}: {e}")
+        return web.json_response({"status": "error", "message": "Failed to check mods"}, status=500)
+
+    return web.json_response({"issues": issues})
+
+
 @instance_mods_routes.post("/api/instances/{instance_id}/mods")
 @require_roles(["user", "admin"])
-@validate_request(AddInstanceModSchema)
 async def instance_mod_add(request: web.Request):
     instances_service: InstancesService = get_di(request).instances_service
 
-    post_data = await request.post()
-
     instance_id = int(request.match_info.get("instance_id", 0))
-    mod_jar = post_data.get("mod_jar", None)
 
     instance = await instances_service.get_instance(id=instance_id)
 
@@ -87,18 +119,24 @@ async def instance_mod_add(request: web.Request):
     if not "mods" in instances_service.get_server_capabilities(instance.server_type):
         return web.json_response({"status": "error", "message": "Mods are not supported for this instance type"}, status=403)
 
-    if not mod_jar or not isinstance(mod_jar, web.FileField):
-        return web.json_response({"status": "error", "message": "No mod jar provided"}, status=403)
+    mod_upload = instances_service.create_mod_upload(instance, max_size=get_max_upload_size(request))
 
     try:
+        post_data = await read_multipart(request, {"mod_jar": mod_upload})
+        validate_data(AddInstanceModSchema, post_data)
+
         await instances_service.add_mod(
             instance,
-            mod_jar=mod_jar.file,
-            name=get_filename(mod_jar, strip_ext=True),
+            mod_upload=mod_upload,
+            name=get_filename(post_data["mod_jar"], strip_ext=True),
         )
+    except ValueError as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=403)
     except Exception as e:
         logger.error(f"Error adding mod for instance {instance.id}: {e}")
         return web.json_response({"status": "error", "message": "Failed to add mod"}, status=500)
+    finally:
+        await mod_upload.discard()
 
     return web.json_response({"status": "success", "message": "Mod successfully added"})
 
@@ -1,11 +1,14 @@
 import logging
+import asyncio
 import json
 from aiohttp import web
 from packaging import version
-from mcadmin.utils.web import get_di
-from mcadmin.utils.validate import validate_request, require_roles
+from mcadmin.utils.web import get_di, get_max_upload_size, read_multipart, stream_tar_response, drain_queue_into_websocket
+from mcadmin.libraries.tar_stream import TarStream
+from mcadmin.libraries.queue_dispatcher import QueueDispatcher
+from mcadmin.utils.validate import validate_request, validate_data, require_roles
 from mcadmin.services.instances import InstancesService
-from mcadmin.schemas.instances import CreateInstanceSchema, UpdateInstanceSchema
+from mcadmin.schemas.instances import CreateInstanceSchema, CreateWorldUploadSchema, UpdateInstanceSchema
 
 instances_routes = web.RouteTableDef()
 logger = logging.getLogger(__name__)
@@ -65,45 +68,160 @@ async def active_instance_get(request: web.Request):
 
 @instances_routes.post("/api/instances")
 @require_roles(["user", "admin"])
-@validate_request(CreateInstanceSchema)
 async def instance_create(request: web.Request):
     instances_service: InstancesService = get_di(request).instances_service
 
-    post_data = await request.post()
+    world_upload = instances_service.create_world_upload(max_size=get_max_upload_size(request))
+
+    try:
+        post_data = await read_multipart(request, {"world_archive": world_upload})
+        validate_data(CreateInstanceSchema, post_data)
+    except ValueError as e:
+        await world_upload.discard()
+        return web.json_response({"status": "error", "message": str(e)}, status=403)
 
     name = str(post_data.get("name", ""))
     server_version = str(post_data.get("server_version", ""))
     server_type = str(post_data.get("server_type", "vanilla"))
-    world_archive = post_data.get("world_archive", None)
+    world_upload_id = str(post_data.get("world_upload_id", ""))
 
-    min_version = instances_service.get_min_server_version()
+    world_source = world_upload if post_data.get("world_archive") else None
+    world_session = None
 
-    if version.parse(server_version) < version.parse(min_version):
-        return web.json_response({"status": "error", "message": f"Server version must be {min_version} or greater"}, status=403)
+    try:
+        min_version = instances_service.get_min_server_version()
+
+        if version.parse(server_version) < version.parse(min_version):
+            return web.json_response({"status": "error", "message": f"Server version must be {min_version} or greater"}, status=403)
+
+        # world archives sent through a resumable upload are finalized here
+        if not world_source and world_upload_id:
+            try:
+                world_session = await instances_service.get_upload_session(world_upload_id)
+            except Exception as e:
+                return web.json_response({"status": "error", "message": f"World upload not found ({e})"}, status=404)
+
+            if not world_session.completed:
+                return web.json_response({"status": "error", "message": "World upload is not completed"}, status=403)
+
+            world_source = world_session
+
+        if not world_source:
+            properties = json.loads(str(post_data.get("properties", "{}")))
+        else:
+            properties = {}
+
+        try:
+            instances_service.validate_properties(properties)
+
+            instance = await instances_service.create_instance(
+                name=name,
+                server_version=server_version,
+                server_type=server_type,
+                properties=properties,
+                world_upload=world_source,
+            )
+        except Exception as e:
+            logger.exception(f"Failed to create instance '{name}' ({e})")
+            return web.json_response({"status": "error", "message": f"Failed to create instance ({e})"}, status=500)
+    finally:
+        await world_upload.discard()
+
+    if world_session:
+        await world_session.discard()
+
+    logger.info(f"Instance '{instance.id}' created successfully")
+    return web.json_response({"status": "success", "message": "Instance created successfully"})
 
-    if not world_archive or not isinstance(world_archive, web.FileField):
-        properties = json.loads(str(post_data.get("properties", "{}")))
-        world_archive = None
-    else:
-        properties = {}
-        world_archive = world_archive.file
+
+@instances_routes.post("/api/world-uploads")
+@require_roles(["user", "admin"])
+@validate_request(CreateWorldUploadSchema)
+async def world_upload_create(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    post_data = await request.post()
+
+    filename = str(post_data.get("filename", ""))
+    size = int(str(post_data.get("size", 0)))
+    max_size = get_di(request).web_server_config["max_world_upload_size"] * 1024 * 1024
 
     try:
-        instances_service.validate_properties(properties)
-
-        instance = await instances_service.create_instance(
-            name=name,
-            server_version=server_version,
-            server_type=server_type,
-            properties=properties,
-            world_archive=world_archive,
-        )
+        session = await instances_service.create_upload_session(filename=filename, size=size, max_size=max_size)
     except Exception as e:
-        logger.exception(f"Failed to create instance '{name}' ({e})")
-        return web.json_response({"status": "error", "message": f"Failed to create instance ({e})"}, status=500)
+        logger.error(f"Failed to create world upload ({e})")
+        return web.json_response({"status": "error", "message": f"Failed to create world upload ({e})"}, status=403)
 
-    logger.info(f"Instance '{instance.id}' created successfully")
-    return web.json_response({"status": "success", "message": "Instance created successfully"})
+    return web.json_response(
+        {"status": "success", "upload_id": session.id, "offset": 0, "size": session.size},
+        headers={"Upload-Offset": "0", "Upload-Length": str(session.size)},
+    )
+
+
+@instances_routes.get("/api/world-uploads/{upload_id}")
+@require_roles(["user", "admin"])
+async def world_upload_get(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    upload_id = request.match_info.get("upload_id", "")
+
+    try:
+        session = await instances_service.get_upload_session(upload_id)
+    except Exception:
+        return web.json_response({"status": "error", "message": "World upload not found"}, status=404)
+
+    offset = session.offset
+
+    return web.json_response(
+        {"upload_id": session.id, "filename": session.filename, "offset": offset, "size": session.size, "completed": session.completed},
+        headers={"Upload-Offset": str(offset), "Upload-Length": str(session.size), "Cache-Control": "no-store"},
+    )
+
+
+@instances_routes.patch("/api/world-uploads/{upload_id}")
+@require_roles(["user", "admin"])
+async def world_upload_patch(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    upload_id = request.match_info.get("upload_id", "")
+    offset = request.headers.get("Upload-Offset", "")
+
+    if request.content_type != "application/offset+octet-stream":
+        return web.json_response({"status": "error", "message": "Content type must be application/offset+octet-stream"}, status=415)
+
+    if not offset.isdigit():
+        return web.json_response({"status": "error", "message": "Missing Upload-Offset header"}, status=400)
+
+    try:
+        session = await instances_service.get_upload_session(upload_id)
+    except Exception:
+        return web.json_response({"status": "error", "message": "World upload not found"}, status=404)
+
+    try:
+        new_offset = await session.append(int(offset), request.content.iter_chunked(1024 * 1024))
+    except ValueError as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=409, headers={"Upload-Offset": str(session.offset)})
+
+    return web.json_response(
+        {"status": "success", "offset": new_offset, "completed": new_offset == session.size},
+        headers={"Upload-Offset": str(new_offset)},
+    )
+
+
+@instances_routes.delete("/api/world-uploads/{upload_id}")
+@require_roles(["user", "admin"])
+async def world_upload_delete(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    upload_id = request.match_info.get("upload_id", "")
+
+    try:
+        session = await instances_service.get_upload_session(upload_id)
+        await session.discard()
+    except Exception:
+        return web.json_response({"status": "error", "message": "World upload not found"}, status=404)
+
+    return web.json_response({"status": "success", "message": "World upload successfully deleted"})
 
 
 @instances_routes.post("/api/instances/{instance_id}")
@@ -178,3 +296,50 @@ async def instance_activate(request: web.Request):
 
     logger.info(f"Instance '{instance_id}' activated successfully")
     return web.json_response({"status": "success", "message": "Instance activated successfully"})
+
+
+@instances_routes.get("/api/instances/{instance_id}/export")
+@require_roles(["user", "admin"])
+async def instance_export(request: web.Request):
+    instances_service: InstancesService = get_di(request).instances_service
+
+    instance_id = int(request.match_info.get("instance_id", 0))
+
+    instance = await instances_service.get_instance(id=instance_id)
+
+    if not instance:
+        return web.json_response({"status": "error", "message": "Instance not found"}, status=404)
+
+    async with instances_service.export_instance(instance) as members:
+        return await stream_tar_response(request, TarStream(members), filename=f"instance-{instance.id}.tar")
+
+
+@instances_routes.get("/ws/instances/import")
+@require_roles(["user", "admin"])
+async def import_ws(request: web.Request) -> web.WebSocketResponse:
+    ev_dispatcher: QueueDispatcher = get_di(request).mc_server_ev_dispatcher
+    ws = web.WebSocketResponse(heartbeat=30, compress=True)
+
+    await ws.prepare(request)
+
+    request.app["websockets"].add(ws)
+
+    q = ev_dispatcher.subscribe("import")
+    listener_task = asyncio.create_task(drain_queue_into_websocket(q, ws))
+
+    try:
+        async for msg in ws:
+            if msg.type == web.WSMsgType.ERROR:
+                logger.error(f"WebSocket connection closed with exception {ws.exception()}")
+                break
+    except Exception as e:
+        logger.exception(f"Error in WebSocket import stream: {e}")
+    finally:
+        request.app["websockets"].remove(ws) if ws in request.app["websockets"] else None
+        await ws.close() if not ws.closed else None
+
+        listener_task.cancel()
+        await asyncio.gather(listener_task, return_exceptions=True)
+        ev_dispatcher.unsubscribe(q)
+
+    return ws
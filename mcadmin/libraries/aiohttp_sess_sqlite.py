@@ -1,5 +1,8 @@
+import time
 import uuid
-import random
+import logging
+import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from aiohttp_session import AbstractStorage, Session
 from aiohttp import web
@@ -9,8 +12,12 @@ from user_agents import parse as parse_ua
 
 __all__ = ["SqliteTortoiseStorage"]
 
+logger = logging.getLogger(__name__)
+
 
 class SqliteTortoiseStorage(AbstractStorage):
+    """Session storage backed by a Tortoise model. Loaded sessions are kept in an LRU cache for cache_ttl seconds and
+    writes only touching last_activity are coalesced, reaching the database at most every flush_interval seconds"""
 
     def __init__(
         self,
@@ -18,17 +25,29 @@ class SqliteTortoiseStorage(AbstractStorage):
         *,
         match_ip: bool = False,
         match_user_agent: bool = True,
+        cache_size: int = 1024,
+        cache_ttl: int = 60,
+        flush_interval: int = 60,
+        gc_interval: int = 3600,
+        gc_batch_size: int = 500,
         **kwargs,
     ) -> None:
         self._sess_model: Type[TortoiseModel] = session
         self.match_ip = match_ip
         self.match_user_agent = match_user_agent
+        self._cache_size: int = cache_size
+        self._cache_ttl: int = cache_ttl
+        self._flush_interval: int = flush_interval
+        self._gc_interval: int = gc_interval
+        self._gc_batch_size: int = gc_batch_size
+        self._gc_task: asyncio.Task | None = None
+
+        # token -> cached row, least recently used first
+        self._cache: OrderedDict[str, dict] = OrderedDict()
 
         super().__init__(**kwargs)
 
     async def load_session(self, request: web.Request) -> Session:
-        await self._sess_gc()
-
         cookie = request.cookies.get(self.cookie_name)
 
         if cookie is None:
@@ -36,28 +55,28 @@ class SqliteTortoiseStorage(AbstractStorage):
 
         token = str(cookie)
 
-        row = await self._sess_model.get_or_none(token=token)
+        entry = await self._cache_get(token)
 
-        if not row:
+        if not entry:
             return Session(None, data=None, new=True, max_age=self.max_age)
 
-        if row.expiry and row.expiry < datetime.now(timezone.utc):  # type: ignore
-            await row.delete()
+        if entry["expiry"] and entry["expiry"] < datetime.now(timezone.utc):
+            await self._delete(token)
             return Session(None, data=None, new=True, max_age=self.max_age)
 
         # match ip
-        if self.match_ip and row.ip != self._get_ip(request):  # type: ignore
-            await row.delete()
+        if self.match_ip and entry["ip"] != self._get_ip(request):
+            await self._delete(token)
             return Session(None, data=None, new=True, max_age=self.max_age)
 
         # match user agent
-        if self.match_user_agent and row.user_agent != request.headers.get("User-Agent", "unknown"):  # type: ignore
-            await row.delete()
+        if self.match_user_agent and entry["user_agent"] != request.headers.get("User-Agent", "unknown"):
+            await self._delete(token)
             return Session(None, data=None, new=True, max_age=self.max_age)
 
-        data = self._decoder(row.data)  # type: ignore
+        data = self._decoder(entry["pending"] or entry["data"])
 
-        return Session(token, data=data, new=False, max_age=self.max_age)  # type: ignore
+        return Session(token, data=data, new=False, max_age=self.max_age)
 
     async def save_session(self, request: web.Request, response: web.StreamResponse, session: Session) -> None:
         token = session.identity
@@ -88,13 +107,165 @@ class SqliteTortoiseStorage(AbstractStorage):
 
             if session.empty:
                 self.save_cookie(response, "", max_age=session.max_age)
-                await self._sess_model.filter(token=token).delete()
+                await self._delete(token)
+            else:
+                await self._update(token, sess_data.get("user_id", 0), data_str)
+
+    async def flush(self) -> None:
+        """Write the coalesced session changes not yet written to the database"""
+        for token, entry in list(self._cache.items()):
+            if entry["pending"]:
+                await self._write(token, entry)
+
+    def invalidate(self, *, user_id: int | None = None, session_id: int | None = None) -> None:
+        """Drop cached sessions deleted or changed outside of the storage (all of them when no filter is given)"""
+        for token, entry in list(self._cache.items()):
+            if user_id is not None and entry["user_id"] != user_id:
+                continue
+
+            if session_id is not None and entry["id"] != session_id:
+                continue
+
+            del self._cache[token]
+
+    async def start_gc(self) -> None:
+        if self._gc_task and not self._gc_task.done():
+            return
+
+        logger.info("Starting sessions garbage collector")
+
+        self._gc_task = asyncio.create_task(self._run_gc())
+
+    async def stop_gc(self) -> None:
+        if not self._gc_task or self._gc_task.done():
+            return
+
+        logger.info("Stopping sessions garbage collector")
+
+        self._gc_task.cancel()
+        await asyncio.gather(self._gc_task, return_exceptions=True)
+        self._gc_task = None
+
+    async def purge_expired(self) -> int:
+        """Delete the expired sessions in batches of gc_batch_size rows. Returns the number of purged sessions"""
+        now = datetime.now(timezone.utc)
+        purged = 0
+
+        for token, entry in list(self._cache.items()):
+            if entry["expiry"] and entry["expiry"] < now:
+                del self._cache[token]
+
+        while True:
+            # served by the expiry index, each batch keeps the database lock short
+            ids = await self._sess_model.filter(expiry__lt=now).limit(self._gc_batch_size).values_list("id", flat=True)
+
+            if not ids:
+                break
+
+            await self._sess_model.filter(id__in=ids).delete()
+            purged += len(ids)
+
+            # let requests waiting on the database through between batches
+            await asyncio.sleep(0)
+
+        return purged
+
+    async def _run_gc(self) -> None:
+        while True:
+            try:
+                purged = await self.purge_expired()
+            except Exception as e:
+                logger.exception(f"Sessions garbage collection failed ({e})")
             else:
-                await self._sess_model.filter(token=token).update(user_id=sess_data.get("user_id", 0), data=data_str, updated_at=datetime.now(timezone.utc))
+                if purged:
+                    logger.info(f"Purged {purged} expired session(s)")
+
+            await asyncio.sleep(self._gc_interval)
+
+    async def _cache_get(self, token: str) -> dict | None:
+        entry = self._cache.get(token)
+
+        if entry and time.monotonic() - entry["cached_at"] < self._cache_ttl:
+            self._cache.move_to_end(token)
+            return entry
+
+        # expired entries are reloaded, without losing their coalesced changes
+        if entry:
+            del self._cache[token]
+
+            if entry["pending"]:
+                await self._write(token, entry)
+
+        row = await self._sess_model.get_or_none(token=token)
+
+        if not row:
+            return None
+
+        entry = {
+            "id": row.id,  # type: ignore
+            "user_id": row.user_id,  # type: ignore
+            "ip": row.ip,  # type: ignore
+            "user_agent": row.user_agent,  # type: ignore
+            "expiry": row.expiry,  # type: ignore
+            "data": row.data,  # type: ignore
+            "pending": None,
+            "flushed_at": time.monotonic(),
+            "cached_at": time.monotonic(),
+        }
+
+        if self._cache_size > 0:
+            self._cache[token] = entry
+
+            while len(self._cache) > self._cache_size:
+                (evicted_token, evicted) = self._cache.popitem(last=False)
+
+                if evicted["pending"]:
+                    await self._write(evicted_token, evicted)
+
+        return entry
+
+    async def _update(self, token: str, user_id: int, data_str: str) -> None:
+        entry = self._cache.get(token)
+
+        if not entry:
+            await self._sess_model.filter(token=token).update(user_id=user_id, data=data_str, updated_at=datetime.now(timezone.utc))
+            return
+
+        # unchanged sessions are not written at all
+        if data_str == (entry["pending"] or entry["data"]) and user_id == entry["user_id"]:
+            return
+
+        entry["user_id"] = user_id
+        entry["pending"] = data_str
+
+        # activity only changes are written at most every flush_interval seconds
+        if self._strip_activity(data_str) == self._strip_activity(entry["data"]) and time.monotonic() - entry["flushed_at"] < self._flush_interval:
+            return
+
+        await self._write(token, entry)
+
+    async def _write(self, token: str, entry: dict) -> None:
+        data_str = entry["pending"]
+
+        entry["pending"] = None
+        entry["flushed_at"] = time.monotonic()
+
+        await self._sess_model.filter(token=token).update(user_id=entry["user_id"], data=data_str, updated_at=datetime.now(timezone.utc))
+
+        entry["data"] = data_str
+
+    async def _delete(self, token: str) -> None:
+        self._cache.pop(token, None)
+
+        await self._sess_model.filter(token=token).delete()
+
+    def _strip_activity(self, data_str: str) -> dict:
+        data = self._decoder(data_str)
+
+        if isinstance(data.get("session"), dict):
+            data["session"] = {k: v for k, v in data["session"].items() if k != "last_activity"}
 
-    async def _sess_gc(self) -> None:
-        if random.randint(1, 100) == 1:
-            await self._sess_model.filter(expiry__lt=datetime.now(timezone.utc)).delete()
+        return data
 
     def _ua_to_device(self, user_agent: str) -> str:
         if not user_agent:
@@ -1,7 +1,12 @@
 from .runner import McServerRunner
 from .instances_manager import McServerInstMgr
+from .upload import McServerUpload, McServerUploadSession
+from .mod import McServerModError
 
 __all__ = [
     "McServerRunner",
     "McServerInstMgr",
+    "McServerUpload",
+    "McServerUploadSession",
+    "McServerModError",
 ]
@@ -1,9 +1,18 @@
+import ctypes
+import io
+import json
 import logging
 import os
 import asyncio
+import posixpath
 import shutil
-import json
+import tarfile
+import time
 import aiofiles
+import zstandard
+from .copier import McServerCopier
+from .mod_store import McServerModStore
+from .region import McServerRegionFile
 
 
 __all__ = [
@@ -21,28 +30,253 @@ class McServerBackupError(Exception):
 class McServerBackup:
     """Low level Minecraft server backup manager"""
 
+    # backed up along the world and data dirs of the server type
     backup_targets: list[tuple[str, str]] = [
-        ("world", "dir"),
         ("mods", "dir"),
         ("server_info.json", "file"),
     ]
 
-    def __init__(self, instance_dir: str, backups_dir: str) -> None:
+    backup_formats: list[str] = ["dir", "archive"]
+
+    archive_ext: str = ".tar.zst"
+
+    staging_dir: str = ".restore"
+
+    # with a mod store, backups record the mods dir as a {filename: sha256} manifest and pin the jars next to the backup
+    mods_manifest: str = "mods.json"
+    pins_ext: str = ".mods"
+
+    # vanilla layout, server types with another layout pass theirs
+    dimensions: dict[str, str] = {
+        "overworld": "world",
+        "the_nether": "world/DIM-1",
+        "the_end": "world/DIM1",
+    }
+    world_dirs: list[str] = ["world"]
+
+    # chunk data lives in region files in each of these dimension subdirectories
+    region_dirs: list[str] = ["region", "entities", "poi"]
+
+    # chunks per axis a single chunk restore may cover (4 regions)
+    max_chunk_span: int = 128
+
+    def __init__(
+        self,
+        instance_dir: str,
+        backups_dir: str,
+        *,
+        backup_format: str = "dir",
+        compression_level: int = 3,
+        compression_threads: int = 0,
+        copier: McServerCopier | None = None,
+        mod_store: McServerModStore | None = None,
+        dimensions: dict[str, str] | None = None,
+        world_dirs: list[str] | None = None,
+        data_dirs: list[str] | None = None,
+    ) -> None:
         self._instance_dir: str = instance_dir
         self._backups_dir: str = backups_dir
+        self._backup_format: str = backup_format
+        self._compression_level: int = compression_level
+        # zstd uses -1 for "one worker per cpu"
+        self._compression_threads: int = compression_threads if compression_threads > 0 else -1
+        self._copier: McServerCopier = copier or McServerCopier()
+        # restores run with the server stopped, so they get the full disk bandwidth
+        self._restore_copier: McServerCopier = McServerCopier(idle_io=False)
+        self._mod_store: McServerModStore | None = mod_store
+        self._dimensions: dict[str, str] = dimensions or self.dimensions
+        # server_info.json and mods have database counterparts (server version, mod rows) only full restores resync
+        self._partial_targets: list[str] = (world_dirs or self.world_dirs) + (data_dirs or [])
+        self._targets: list[tuple[str, str]] = [(d, "dir") for d in self._partial_targets] + self.backup_targets
+
+        if self._backup_format not in self.backup_formats:
+            raise McServerBackupError(f"Unsupported backup format: {self._backup_format}")
+
+    async def backup(self, backup: str) -> dict:
+        """Create a backup with the given name. Returns the backup stats"""
+        if self._backup_format == "archive":
+            return await self._backup_archive(backup)
+
+        return await self._backup_dir(backup)
+
+    async def restore(self, backup: str) -> None:
+        """Restore a backup with the given name. Data is staged next to the live targets and swapped in with renames,
+        so an interrupted restore leaves every target either fully old or fully restored"""
+        (backup_path, backup_format) = self._get_backup_path(backup)
+        staging_dir = os.path.join(self._instance_dir, self.staging_dir)
+
+        await self._recover_staging(staging_dir)
+
+        os.makedirs(staging_dir)
+
+        try:
+            if backup_format == "archive":
+                await asyncio.to_thread(self._extract_archive, backup_path, staging_dir)
+            else:
+                await self._stage_dir(backup_path, staging_dir, os.listdir(backup_path))
+
+            await self._stage_mods(backup, staging_dir)
+
+            await asyncio.to_thread(self._swap_staged, staging_dir, os.listdir(staging_dir))
+        finally:
+            await self._remove_path(staging_dir)
+
+        # the replaced mods may have been the last references to some stored jars
+        if self._mod_store:
+            await self._mod_store.gc()
+
+    def locate(self, backup: str) -> tuple[str, str]:
+        """Get the path and format ("dir" or "archive") of a backup"""
+        return self._get_backup_path(backup)
+
+    def get_export_members(self, backup: str | None = None) -> list[tuple[str, str]]:
+        """Get the (path, archive name) pairs to export for a directory backup, or for the live instance if no backup is given"""
+        if backup is None:
+            base_dir = self._instance_dir
+        else:
+            (base_dir, backup_format) = self._get_backup_path(backup)
+
+            if backup_format != "dir":
+                raise McServerBackupError(f"Backup {backup} is already an archive")
+
+        members = [(os.path.join(base_dir, d), d) for d, _ in self._targets]
+        manifest_file = os.path.join(base_dir, self.mods_manifest)
+
+        # mods recorded by hash are exported from the pinned jars
+        if backup is not None and os.path.isfile(manifest_file):
+            with open(manifest_file, "r") as f:
+                manifest = json.load(f)
+
+            pins_dir = self._get_pins_dir(backup)
+            members += [(os.path.join(pins_dir, f"{sha256}.jar"), f"mods/{name}") for name, sha256 in manifest.items()]
+
+        return members
+
+    async def list_contents(self, backup: str, *, prefix: str = "") -> list[dict]:
+        """List the files and directories stored in a backup, optionally only the ones under the given path"""
+        (backup_path, backup_format) = self._get_backup_path(backup)
+        prefix = self._normalize_path(prefix) if prefix else ""
+
+        if backup_format == "archive":
+            contents = await asyncio.to_thread(self._list_archive, backup_path, self._get_pins_dir(backup))
+        else:
+            contents = await asyncio.to_thread(self._list_dir, backup_path, self._get_pins_dir(backup))
+
+        return [c for c in contents if not prefix or self._path_selected(c["path"], [prefix])]
+
+    async def restore_paths(self, backup: str, paths: list[str]) -> None:
+        """Restore only the given files or directories (region files, dimensions, player data, etc.) from a backup"""
+        (backup_path, backup_format) = self._get_backup_path(backup)
+        paths = [self._normalize_path(p) for p in paths]
+        staging_dir = os.path.join(self._instance_dir, self.staging_dir)
+
+        if not paths:
+            raise McServerBackupError("No paths selected for restore")
+
+        for p in paths:
+            if p.split("/")[0] not in self._partial_targets:
+                raise McServerBackupError(f"Path {p} can only be restored with a full restore")
+
+        await self._recover_staging(staging_dir)
+
+        os.makedirs(staging_dir)
+
+        try:
+            if backup_format == "archive":
+                await asyncio.to_thread(self._extract_archive, backup_path, staging_dir, paths)
+            else:
+                await self._stage_dir(backup_path, staging_dir, paths)
+
+            missing = [p for p in paths if not os.path.lexists(os.path.join(staging_dir, p))]
 
-    async def backup(self, backup: str) -> None:
-        """Create a backup with the given name"""
+            if missing:
+                raise McServerBackupError(f"Paths not found in backup {backup}: {', '.join(missing)}")
+
+            await asyncio.to_thread(self._swap_staged, staging_dir, paths)
+        finally:
+            await self._remove_path(staging_dir)
+
+        logger.info(f"Restored {len(paths)} path(s) from backup {backup}")
+
+    async def restore_chunks(self, backup: str, dimension: str, chunk_from: tuple[int, int], chunk_to: tuple[int, int]) -> None:
+        """Restore the chunks in the given (inclusive) chunk coordinates range of a dimension from a backup.
+        Only the selected chunks are copied into the live region files"""
+        (backup_path, backup_format) = self._get_backup_path(backup)
+        staging_dir = os.path.join(self._instance_dir, self.staging_dir)
+
+        if dimension not in self._dimensions:
+            raise McServerBackupError(f"Unknown dimension: {dimension}")
+
+        (min_x, max_x) = sorted((chunk_from[0], chunk_to[0]))
+        (min_z, max_z) = sorted((chunk_from[1], chunk_to[1]))
+
+        if max_x - min_x >= self.max_chunk_span or max_z - min_z >= self.max_chunk_span:
+            raise McServerBackupError(f"Chunk range can't span more than {self.max_chunk_span} chunks per axis")
+
+        (min_rx, min_rz) = McServerRegionFile.chunk_to_region(min_x, min_z)
+        (max_rx, max_rz) = McServerRegionFile.chunk_to_region(max_x, max_z)
+
+        region_files = []
+
+        for region_dir in self.region_dirs:
+            for rx in range(min_rx, max_rx + 1):
+                for rz in range(min_rz, max_rz + 1):
+                    region_files.append(posixpath.join(self._dimensions[dimension], region_dir, McServerRegionFile.region_name(rx, rz)))
+
+        await self._recover_staging(staging_dir)
+
+        os.makedirs(staging_dir)
+
+        try:
+            # archives only get the affected region files extracted, directory backups are read in place
+            if backup_format == "archive":
+                await asyncio.to_thread(self._extract_archive, backup_path, staging_dir, region_files)
+                source_dir = staging_dir
+            else:
+                source_dir = backup_path
+
+            await asyncio.to_thread(self._merge_chunks, source_dir, dimension, (min_x, min_z), (max_x, max_z))
+        finally:
+            await self._remove_path(staging_dir)
+
+        logger.info(f"Restored chunks {min_x},{min_z} to {max_x},{max_z} ({dimension}) from backup {backup}")
+
+    async def delete_backup(self, backup: str) -> None:
+        """Delete a backup with the given name"""
+        (backup_path, backup_format) = self._get_backup_path(backup)
+
+        if backup_format == "archive":
+            await asyncio.to_thread(os.remove, backup_path)
+        else:
+            await asyncio.to_thread(shutil.rmtree, backup_path)
+
+        await self._remove_path(self._get_pins_dir(backup))
+
+        if self._mod_store:
+            await self._mod_store.gc()
+
+        logger.info(f"Successfully deleted backup {backup}")
+
+    async def _backup_dir(self, backup: str) -> dict:
         backup_dir = os.path.join(self._backups_dir, backup)
 
         if not os.path.exists(backup_dir):
             logger.info(f"Creating backup directory {backup_dir}")
             os.makedirs(backup_dir)
 
-        for d, t in self.backup_targets:
+        manifest = await self._snapshot_mods(backup)
+
+        if manifest is not None:
+            async with aiofiles.open(os.path.join(backup_dir, self.mods_manifest), "w") as f:
+                await f.write(json.dumps(manifest))
+
+        for d, t in self._targets:
             src_path = os.path.join(self._instance_dir, d)
             dst_path = os.path.join(backup_dir, d)
 
+            if d == "mods" and manifest is not None:
+                continue
+
             if not os.path.exists(src_path):
                 if t == "dir":
                     os.makedirs(dst_path)
@@ -53,41 +287,307 @@ class McServerBackup:
                 continue
 
             if t == "dir":
-                await asyncio.to_thread(shutil.copytree, src_path, dst_path)
+                await self._copier.copytree(src_path, dst_path)
             else:
-                await asyncio.to_thread(shutil.copy2, src_path, dst_path)
+                await self._copier.copyfile(src_path, dst_path)
 
         logger.info(f"Successfully backed up data to {backup}")
 
-    async def restore(self, backup: str) -> None:
-        """Restore a backup with the given name"""
-        backup_dir = os.path.join(self._backups_dir, backup)
+        return {"format": "dir"}
 
-        if not os.path.exists(backup_dir):
-            raise McServerBackupError(f"Backup {backup} does not exist")
+    async def _backup_archive(self, backup: str) -> dict:
+        if not os.path.exists(self._backups_dir):
+            logger.info(f"Creating backups directory {self._backups_dir}")
+            os.makedirs(self._backups_dir)
 
-        for d in os.listdir(backup_dir):
-            src_dir = os.path.join(backup_dir, d)
-            dst_dir = os.path.join(self._instance_dir, d)
+        archive_file = os.path.join(self._backups_dir, f"{backup}{self.archive_ext}")
 
-            if os.path.exists(dst_dir):
-                if os.path.isdir(dst_dir):
-                    await asyncio.to_thread(shutil.rmtree, dst_dir)
-                else:
-                    await asyncio.to_thread(os.remove, dst_dir)
+        logger.info(f"Creating backup archive {archive_file}")
+
+        manifest = await self._snapshot_mods(backup)
+
+        started = time.monotonic()
+        (size, compressed_size) = await self._copier.run(self._write_archive, archive_file, manifest)
+        duration = max(time.monotonic() - started, 0.001)
+
+        stats = {
+            "format": "archive",
+            "compression_level": self._compression_level,
+            "size": size,
+            "compressed_size": compressed_size,
+            "compression_ratio": round(size / compressed_size, 2) if compressed_size else 0,
+            "throughput": int(size / duration),
+            "duration": round(duration, 3),
+        }
+
+        logger.info(f"Successfully backed up data to {backup} (ratio {stats['compression_ratio']}, {stats['throughput']} B/s)")
+
+        return stats
+
+    def _write_archive(self, archive_file: str, manifest: dict[str, str] | None = None) -> tuple[int, int]:
+        tmp = archive_file + ".tmp"
+
+        # libzstd splits the input stream in jobs and compresses them in parallel worker threads
+        cctx = zstandard.ZstdCompressor(level=self._compression_level, threads=self._compression_threads, write_checksum=True)
 
-            if os.path.isdir(src_dir):
-                await asyncio.to_thread(shutil.copytree, src_dir, dst_dir)
+        try:
+            with open(tmp, "wb") as f:
+                with cctx.stream_writer(f, closefd=False) as zf:
+                    # throttle on the uncompressed stream, which matches the bytes read from disk
+                    with tarfile.open(fileobj=self._copier.wrap_writer(zf), mode="w|") as tar:
+                        if manifest is not None:
+                            data = json.dumps(manifest).encode()
+                            info = tarfile.TarInfo(self.mods_manifest)
+                            info.size = len(data)
+                            info.mtime = int(time.time())
+
+                            tar.addfile(info, io.BytesIO(data))
+
+                        for d, t in self._targets:
+                            src_path = os.path.join(self._instance_dir, d)
+
+                            if d == "mods" and manifest is not None:
+                                continue
+
+                            if os.path.exists(src_path):
+                                tar.add(src_path, arcname=d)
+                                continue
+
+                            # keep the same layout as directory backups
+                            info = tarfile.TarInfo(d)
+                            info.mtime = int(time.time())
+
+                            if t == "dir":
+                                info.type = tarfile.DIRTYPE
+                                info.mode = 0o755
+
+                            tar.addfile(info)
+
+            os.replace(tmp, archive_file)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        (ingested, _, produced) = cctx.frame_progression()
+
+        return (ingested, produced)
+
+    async def _stage_dir(self, backup_dir: str, staging_dir: str, paths: list[str]) -> None:
+        for p in paths:
+            src_path = os.path.join(backup_dir, p)
+            dst_path = os.path.join(staging_dir, p)
+
+            if not os.path.lexists(src_path):
+                continue
+
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+
+            if os.path.isdir(src_path):
+                await self._restore_copier.copytree(src_path, dst_path)
             else:
-                await asyncio.to_thread(shutil.copy2, src_dir, dst_dir)
+                await self._restore_copier.copyfile(src_path, dst_path)
 
-    async def delete_backup(self, backup: str) -> None:
-        """Delete a backup with the given name"""
+    def _extract_archive(self, archive_file: str, dest_dir: str, paths: list[str] | None = None) -> None:
+        dctx = zstandard.ZstdDecompressor()
+        # the data filter rejects absolute paths and links escaping the destination, python < 3.10.12 lacks it
+        extract_args = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
+        # stream mode (r|) reads members sequentially, so the archive is never staged on disk or in memory
+        with open(archive_file, "rb") as f:
+            with dctx.stream_reader(f) as zf:
+                with tarfile.open(fileobj=zf, mode="r|") as tar:
+                    if paths is None:
+                        tar.extractall(dest_dir, **extract_args)
+                        return
+
+                    for member in tar:
+                        if self._path_selected(member.name, paths):
+                            tar.extract(member, dest_dir, **extract_args)
+
+    def _list_archive(self, archive_file: str, pins_dir: str) -> list[dict]:
+        dctx = zstandard.ZstdDecompressor()
+        contents = []
+
+        with open(archive_file, "rb") as f:
+            with dctx.stream_reader(f) as zf:
+                with tarfile.open(fileobj=zf, mode="r|") as tar:
+                    for member in tar:
+                        if member.name == self.mods_manifest:
+                            contents += self._list_manifest(json.load(tar.extractfile(member)), pins_dir)
+                            continue
+
+                        contents.append({"path": member.name, "type": "dir" if member.isdir() else "file", "size": member.size})
+
+        return contents
+
+    def _list_dir(self, backup_dir: str, pins_dir: str) -> list[dict]:
+        contents = []
+        manifest_file = os.path.join(backup_dir, self.mods_manifest)
+
+        if os.path.isfile(manifest_file):
+            with open(manifest_file, "r") as f:
+                contents += self._list_manifest(json.load(f), pins_dir)
+
+        for root, dirs, files in os.walk(backup_dir):
+            rel_root = os.path.relpath(root, backup_dir)
+
+            for d in sorted(dirs):
+                contents.append({"path": posixpath.normpath(posixpath.join(rel_root, d)), "type": "dir", "size": 0})
+
+            for f in sorted(files):
+                if rel_root == "." and f == self.mods_manifest:
+                    continue
+
+                size = os.path.getsize(os.path.join(root, f))
+                contents.append({"path": posixpath.normpath(posixpath.join(rel_root, f)), "type": "file", "size": size})
+
+        return contents
+
+    def _list_manifest(self, manifest: dict[str, str], pins_dir: str) -> list[dict]:
+        contents = [{"path": "mods", "type": "dir", "size": 0}]
+
+        for name, sha256 in sorted(manifest.items()):
+            pinned = os.path.join(pins_dir, f"{sha256}.jar")
+            size = os.path.getsize(pinned) if os.path.exists(pinned) else 0
+
+            contents.append({"path": f"mods/{name}", "type": "file", "size": size, "sha256": sha256})
+
+        return contents
+
+    async def _snapshot_mods(self, backup: str) -> dict[str, str] | None:
+        if not self._mod_store:
+            return None
+
+        manifest = await self._mod_store.snapshot(os.path.join(self._instance_dir, "mods"))
+
+        await self._mod_store.pin(manifest, self._get_pins_dir(backup))
+
+        return manifest
+
+    async def _stage_mods(self, backup: str, staging_dir: str) -> None:
+        manifest_file = os.path.join(staging_dir, self.mods_manifest)
+
+        if not os.path.isfile(manifest_file):
+            return
+
+        async with aiofiles.open(manifest_file, "r") as f:
+            manifest = json.loads(await f.read())
+
+        await self._remove_path(manifest_file)
+
+        if not self._mod_store:
+            raise McServerBackupError(f"Backup {backup} references stored mods, but no mod store is available")
+
+        await self._mod_store.checkout(manifest, os.path.join(staging_dir, "mods"), pins_dir=self._get_pins_dir(backup))
+
+    def _merge_chunks(self, source_dir: str, dimension: str, chunk_from: tuple[int, int], chunk_to: tuple[int, int]) -> None:
+        side = McServerRegionFile.chunks_per_side
+        (min_rx, min_rz) = McServerRegionFile.chunk_to_region(*chunk_from)
+        (max_rx, max_rz) = McServerRegionFile.chunk_to_region(*chunk_to)
+
+        for region_dir in self.region_dirs:
+            src_dir = os.path.join(source_dir, self._dimensions[dimension], region_dir)
+            dst_dir = os.path.join(self._instance_dir, self._dimensions[dimension], region_dir)
+
+            # region dirs missing from the backup were introduced by a later server version, leave them alone
+            if not os.path.isdir(src_dir):
+                continue
+
+            os.makedirs(dst_dir, exist_ok=True)
+
+            for rx in range(min_rx, max_rx + 1):
+                for rz in range(min_rz, max_rz + 1):
+                    region_name = McServerRegionFile.region_name(rx, rz)
+                    src_region = McServerRegionFile(os.path.join(src_dir, region_name))
+                    dst_region = McServerRegionFile(os.path.join(dst_dir, region_name))
+
+                    # only the part of the range inside this region
+                    for x in range(max(chunk_from[0], rx * side), min(chunk_to[0], rx * side + side - 1) + 1):
+                        for z in range(max(chunk_from[1], rz * side), min(chunk_to[1], rz * side + side - 1) + 1):
+                            dst_region.write_chunk(x, z, src_region.read_chunk(x, z))
+
+    def _swap_staged(self, staging_dir: str, paths: list[str]) -> None:
+        for p in paths:
+            staged_path = os.path.join(staging_dir, p)
+            live_path = os.path.join(self._instance_dir, p)
+
+            os.makedirs(os.path.dirname(live_path), exist_ok=True)
+
+            if not os.path.lexists(live_path) or not os.path.isdir(staged_path):
+                os.replace(staged_path, live_path)
+                continue
+
+            # the previous data ends up in the staging dir and is removed along with it
+            if self._rename_exchange(staged_path, live_path):
+                continue
+
+            os.rename(live_path, f"{staged_path}.old")
+            os.rename(staged_path, live_path)
+
+        logger.info(f"Swapped restored data into {self._instance_dir}")
+
+    def _rename_exchange(self, src: str, dst: str) -> bool:
+        at_fdcwd = -100
+        rename_exchange = 2
+
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            rc = libc.renameat2(at_fdcwd, os.fsencode(src), at_fdcwd, os.fsencode(dst), rename_exchange)
+        except (OSError, AttributeError):
+            return False
+
+        return rc == 0
+
+    async def _recover_staging(self, staging_dir: str) -> None:
+        if not os.path.exists(staging_dir):
+            return
+
+        logger.warning(f"Found leftover restore staging directory {staging_dir}. Recovering")
+
+        # put back paths moved aside by an interrupted non-atomic swap
+        for root, dirs, files in os.walk(staging_dir):
+            for f in dirs + files:
+                rel_path = os.path.relpath(os.path.join(root, f), staging_dir)
+                live_path = os.path.join(self._instance_dir, rel_path.removesuffix(".old"))
+
+                if f.endswith(".old") and not os.path.lexists(live_path):
+                    os.rename(os.path.join(root, f), live_path)
+
+        await self._remove_path(staging_dir)
+
+    async def _remove_path(self, path: str) -> None:
+        if not os.path.lexists(path):
+            return
+
+        if os.path.isdir(path) and not os.path.islink(path):
+            await asyncio.to_thread(shutil.rmtree, path)
+        else:
+            await asyncio.to_thread(os.remove, path)
+
+    def _normalize_path(self, path: str) -> str:
+        norm_path = posixpath.normpath(path.strip().lstrip("/"))
+        targets = [t for t, _ in self._targets]
+
+        if norm_path.startswith("..") or norm_path.split("/")[0] not in targets:
+            raise McServerBackupError(f"Invalid backup path: {path}")
+
+        return norm_path
+
+    def _path_selected(self, path: str, paths: list[str]) -> bool:
+        return any(path == p or path.startswith(f"{p}/") for p in paths)
+
+    def _get_pins_dir(self, backup: str) -> str:
+        return os.path.join(self._backups_dir, f"{backup}{self.pins_ext}")
+
+    def _get_backup_path(self, backup: str) -> tuple[str, str]:
+        archive_file = os.path.join(self._backups_dir, f"{backup}{self.archive_ext}")
         backup_dir = os.path.join(self._backups_dir, backup)
 
-        if not os.path.exists(backup_dir):
-            raise McServerBackupError(f"Backup {backup} does not exist")
+        if os.path.isfile(archive_file):
+            return (archive_file, "archive")
 
-        await asyncio.to_thread(shutil.rmtree, backup_dir)
+        if os.path.isdir(backup_dir):
+            return (backup_dir, "dir")
 
-        logger.info(f"Successfully deleted backup {backup}")
+        raise McServerBackupError(f"Backup {backup} does not exist")
@@ -1,9 +1,25 @@
 import os
+import json
+import time
+import shlex
+import signal
+import shutil
 import logging
+import asyncio
+import weakref
+import httpx
+from packaging import version
+from ..properties_generator import McServerPropertiesGenerator
 from .error import McServerCatalogError
 from .patcher import McServerPatcher
+from .metadata_cache import McServerMetadataCache
+from .library_store import McServerLibraryStore
 from .vanilla import VanillaServerCatalog
 from .forge import ForgeServerCatalog
+from .fabric import FabricServerCatalog
+from .paper import PaperServerCatalog
+from .purpur import PurpurServerCatalog
+from .abstract import McServerSpecializedCatalog
 
 
 __all__ = [
@@ -27,33 +43,97 @@ class McServerCatalog:
             "handler": ForgeServerCatalog,
             "capabilities": ForgeServerCatalog.capabilities,
         },
+        "fabric": {
+            "handler": FabricServerCatalog,
+            "capabilities": FabricServerCatalog.capabilities,
+        },
+        "paper": {
+            "handler": PaperServerCatalog,
+            "capabilities": PaperServerCatalog.capabilities,
+        },
+        "purpur": {
+            "handler": PurpurServerCatalog,
+            "capabilities": PurpurServerCatalog.capabilities,
+        },
     }
 
-    def __init__(self, versions_dir: str, server_type: str, server_version: str, *, java_bin: str = "java") -> None:
+    metadata_dir: str = ".metadata"
+    libraries_dir: str = ".libraries"
+    installed_marker: str = ".installed"
+    properties_defaults_file: str = ".properties_defaults.json"
+
+    # seconds the server gets to write its server.properties on the first run
+    first_run_timeout: int = 120
+
+    _locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def __init__(
+        self,
+        versions_dir: str,
+        server_type: str,
+        server_version: str,
+        *,
+        java_bin: str = "java",
+        http_client: httpx.AsyncClient,
+        metadata_ttl: int = 3600,
+        offline: bool = False,
+        mirror_dir: str | None = None,
+    ) -> None:
         self.server_type: str = server_type
         self.server_version: str = server_version
         self._java_bin: str = java_bin
+        self._http_client: httpx.AsyncClient = http_client
+        self._mirror_dir: str | None = mirror_dir
 
         self._version_dir = os.path.join(versions_dir, f"{self.server_type}-{self.server_version}")
+        self._metadata_cache = McServerMetadataCache(
+            os.path.join(versions_dir, self.metadata_dir),
+            http_client=http_client,
+            ttl=metadata_ttl,
+            offline=offline,
+        )
+        self._library_store = McServerLibraryStore(os.path.join(versions_dir, self.libraries_dir))
 
-    async def download(self, no_cache: bool = False) -> None:
-        """Download/setup the server environment"""
-        logger.info(f"Attempting to download server version {self.server_version} ({self.server_type})")
+    async def download(self, no_cache: bool = False, *, low_priority: bool = False) -> None:
+        """Download/setup the server environment. Concurrent calls for the same version share a single install.
+        Low priority installs run the installers niced, for background prefetching"""
+        lock = self._locks.setdefault(self._version_dir, asyncio.Lock())
 
-        if os.path.exists(self._version_dir):
-            if not no_cache:
+        async with lock:
+            # checked again once the lock is held, another caller may just have installed it
+            if self.is_installed() and not no_cache:
                 logger.info(f"Server version {self.server_version} ({self.server_type}) already exists, skipping download")
                 return
 
+            try:
+                await self._install(low_priority=low_priority)
+            except Exception as e:
+                # versions installed before the completion marker existed are kept usable when they can't be reinstalled
+                if not os.path.exists(self._version_dir) or no_cache:
+                    raise
+
+                logger.warning(f"Failed to reinstall server version {self.server_version} ({self.server_type}): {e}. Using the existing installation")
+
+    async def list_versions(self) -> list[str]:
+        """Get the release versions available for the server type, newest first. Falls back to the versions
+        available in the mirror when upstream can't be reached"""
         specialized_catalog = self._specialized_catalog_factory()
-        patcher = McServerPatcher(self._version_dir, self.server_version)
 
-        await specialized_catalog.download()
-        await patcher.patch()
+        try:
+            return await specialized_catalog.list_versions()
+        except McServerCatalogError as e:
+            mirror_versions = self._list_mirror_versions()
 
-        logger.info(f"Server downloaded successfully")
+            if not mirror_versions:
+                raise
 
-        return
+            logger.warning(f"Failed to list {self.server_type} versions ({e}). Using the versions available in the mirror")
+
+            return mirror_versions
+
+    def is_installed(self) -> bool:
+        """Check if the server version was completely installed"""
+        return os.path.exists(os.path.join(self._version_dir, self.installed_marker))
 
     def get_link_paths(self) -> list[str]:
         """Get the list of link paths needed for the server"""
@@ -61,10 +141,24 @@ class McServerCatalog:
 
         return [os.path.join(self._version_dir, path) for path in specialized_catalog.link_paths]
 
+    def get_default_properties(self) -> dict:
+        """Get the server.properties keys and default values of the server version, as written by the server itself"""
+        defaults_file = os.path.join(self._version_dir, self.properties_defaults_file)
+
+        if not os.path.exists(defaults_file):
+            return {}
+
+        try:
+            with open(defaults_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable properties defaults of server version {self.server_version} ({e})")
+            return {}
+
     async def get_jvm_args(self) -> list[str]:
         """Get the list of JVM arguments needed to launch the server"""
         specialized_catalog = self._specialized_catalog_factory()
-        patcher = McServerPatcher(self._version_dir, self.server_version)
+        patcher = McServerPatcher(self._version_dir, self.server_version, http_client=self._http_client)
 
         jvm_args = []
 
@@ -75,8 +169,157 @@ class McServerCatalog:
 
         return jvm_args
 
-    def _specialized_catalog_factory(self) -> VanillaServerCatalog | ForgeServerCatalog:
+    async def _install(self, *, low_priority: bool = False) -> None:
+        logger.info(f"Attempting to download server version {self.server_version} ({self.server_type})")
+
+        # the staging dir is kept when an install fails, so the next attempt resumes its downloads
+        staging_dir = os.path.join(os.path.dirname(self._version_dir), f".{os.path.basename(self._version_dir)}.staging")
+
+        if not os.path.exists(staging_dir):
+            os.makedirs(staging_dir)
+
+        specialized_catalog = self._specialized_catalog_factory(staging_dir)
+        patcher = McServerPatcher(staging_dir, self.server_version, http_client=self._http_client)
+        mirror_dir = self._get_mirror_version_dir()
+
+        if mirror_dir:
+            logger.info(f"Copying server version {self.server_version} ({self.server_type}) from mirror {mirror_dir}")
+            await asyncio.to_thread(shutil.copytree, mirror_dir, staging_dir, symlinks=True, dirs_exist_ok=True)
+        else:
+            await specialized_catalog.download(low_priority=low_priority)
+
+        await patcher.patch()
+
+        # mirrored versions may come with their defaults
+        if not os.path.exists(os.path.join(staging_dir, self.properties_defaults_file)):
+            await self._extract_default_properties(staging_dir, specialized_catalog, patcher, low_priority=low_priority)
+
+        # forge and fabric builds share most of their libraries, identical files are linked to a single copy
+        await self._library_store.dedupe(os.path.join(staging_dir, "libraries"))
+
+        marker = {"server_type": self.server_type, "server_version": self.server_version, "installed_at": int(time.time())}
+
+        with open(os.path.join(staging_dir, self.installed_marker), "w") as f:
+            json.dump(marker, f)
+
+        # versions installed before the marker existed (or reinstalled) are swapped out, never merged
+        if os.path.exists(self._version_dir):
+            old_dir = f"{staging_dir}.old"
+
+            if os.path.exists(old_dir):
+                await asyncio.to_thread(shutil.rmtree, old_dir)
+
+            os.rename(self._version_dir, old_dir)
+            os.rename(staging_dir, self._version_dir)
+
+            await asyncio.to_thread(shutil.rmtree, old_dir)
+            await self._library_store.gc()
+        else:
+            os.rename(staging_dir, self._version_dir)
+
+        logger.info(f"Server downloaded successfully")
+
+    async def _extract_default_properties(
+        self,
+        staging_dir: str,
+        specialized_catalog: McServerSpecializedCatalog,
+        patcher: McServerPatcher,
+        *,
+        low_priority: bool = False,
+    ) -> None:
+        # the server writes its complete server.properties, then stops as the eula isn't accepted
+        run_dir = os.path.join(staging_dir, ".first-run")
+
+        if os.path.exists(run_dir):
+            await asyncio.to_thread(shutil.rmtree, run_dir)
+
+        os.makedirs(run_dir)
+
+        try:
+            for path in specialized_catalog.link_paths:
+                if os.path.exists(os.path.join(staging_dir, path)):
+                    os.symlink(os.path.join(staging_dir, path), os.path.join(run_dir, path))
+
+            jvm_args = await patcher.get_jvm_args() + await specialized_catalog.get_jvm_args()
+
+            process = await asyncio.create_subprocess_shell(
+                f"{shlex.quote(self._java_bin)} {' '.join(jvm_args)} nogui",
+                cwd=run_dir,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True,
+                preexec_fn=(lambda: os.nice(19)) if low_priority else None,
+            )
+
+            try:
+                await asyncio.wait_for(process.wait(), timeout=self.first_run_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Server version {self.server_version} ({self.server_type}) didn't stop after its first run, killing it")
+                os.killpg(process.pid, signal.SIGKILL)
+                await process.wait()
+
+            properties_file = os.path.join(run_dir, "server.properties")
+
+            if not os.path.exists(properties_file):
+                logger.warning(f"Server version {self.server_version} ({self.server_type}) didn't write a server.properties file. Its defaults are unknown")
+                return
+
+            with open(properties_file, "r") as f:
+                defaults = McServerPropertiesGenerator.parse(f.read())
+
+            with open(os.path.join(staging_dir, self.properties_defaults_file), "w") as f:
+                json.dump(defaults, f)
+
+            logger.info(f"Learnt {len(defaults)} server.properties defaults of server version {self.server_version} ({self.server_type})")
+        except OSError as e:
+            logger.warning(f"Failed to learn the server.properties defaults of server version {self.server_version} ({self.server_type}): {e}")
+        finally:
+            await asyncio.to_thread(shutil.rmtree, run_dir)
+
+    def _get_mirror_version_dir(self) -> str | None:
+        if not self._mirror_dir:
+            return None
+
+        # the mirror has the layout of a versions dir: <type>-<version> directories holding installed versions
+        mirror_version_dir = os.path.join(self._mirror_dir, os.path.basename(self._version_dir))
+
+        return mirror_version_dir if os.path.isdir(mirror_version_dir) else None
+
+    def _list_mirror_versions(self) -> list[str]:
+        if not self._mirror_dir or not os.path.isdir(self._mirror_dir):
+            return []
+
+        prefix = f"{self.server_type}-"
+        versions = [d.removeprefix(prefix) for d in os.listdir(self._mirror_dir) if d.startswith(prefix) and os.path.isdir(os.path.join(self._mirror_dir, d))]
+
+        return sorted(versions, key=self._version_sort_key, reverse=True)
+
+    @classmethod
+    def get_world_layout(cls, server_type: str) -> dict:
+        """Get the dimension dirs, world dirs and other data dirs of instances of the given server type"""
+        handler = cls.server_types.get(server_type, {}).get("handler", McServerSpecializedCatalog)
+
+        return {
+            "dimensions": dict(handler.dimensions),
+            "world_dirs": list(handler.world_dirs),
+            "data_dirs": list(handler.data_dirs),
+        }
+
+    def _version_sort_key(self, v: str) -> tuple:
+        try:
+            return (1, version.parse(v))
+        except version.InvalidVersion:
+            return (0, v)
+
+    def _specialized_catalog_factory(self, version_dir: str | None = None) -> McServerSpecializedCatalog:
         if not self.server_type in self.server_types:
             raise McServerCatalogError(f"Unsupported server type: {self.server_type}")
 
-        return self.server_types[self.server_type]["handler"](self._version_dir, self.server_version, java_bin=self._java_bin)
+        return self.server_types[self.server_type]["handler"](
+            version_dir or self._version_dir,
+            self.server_version,
+            java_bin=self._java_bin,
+            http_client=self._http_client,
+            metadata_cache=self._metadata_cache,
+        )
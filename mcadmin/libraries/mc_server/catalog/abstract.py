@@ -4,10 +4,24 @@ __all__ = ["McServerSpecializedCatalog"]
 
 
 class McServerSpecializedCatalog(ABC):
+    # dimension name -> its data dir in the instance
+    dimensions: dict[str, str] = {
+        "overworld": "world",
+        "the_nether": "world/DIM-1",
+        "the_end": "world/DIM1",
+    }
+    # instance dirs holding world data, and other server data dirs (plugins, ...) backed up along
+    world_dirs: list[str] = ["world"]
+    data_dirs: list[str] = []
+
     @abstractmethod
-    async def download(self) -> None:
+    async def download(self, *, low_priority: bool = False) -> None:
         pass
 
     @abstractmethod
     async def get_jvm_args(self) -> list[str]:
+        pass
+
+    @abstractmethod
+    async def list_versions(self) -> list[str]:
         pass
\ No newline at end of file
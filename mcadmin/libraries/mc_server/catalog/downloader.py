@@ -0,0 +1,132 @@
+import hashlib
+import os
+import logging
+import asyncio
+from typing import Any
+import aiofiles
+import httpx
+from .error import McServerCatalogError
+
+__all__ = ["McServerDownloader"]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerDownloader:
+    """Low level file downloader. Streams to a partial file next to the destination while hashing, resumes interrupted
+    downloads with HTTP Range requests (conditional on the partial file's ETag / Last-Modified) and only moves the file
+    into place once its checksum was verified"""
+
+    chunk_size: int = 1024 * 1024
+    max_retries: int = 3
+    timeout: float = 30
+
+    def __init__(self, http_client: httpx.AsyncClient) -> None:
+        self._http_client: httpx.AsyncClient = http_client
+
+    async def download(self, url: str, dest: str, *, sha1: str | None = None, sha256: str | None = None, md5: str | None = None) -> None:
+        """Download url to dest. The checksum is verified when one is given (the strongest one if several are)"""
+        checksums = {"sha256": sha256, "sha1": sha1, "md5": md5}
+        (algorithm, checksum) = next(((a, c) for (a, c) in checksums.items() if c), ("sha1", None))
+        part_file = f"{dest}.part"
+        validator_file = f"{dest}.part.validator"
+        dest_dir = os.path.dirname(dest)
+
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                digest = await self._fetch(url, part_file, validator_file, algorithm, verified=bool(checksum))
+                break
+            except httpx.HTTPStatusError as e:
+                raise McServerCatalogError(f"Failed to download {url} ({e})")
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise McServerCatalogError(f"Failed to download {url} ({e})")
+
+                logger.warning(f"Download of {url} interrupted ({e}), resuming (attempt {attempt + 1}/{self.max_retries})")
+
+                await asyncio.sleep(attempt)
+
+        if os.path.exists(validator_file):
+            os.remove(validator_file)
+
+        if checksum and digest != checksum.lower():
+            await asyncio.to_thread(os.remove, part_file)
+            raise McServerCatalogError(f"Checksum mismatch for {url} (expected {algorithm} {checksum}, got {digest})")
+
+        await asyncio.to_thread(os.replace, part_file, dest)
+
+        logger.info(f"Downloaded {url}" + (f" ({algorithm} verified)" if checksum else ""))
+
+    async def _fetch(self, url: str, part_file: str, validator_file: str, algorithm: str, *, verified: bool) -> str:
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        validator = self._read_validator(validator_file) if offset else None
+        headers = {}
+
+        # without a validator nor a checksum, a partial file of an older upstream build can't be told apart
+        if offset and not validator and not verified:
+            logger.info(f"Discarding unverifiable partial download of {url}")
+            offset = 0
+
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+
+        # the server sends the whole file instead of the range when it changed since
+        if validator:
+            headers["If-Range"] = validator
+
+        logger.info(f"Downloading {url}" + (f" (resuming at {offset} bytes)" if offset else ""))
+
+        async with self._http_client.stream("GET", url, headers=headers, timeout=self.timeout) as response:
+            # the partial file may already be complete
+            if response.status_code == 416 and offset:
+                return (await asyncio.to_thread(self._hash_file, part_file, offset, algorithm)).hexdigest()
+
+            response.raise_for_status()
+
+            # servers ignoring the range (or whose file changed) send the whole file again
+            if response.status_code != 206:
+                offset = 0
+                await asyncio.to_thread(self._write_validator, validator_file, response.headers)
+
+            digest = await asyncio.to_thread(self._hash_file, part_file, offset, algorithm) if offset else hashlib.new(algorithm)
+
+            async with aiofiles.open(part_file, "ab" if offset else "wb") as f:
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    digest.update(chunk)
+                    await f.write(chunk)
+
+        return digest.hexdigest()
+
+    def _read_validator(self, validator_file: str) -> str | None:
+        if not os.path.exists(validator_file):
+            return None
+
+        with open(validator_file, "r") as f:
+            return f.read().strip() or None
+
+    def _write_validator(self, validator_file: str, headers: httpx.Headers) -> None:
+        etag = headers.get("ETag", "")
+
+        # weak etags can't be used with If-Range
+        validator = etag if etag and not etag.startswith("W/") else headers.get("Last-Modified", "")
+
+        if not validator:
+            if os.path.exists(validator_file):
+                os.remove(validator_file)
+            return
+
+        with open(validator_file, "w") as f:
+            f.write(validator)
+
+    def _hash_file(self, path: str, size: int, algorithm: str) -> Any:
+        digest = hashlib.new(algorithm)
+
+        with open(path, "rb") as f:
+            while size > 0 and (chunk := f.read(min(self.chunk_size, size))):
+                digest.update(chunk)
+                size -= len(chunk)
+
+        return digest
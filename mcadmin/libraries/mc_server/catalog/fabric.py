@@ -0,0 +1,124 @@
+import httpx
+import os
+import logging
+import asyncio
+from .error import McServerCatalogError
+from .abstract import McServerSpecializedCatalog
+from .downloader import McServerDownloader
+from .metadata_cache import McServerMetadataCache
+
+__all__ = ["FabricServerCatalog"]
+
+logger = logging.getLogger(__name__)
+
+
+class FabricServerCatalog(McServerSpecializedCatalog):
+    capabilities: list[str] = ["datapacks", "mods"]
+    # the launch jar expects the vanilla server jar in the working directory
+    link_paths: list[str] = ["libraries", "server.jar"]
+
+    meta_url: str = "https://meta.fabricmc.net/v2"
+
+    def __init__(
+        self,
+        version_dir: str,
+        server_version: str,
+        *,
+        java_bin: str = "java",
+        http_client: httpx.AsyncClient,
+        metadata_cache: McServerMetadataCache,
+    ) -> None:
+        self._version_dir: str = version_dir
+        self._server_version: str = server_version
+        self._java_bin: str = java_bin
+        self._http_client: httpx.AsyncClient = http_client
+        self._metadata_cache: McServerMetadataCache = metadata_cache
+
+        self._installer_path = os.path.join(version_dir, "fabric-installer.jar")
+        self._launch_jar_path = os.path.join(version_dir, "fabric-server-launch.jar")
+
+    async def download(self, *, low_priority: bool = False) -> None:
+        loader_version = await self._get_loader_version()
+        installer = await self._get_installer()
+        sha1 = await self._get_installer_sha1(installer["url"])
+
+        await McServerDownloader(self._http_client).download(installer["url"], self._installer_path, sha1=sha1)
+        await self._run_installer(loader_version, low_priority=low_priority)
+
+    async def get_jvm_args(self) -> list[str]:
+        return [f"-jar {self._launch_jar_path}"]
+
+    async def list_versions(self) -> list[str]:
+        game_versions = await self._metadata_cache.get_json(f"{self.meta_url}/versions/game")
+
+        # listed newest first, snapshots are flagged unstable
+        return [v["version"] for v in game_versions if v.get("stable")]
+
+    async def _get_loader_version(self) -> str:
+        loaders = await self._metadata_cache.get_json(f"{self.meta_url}/versions/loader/{self._server_version}")
+
+        if not loaders:
+            raise McServerCatalogError(f"Fabric version {self._server_version} not found")
+
+        loader = next((l["loader"] for l in loaders if l["loader"].get("stable")), loaders[0]["loader"])
+
+        return loader["version"]
+
+    async def _get_installer(self) -> dict:
+        installers = await self._metadata_cache.get_json(f"{self.meta_url}/versions/installer")
+
+        if not installers:
+            raise McServerCatalogError("No Fabric installer available")
+
+        return next((i for i in installers if i.get("stable")), installers[0])
+
+    async def _get_installer_sha1(self, url: str) -> str | None:
+        # the fabric maven publishes a .sha1 file next to each artifact
+        try:
+            response = await self._http_client.get(f"{url}.sha1")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Unable to fetch the Fabric installer checksum ({e}). The installer won't be verified")
+            return None
+
+        return response.text.strip().split()[0]
+
+    async def _run_installer(self, loader_version: str, *, low_priority: bool = False) -> None:
+        logger.info(f"Running Fabric installer (loader {loader_version})")
+
+        if not os.path.exists(self._version_dir):
+            os.makedirs(self._version_dir)
+
+        process = await asyncio.create_subprocess_exec(
+            self._java_bin,
+            "-jar",
+            self._installer_path,
+            "server",
+            "-dir",
+            self._version_dir,
+            "-mcversion",
+            self._server_version,
+            "-loader",
+            loader_version,
+            "-downloadMinecraft",
+            cwd=self._version_dir,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            preexec_fn=self._lower_priority if low_priority else None,
+        )
+
+        stdout, stderr = await process.communicate()
+
+        if process.returncode != 0:
+            raise McServerCatalogError(f"Fabric installer failed: {stderr.decode().strip()}")
+
+        if not os.path.exists(self._launch_jar_path):
+            raise McServerCatalogError("Could not find the Fabric server launch jar after installation")
+
+        logger.info(f"Fabric installer completed successfully")
+
+        await asyncio.to_thread(os.remove, self._installer_path)
+
+    def _lower_priority(self) -> None:
+        # runs in the installer process. The default I/O priority follows the nice value on Linux
+        os.nice(19)
@@ -1,11 +1,13 @@
-import aiofiles
 import httpx
 import os
 import logging
 import asyncio
 from glob import glob
+from packaging import version
 from .error import McServerCatalogError
 from .abstract import McServerSpecializedCatalog
+from .downloader import McServerDownloader
+from .metadata_cache import McServerMetadataCache
 
 __all__ = ["ForgeServerCatalog"]
 
@@ -16,26 +18,31 @@ class ForgeServerCatalog(McServerSpecializedCatalog):
     capabilities: list[str] = ["datapacks", "mods"]
     link_paths: list[str] = ["libraries"]
 
-    def __init__(self, version_dir: str, server_version: str, *, java_bin: str = "java") -> None:
+    def __init__(
+        self,
+        version_dir: str,
+        server_version: str,
+        *,
+        java_bin: str = "java",
+        http_client: httpx.AsyncClient,
+        metadata_cache: McServerMetadataCache,
+    ) -> None:
         self._version_dir: str = version_dir
         self._server_version: str = server_version
         self._java_bin: str = java_bin
+        self._http_client: httpx.AsyncClient = http_client
+        self._metadata_cache: McServerMetadataCache = metadata_cache
 
         self._versions_index_url = "https://files.minecraftforge.net/net/minecraftforge/forge/maven-metadata.json"
         self._version_download_url = "https://files.minecraftforge.net/maven/net/minecraftforge/forge/{version}/forge-{version}-installer.jar"
-        self._installer_path = "/tmp/forge-installer.jar"
+        self._installer_path = os.path.join(version_dir, "forge-installer.jar")
 
-    async def download(self) -> None:
+    async def download(self, *, low_priority: bool = False) -> None:
         url = await self._get_installer_download_url()
+        sha1 = await self._get_installer_sha1(url)
 
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-
-            async with aiofiles.open(self._installer_path, "wb") as f:
-                await f.write(response.content)
-
-        await self._run_installer()
+        await McServerDownloader(self._http_client).download(url, self._installer_path, sha1=sha1)
+        await self._run_installer(low_priority=low_priority)
 
     async def get_jvm_args(self) -> list[str]:
         # search for a forge-<version>*.jar file
@@ -57,13 +64,24 @@ class ForgeServerCatalog(McServerSpecializedCatalog):
 
         raise McServerCatalogError("Could not find the Forge server jar after installation")
 
-    async def _get_installer_download_url(self) -> str:
-        logger.info(f"Fetching Forge versions index from {self._versions_index_url}")
+    async def list_versions(self) -> list[str]:
+        versions = await self._metadata_cache.get_json(self._versions_index_url)
+        releases = []
 
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(self._versions_index_url)
-            response.raise_for_status()
-            versions = response.json()
+        # keys are minecraft versions, including a few pre-releases (1.7.10_pre4)
+        for v in versions.keys():
+            try:
+                parsed = version.Version(v)
+            except version.InvalidVersion:
+                continue
+
+            if not parsed.is_prerelease:
+                releases.append((parsed, v))
+
+        return [v for (_, v) in sorted(releases, reverse=True)]
+
+    async def _get_installer_download_url(self) -> str:
+        versions = await self._metadata_cache.get_json(self._versions_index_url)
 
         if not self._server_version in versions:
             raise McServerCatalogError(f"Forge version {self._server_version} not found")
@@ -71,7 +89,18 @@ class ForgeServerCatalog(McServerSpecializedCatalog):
         version_name = versions[self._server_version][-1]
         return self._version_download_url.format(version=version_name)
 
-    async def _run_installer(self) -> None:
+    async def _get_installer_sha1(self, url: str) -> str | None:
+        # the forge maven publishes a .sha1 file next to each artifact
+        try:
+            response = await self._http_client.get(f"{url}.sha1")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Unable to fetch the Forge installer checksum ({e}). The installer won't be verified")
+            return None
+
+        return response.text.strip().split()[0]
+
+    async def _run_installer(self, *, low_priority: bool = False) -> None:
         logger.info(f"Running Forge installer")
         
         if not os.path.exists(self._version_dir):
@@ -85,7 +114,8 @@ class ForgeServerCatalog(McServerSpecializedCatalog):
             self._version_dir,
             cwd=self._version_dir,
             stdout=asyncio.subprocess.DEVNULL,
-            stderr=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            preexec_fn=self._lower_priority if low_priority else None,
         )
 
         stdout, stderr = await process.communicate()
@@ -96,3 +126,7 @@ class ForgeServerCatalog(McServerSpecializedCatalog):
         logger.info(f"Forge installer completed successfully")
 
         await asyncio.to_thread(os.remove, self._installer_path)
+
+    def _lower_priority(self) -> None:
+        # runs in the installer process. The default I/O priority follows the nice value on Linux
+        os.nice(19)
\ No newline at end of file
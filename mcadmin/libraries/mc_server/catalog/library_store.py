@@ -0,0 +1,139 @@
+import errno
+import hashlib
+import logging
+import os
+import stat
+import asyncio
+import weakref
+
+__all__ = ["McServerLibraryStore"]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerLibraryStore:
+    """Low level content-addressed library store, shared by all installed server versions. Identical library files
+    of different versions are hardlinked to a single stored copy, so the link count of a stored file is its reference
+    count and files no version uses anymore are removed by gc"""
+
+    chunk_size: int = 1024 * 1024
+
+    _locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def __init__(self, store_dir: str) -> None:
+        self._store_dir: str = store_dir
+
+        # keeps gc from removing a file between it being stored and linked by a concurrent install
+        self._lock: asyncio.Lock = self._locks.setdefault(store_dir, asyncio.Lock())
+
+    def get_path(self, sha256: str) -> str:
+        return os.path.join(self._store_dir, sha256[:2], sha256)
+
+    async def dedupe(self, libraries_dir: str) -> int:
+        """Replace the files of libraries_dir with links to the stored copies, storing the new ones.
+        Returns the number of bytes saved"""
+        if not os.path.isdir(libraries_dir):
+            return 0
+
+        async with self._lock:
+            saved = await asyncio.to_thread(self._dedupe, libraries_dir)
+
+        if saved:
+            logger.info(f"Deduplicated {saved / 1024**2:.1f} MB of libraries in {libraries_dir}")
+
+        return saved
+
+    async def gc(self) -> int:
+        """Remove the stored files which are not linked by any version anymore. Returns the number of removed files"""
+        async with self._lock:
+            removed = await asyncio.to_thread(self._gc)
+
+        if removed:
+            logger.info(f"Removed {removed} unreferenced file(s) from the library store")
+
+        return removed
+
+    def _dedupe(self, libraries_dir: str) -> int:
+        inodes = self._index()
+        saved = 0
+
+        for root, dirs, files in os.walk(libraries_dir):
+            for f in files:
+                path = os.path.join(root, f)
+                st = os.lstat(path)
+
+                # already linked to the store
+                if not stat.S_ISREG(st.st_mode) or (st.st_dev, st.st_ino) in inodes:
+                    continue
+
+                sha256 = self._hash_file(path)
+                stored = self.get_path(sha256)
+
+                if os.path.exists(stored):
+                    if self._link(stored, path):
+                        saved += st.st_size
+                else:
+                    os.makedirs(os.path.dirname(stored), exist_ok=True)
+
+                    if self._link(path, stored):
+                        inodes[(st.st_dev, st.st_ino)] = sha256
+
+        return saved
+
+    def _gc(self) -> int:
+        removed = 0
+
+        if not os.path.isdir(self._store_dir):
+            return removed
+
+        for root, dirs, files in os.walk(self._store_dir):
+            for f in files:
+                path = os.path.join(root, f)
+
+                if os.lstat(path).st_nlink == 1:
+                    os.remove(path)
+                    removed += 1
+
+        return removed
+
+    def _index(self) -> dict[tuple[int, int], str]:
+        inodes = {}
+
+        if not os.path.isdir(self._store_dir):
+            return inodes
+
+        for root, dirs, files in os.walk(self._store_dir):
+            for f in files:
+                st = os.lstat(os.path.join(root, f))
+                inodes[(st.st_dev, st.st_ino)] = f
+
+        return inodes
+
+    def _hash_file(self, path: str) -> str:
+        digest = hashlib.sha256()
+
+        with open(path, "rb") as f:
+            while chunk := f.read(self.chunk_size):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _link(self, src: str, dst: str) -> bool:
+        tmp = f"{dst}.link"
+
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+
+        try:
+            os.link(src, tmp)
+        except OSError as e:
+            # no hardlinks across filesystems, the file simply stays a separate copy
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+            logger.debug(f"Unable to hardlink {src} ({e}). Keeping a separate copy")
+            return False
+
+        os.replace(tmp, dst)
+
+        return True
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import time
+import logging
+import asyncio
+import weakref
+from typing import Any
+import aiofiles
+import httpx
+from .error import McServerCatalogError
+
+__all__ = ["McServerMetadataCache"]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerMetadataCache:
+    """Low level on-disk cache for upstream version metadata. Entries are revalidated with ETag / If-Modified-Since
+    once their ttl expired, stale entries are served when upstream is unreachable and offline mode only serves from cache"""
+
+    timeout: float = 10
+
+    _locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def __init__(self, cache_dir: str, *, http_client: httpx.AsyncClient, ttl: int = 3600, offline: bool = False) -> None:
+        self._cache_dir: str = cache_dir
+        self._http_client: httpx.AsyncClient = http_client
+        self._ttl: int = ttl
+        self._offline: bool = offline
+
+    async def get_json(self, url: str, *, immutable: bool = False) -> Any:
+        """Get the json document at url. Immutable documents are never revalidated once cached"""
+        key = hashlib.sha256(url.encode()).hexdigest()
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        # concurrent requests for the same document share a single upstream request
+        async with lock:
+            (info, body) = await self._load(key)
+
+            if body is not None and (immutable or self._offline or time.time() - info.get("fetched_at", 0) < self._ttl):
+                return json.loads(body)
+
+            if self._offline:
+                raise McServerCatalogError(f"{url} is not cached and offline mode is enabled")
+
+            try:
+                return json.loads(await self._fetch(url, key, info, body))
+            except (httpx.HTTPError, ValueError) as e:
+                if body is None:
+                    raise McServerCatalogError(f"Failed to fetch {url} ({e})")
+
+                logger.warning(f"Failed to refresh {url} ({e}). Using cached copy from {time.ctime(info.get('fetched_at', 0))}")
+
+                return json.loads(body)
+
+    async def _fetch(self, url: str, key: str, info: dict, body: bytes | None) -> bytes:
+        headers = {}
+
+        if body is not None:
+            if info.get("etag"):
+                headers["If-None-Match"] = info["etag"]
+
+            if info.get("last_modified"):
+                headers["If-Modified-Since"] = info["last_modified"]
+
+        logger.info(f"Fetching {url}")
+
+        response = await self._http_client.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and body is not None:
+            logger.info(f"{url} not modified, using cached copy")
+
+            info["fetched_at"] = int(time.time())
+            await self._save(key, info, None)
+
+            return body
+
+        response.raise_for_status()
+
+        # validate before replacing a good cached copy
+        json.loads(response.content)
+
+        info = {
+            "url": url,
+            "etag": response.headers.get("etag", ""),
+            "last_modified": response.headers.get("last-modified", ""),
+            "fetched_at": int(time.time()),
+        }
+
+        await self._save(key, info, response.content)
+
+        return response.content
+
+    async def _load(self, key: str) -> tuple[dict, bytes | None]:
+        (info_file, body_file) = self._get_paths(key)
+
+        if not os.path.exists(info_file) or not os.path.exists(body_file):
+            return ({}, None)
+
+        try:
+            async with aiofiles.open(info_file, "r") as f:
+                info = json.loads(await f.read())
+
+            async with aiofiles.open(body_file, "rb") as f:
+                body = await f.read()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable metadata cache entry {key} ({e})")
+            return ({}, None)
+
+        return (info, body)
+
+    async def _save(self, key: str, info: dict, body: bytes | None) -> None:
+        (info_file, body_file) = self._get_paths(key)
+
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+        # body first: a crash in between leaves an outdated etag, which only costs a full refetch
+        if body is not None:
+            await self._write_atomic(body_file, body)
+
+        await self._write_atomic(info_file, json.dumps(info).encode())
+
+    async def _write_atomic(self, path: str, data: bytes) -> None:
+        tmp_file = f"{path}.tmp"
+
+        async with aiofiles.open(tmp_file, "wb") as f:
+            await f.write(data)
+
+        await asyncio.to_thread(os.replace, tmp_file, path)
+
+    def _get_paths(self, key: str) -> tuple[str, str]:
+        return (os.path.join(self._cache_dir, f"{key}.info.json"), os.path.join(self._cache_dir, f"{key}.json"))
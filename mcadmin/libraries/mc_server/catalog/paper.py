@@ -0,0 +1,132 @@
+import httpx
+import os
+import logging
+import asyncio
+from packaging import version
+from .error import McServerCatalogError
+from .abstract import McServerSpecializedCatalog
+from .downloader import McServerDownloader
+from .metadata_cache import McServerMetadataCache
+
+__all__ = ["PaperServerCatalog"]
+
+logger = logging.getLogger(__name__)
+
+
+class PaperServerCatalog(McServerSpecializedCatalog):
+    capabilities: list[str] = ["datapacks"]
+    # populated by paperclip (mojang jar, libraries, patched server jar), shared by all instances
+    link_paths: list[str] = ["cache", "libraries", "versions"]
+
+    # bukkit based servers keep each dimension in its own world dir (an existing world/DIM-1 is moved on first start)
+    dimensions: dict[str, str] = {
+        "overworld": "world",
+        "the_nether": "world_nether/DIM-1",
+        "the_end": "world_the_end/DIM1",
+    }
+    world_dirs: list[str] = ["world", "world_nether", "world_the_end"]
+    data_dirs: list[str] = ["plugins"]
+
+    project: str = "paper"
+    api_url: str = "https://fill.papermc.io/v3/projects/paper"
+
+    def __init__(
+        self,
+        version_dir: str,
+        server_version: str,
+        *,
+        java_bin: str = "java",
+        http_client: httpx.AsyncClient,
+        metadata_cache: McServerMetadataCache,
+    ) -> None:
+        self._version_dir: str = version_dir
+        self._server_version: str = server_version
+        self._java_bin: str = java_bin
+        self._http_client: httpx.AsyncClient = http_client
+        self._metadata_cache: McServerMetadataCache = metadata_cache
+
+        self._jar_path = os.path.join(version_dir, f"{self.project}-{server_version}.jar")
+
+    async def download(self, *, low_priority: bool = False) -> None:
+        download_info = await self._get_download_info()
+
+        await McServerDownloader(self._http_client).download(
+            download_info["url"],
+            self._jar_path,
+            sha256=download_info.get("sha256"),
+            md5=download_info.get("md5"),
+        )
+        await self._run_paperclip(low_priority=low_priority)
+
+    async def get_jvm_args(self) -> list[str]:
+        return [f"-jar {self._jar_path}"]
+
+    async def list_versions(self) -> list[str]:
+        project = await self._metadata_cache.get_json(self.api_url)
+
+        # versions are grouped by major version
+        return self._sort_releases([v for group in project["versions"].values() for v in group])
+
+    async def _get_download_info(self) -> dict:
+        data = await self._metadata_cache.get_json(f"{self.api_url}/versions/{self._server_version}/builds")
+        builds = data if isinstance(data, list) else data.get("builds", [])
+        builds = [b for b in builds if "server:default" in b.get("downloads", {})]
+
+        if not builds:
+            raise McServerCatalogError(f"{self.project.capitalize()} version {self._server_version} not found")
+
+        builds.sort(key=lambda b: b["id"], reverse=True)
+        build = next((b for b in builds if b.get("channel") == "STABLE"), None)
+
+        if not build:
+            build = builds[0]
+            logger.warning(f"No stable {self.project.capitalize()} build for {self._server_version}, using {build.get('channel', '').lower()} build {build['id']}")
+
+        download = build["downloads"]["server:default"]
+
+        return {"url": download["url"], "sha256": download.get("checksums", {}).get("sha256")}
+
+    async def _run_paperclip(self, *, low_priority: bool = False) -> None:
+        logger.info(f"Running {self.project.capitalize()} paperclip")
+
+        # patch only: sets up the mojang jar, libraries and patched server jar without starting the server
+        process = await asyncio.create_subprocess_exec(
+            self._java_bin,
+            "-Dpaperclip.patchonly=true",
+            "-jar",
+            self._jar_path,
+            cwd=self._version_dir,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            preexec_fn=self._lower_priority if low_priority else None,
+        )
+
+        stdout, stderr = await process.communicate()
+
+        if process.returncode != 0:
+            raise McServerCatalogError(f"{self.project.capitalize()} paperclip failed: {stderr.decode().strip()}")
+
+        # older paperclip versions only use the cache dir, links must not dangle
+        for path in self.link_paths:
+            os.makedirs(os.path.join(self._version_dir, path), exist_ok=True)
+
+        logger.info(f"{self.project.capitalize()} paperclip completed successfully")
+
+    def _sort_releases(self, versions: list[str]) -> list[str]:
+        releases = []
+
+        # pre-releases and release candidates are listed along releases
+        for v in versions:
+            try:
+                parsed = version.Version(v)
+            except version.InvalidVersion:
+                continue
+
+            if not parsed.is_prerelease:
+                releases.append((parsed, v))
+
+        return [v for (_, v) in sorted(releases, reverse=True)]
+
+    def _lower_priority(self) -> None:
+        # runs in the paperclip process. The default I/O priority follows the nice value on Linux
+        os.nice(19)
@@ -1,8 +1,8 @@
 import os
 import logging
 import httpx
-import aiofiles
 from packaging import version
+from .downloader import McServerDownloader
 
 __all__ = ["McServerPatcher"]
 
@@ -10,9 +10,10 @@ logger = logging.getLogger(__name__)
 
 
 class McServerPatcher:
-    def __init__(self, version_dir: str, server_version: str) -> None:
+    def __init__(self, version_dir: str, server_version: str, *, http_client: httpx.AsyncClient) -> None:
         self._version_dir: str = version_dir
         self._server_version: str = server_version
+        self._http_client: httpx.AsyncClient = http_client
 
     async def patch(self) -> None:
         """Apply necessary patches to the server installation"""
@@ -51,10 +52,10 @@ class McServerPatcher:
             pass
         elif v < version.parse("1.12"):
             file = os.path.join(self._version_dir, "log4j2_17-111.xml")
-            await self._download_file(v17_111_patch, file)
+            await self._download_file(v17_111_patch, file, sha1="4bb89a97a66f350bc9f73b3ca8509632682aea2e")
         elif v < version.parse("1.17"):
             file = os.path.join(self._version_dir, "log4j2_112-116.xml")
-            await self._download_file(v112_116_patch, file)
+            await self._download_file(v112_116_patch, file, sha1="02937d122c86ce73319ef9975b58896fc1b491d1")
 
     async def _get_log4j_jvm_args(self) -> list[str]:
         args = []
@@ -73,12 +74,9 @@ class McServerPatcher:
 
         return args
 
-    async def _download_file(self, url: str, dest: str) -> None:
-        logger.info(f"Downloading {url}")
+    async def _download_file(self, url: str, dest: str, *, sha1: str | None = None) -> None:
+        # already there when the version was copied from a mirror
+        if os.path.exists(dest):
+            return
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-
-            async with aiofiles.open(dest, "wb") as f:
-                await f.write(response.content)
+        await McServerDownloader(self._http_client).download(url, dest, sha1=sha1)
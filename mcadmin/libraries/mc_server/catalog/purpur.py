@@ -0,0 +1,36 @@
+import logging
+from .error import McServerCatalogError
+from .paper import PaperServerCatalog
+
+__all__ = ["PurpurServerCatalog"]
+
+logger = logging.getLogger(__name__)
+
+
+class PurpurServerCatalog(PaperServerCatalog):
+    """Purpur is a Paper fork distributed as a paperclip jar as well, only the download API differs"""
+
+    project: str = "purpur"
+    api_url: str = "https://api.purpurmc.org/v2/purpur"
+
+    async def list_versions(self) -> list[str]:
+        project = await self._metadata_cache.get_json(self.api_url)
+
+        return self._sort_releases(project["versions"])
+
+    async def _get_download_info(self) -> dict:
+        project = await self._metadata_cache.get_json(self.api_url)
+
+        if not self._server_version in project["versions"]:
+            raise McServerCatalogError(f"Purpur version {self._server_version} not found")
+
+        builds = await self._metadata_cache.get_json(f"{self.api_url}/{self._server_version}")
+        build_id = builds["builds"]["latest"]
+
+        # build details never change once published
+        build = await self._metadata_cache.get_json(f"{self.api_url}/{self._server_version}/{build_id}", immutable=True)
+
+        if build.get("result") != "SUCCESS":
+            raise McServerCatalogError(f"Latest Purpur build {build_id} for {self._server_version} is not usable ({build.get('result')})")
+
+        return {"url": f"{self.api_url}/{self._server_version}/{build_id}/download", "md5": build.get("md5")}
@@ -1,9 +1,10 @@
-import aiofiles
 import httpx
 import os
 import logging
 from .error import McServerCatalogError
 from .abstract import McServerSpecializedCatalog
+from .downloader import McServerDownloader
+from .metadata_cache import McServerMetadataCache
 
 __all__ = ["VanillaServerCatalog"]
 
@@ -14,27 +15,29 @@ class VanillaServerCatalog(McServerSpecializedCatalog):
     capabilities: list[str] = ["datapacks"]
     link_paths: list[str] = []
 
-    def __init__(self, version_dir: str, server_version: str, *, java_bin: str = "java") -> None:
+    def __init__(
+        self,
+        version_dir: str,
+        server_version: str,
+        *,
+        java_bin: str = "java",
+        http_client: httpx.AsyncClient,
+        metadata_cache: McServerMetadataCache,
+    ) -> None:
         self._version_dir: str = version_dir
         self._server_version: str = server_version
         self._java_bin: str = java_bin
+        self._http_client: httpx.AsyncClient = http_client
+        self._metadata_cache: McServerMetadataCache = metadata_cache
 
         self._versions_index_url = "https://launchermeta.mojang.com/mc/game/version_manifest.json"
 
-    async def download(self) -> None:
-        url = await self._get_download_url()
+    async def download(self, *, low_priority: bool = False) -> None:
+        download_info = await self._get_download_info()
         filename = f"server-{self._server_version}.jar"
         jar_path = os.path.join(self._version_dir, filename)
 
-        if not os.path.exists(self._version_dir):
-            os.makedirs(self._version_dir)
-
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-
-            async with aiofiles.open(jar_path, "wb") as f:
-                await f.write(response.content)
+        await McServerDownloader(self._http_client).download(download_info["url"], jar_path, sha1=download_info.get("sha1"))
 
     async def get_jvm_args(self) -> list[str]:
         filename = f"server-{self._server_version}.jar"
@@ -42,13 +45,14 @@ class VanillaServerCatalog(McServerSpecializedCatalog):
 
         return [f"-jar {jar_path}"]
 
-    async def _get_download_url(self) -> str:
-        logger.info(f"Fetching versions index from {self._versions_index_url}")
+    async def list_versions(self) -> list[str]:
+        versions_index = await self._metadata_cache.get_json(self._versions_index_url)
 
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(self._versions_index_url)
-            response.raise_for_status()
-            versions_index = response.json()
+        # the manifest lists versions newest first
+        return [v["id"] for v in versions_index["versions"] if v.get("type") == "release"]
+
+    async def _get_download_info(self) -> dict:
+        versions_index = await self._metadata_cache.get_json(self._versions_index_url)
 
         # search for desired version
         version_info = next((v for v in versions_index["versions"] if v["id"] == self._server_version), None)
@@ -56,13 +60,10 @@ class VanillaServerCatalog(McServerSpecializedCatalog):
         if not version_info:
             raise McServerCatalogError(f"Server version {self._server_version} not found")
 
-        version_manifest_url = version_info["url"]
-
-        logger.info(f"Fetching version manifest from {version_manifest_url}")
+        # version manifest urls are content addressed (the path holds the manifest sha1), they never change
+        manifest = await self._metadata_cache.get_json(version_info["url"], immutable=True)
 
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(version_manifest_url)
-            response.raise_for_status()
-            manifest = response.json()
+        if "server" not in manifest.get("downloads", {}):
+            raise McServerCatalogError(f"Server version {self._server_version} has no server download")
 
-        return manifest["downloads"]["server"]["url"]
+        return manifest["downloads"]["server"]
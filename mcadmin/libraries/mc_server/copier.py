@@ -0,0 +1,214 @@
+import ctypes
+import errno
+import fcntl
+import logging
+import os
+import asyncio
+import platform
+import shutil
+import threading
+import time
+from typing import Any, BinaryIO, Callable
+
+
+__all__ = ["McServerCopier"]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerCopier:
+    """Low level throttled file copier. Keeps bulk copies from starving the running server of disk I/O"""
+
+    chunk_size: int = 1024 * 1024
+
+    # linux/fs.h FICLONE ioctl (btrfs, XFS reflinks)
+    ficlone: int = 0x40049409
+
+    # while the server reports lag, copies are slowed down to a fraction of the configured limit
+    lag_window: int = 30
+    lag_backoff_factor: int = 4
+    lag_fallback_bwlimit: int = 8 * 1024 * 1024
+
+    # (ioprio_set, ioprio_get) syscall numbers
+    ioprio_syscalls: dict = {
+        "x86_64": (251, 252),
+        "aarch64": (30, 31),
+        "i386": (289, 290),
+        "i686": (289, 290),
+        "armv7l": (314, 315),
+    }
+
+    def __init__(self, *, bwlimit: int = 0, idle_io: bool = True, lag_probe: Callable[[], float | None] | None = None) -> None:
+        self._bwlimit: int = bwlimit
+        self._idle_io: bool = idle_io
+        self._lag_probe: Callable[[], float | None] | None = lag_probe
+
+        self._lock: threading.Lock = threading.Lock()
+        self._tokens: float = float(bwlimit)
+        self._last_refill: float = time.monotonic()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run the given blocking function in a worker thread with idle I/O priority"""
+        return await asyncio.to_thread(self._run_idle, func, *args, **kwargs)
+
+    async def copytree(self, src: str, dst: str) -> int:
+        """Copy a directory tree. Returns the number of bytes copied"""
+        return await self.run(self._copytree, src, dst)
+
+    async def copyfile(self, src: str, dst: str) -> int:
+        """Copy a single file with its metadata. Returns the number of bytes copied"""
+        return await self.run(self._copy2, src, dst)
+
+    def wrap_writer(self, fileobj: BinaryIO) -> BinaryIO:
+        """Wrap a writable file object so that all writes go through the bandwidth limiter"""
+        return _ThrottledWriter(fileobj, self)  # type: ignore
+
+    def consume(self, size: int) -> None:
+        """Take size bytes from the token bucket, sleeping the calling thread if the bucket is empty"""
+        rate = self._get_rate()
+
+        if not rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+
+            self._tokens = min(self._tokens + (now - self._last_refill) * rate, float(rate))
+            self._last_refill = now
+            self._tokens -= size
+
+            delay = -self._tokens / rate if self._tokens < 0 else 0
+
+        if delay:
+            time.sleep(delay)
+
+    def _get_rate(self) -> int:
+        if not self._lag_probe:
+            return self._bwlimit
+
+        last_lag = self._lag_probe()
+
+        if last_lag is None or time.monotonic() - last_lag > self.lag_window:
+            return self._bwlimit
+
+        return (self._bwlimit or self.lag_fallback_bwlimit) // self.lag_backoff_factor
+
+    def _copytree(self, src: str, dst: str) -> int:
+        copied = 0
+
+        def copy_function(s: str, d: str) -> None:
+            nonlocal copied
+            copied += self._copy2(s, d)
+
+        shutil.copytree(src, dst, copy_function=copy_function)
+
+        return copied
+
+    def _copy2(self, src: str, dst: str) -> int:
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            # clones share extents with the source, so no data is read or written
+            if self._clone(fsrc, fdst):
+                copied = os.fstat(fsrc.fileno()).st_size
+            elif not self._get_rate():
+                copied = self._copy_range(fsrc, fdst)
+            else:
+                copied = self._copy_chunked(fsrc, fdst)
+
+        shutil.copystat(src, dst)
+
+        return copied
+
+    def _clone(self, fsrc: BinaryIO, fdst: BinaryIO) -> bool:
+        try:
+            fcntl.ioctl(fdst.fileno(), self.ficlone, fsrc.fileno())
+        except OSError:
+            return False
+
+        return True
+
+    def _copy_range(self, fsrc: BinaryIO, fdst: BinaryIO) -> int:
+        copied = 0
+
+        # in-kernel copy, which also reflinks on filesystems that support it
+        try:
+            while n := os.copy_file_range(fsrc.fileno(), fdst.fileno(), self.chunk_size * 64):
+                copied += n
+        except OSError as e:
+            if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+            return self._copy_chunked(fsrc, fdst)
+
+        return copied
+
+    def _copy_chunked(self, fsrc: BinaryIO, fdst: BinaryIO) -> int:
+        copied = 0
+
+        while chunk := fsrc.read(self.chunk_size):
+            self.consume(len(chunk))
+            fdst.write(chunk)
+            copied += len(chunk)
+
+        return copied
+
+    def _run_idle(self, func: Callable, *args, **kwargs) -> Any:
+        if not self._idle_io:
+            return func(*args, **kwargs)
+
+        ioprio_class_idle = 3
+        ioprio_class_shift = 13
+
+        prev_ioprio = self._ioprio_syscall("get")
+
+        if prev_ioprio is not None:
+            self._ioprio_syscall("set", ioprio_class_idle << ioprio_class_shift)
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # worker threads are pooled, don't leak the idle class to other jobs
+            if prev_ioprio is not None:
+                self._ioprio_syscall("set", prev_ioprio)
+
+    def _ioprio_syscall(self, op: str, ioprio: int = 0) -> int | None:
+        ioprio_who_process = 1
+
+        syscalls = self.ioprio_syscalls.get(platform.machine())
+
+        if not syscalls:
+            logger.debug(f"I/O priority not supported on {platform.machine()}")
+            return None
+
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+
+            # who=0 targets the calling thread
+            if op == "set":
+                rc = libc.syscall(syscalls[0], ioprio_who_process, 0, ioprio)
+            else:
+                rc = libc.syscall(syscalls[1], ioprio_who_process, 0)
+        except (OSError, AttributeError) as e:
+            logger.debug(f"Failed to call ioprio_{op} ({e})")
+            return None
+
+        if rc < 0:
+            logger.debug(f"ioprio_{op} failed ({os.strerror(ctypes.get_errno())})")
+            return None
+
+        return rc
+
+
+class _ThrottledWriter:
+    def __init__(self, fileobj: BinaryIO, copier: McServerCopier) -> None:
+        self._fileobj: BinaryIO = fileobj
+        self._copier: McServerCopier = copier
+
+    def write(self, data: bytes) -> int:
+        self._copier.consume(len(data))
+        return self._fileobj.write(data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._fileobj, name)
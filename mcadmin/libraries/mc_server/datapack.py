@@ -1,8 +1,8 @@
 import logging
 import os
 import asyncio
-from typing import BinaryIO
-import aiofiles
+from .datapack_metadata import McServerDatapackMetadata
+from .upload import McServerUpload
 
 
 __all__ = [
@@ -23,19 +23,16 @@ class McServerDatapack:
     def __init__(self, datapacks_dir: str) -> None:
         self._datapacks_dir: str = datapacks_dir
 
-    async def add(self, datapack_name: str, *, datapack_archive: BinaryIO) -> None:
-        """Add a datapack from a zip archive"""
-        if not os.path.exists(self._datapacks_dir):
-            logger.info(f"Creating datapacks directory")
-            os.makedirs(self._datapacks_dir)
+    async def add(self, datapack_name: str, *, datapack_upload: McServerUpload) -> dict:
+        """Add a datapack from an uploaded zip archive. The archive is only kept if its pack.mcmeta is valid.
+        Returns the datapack metadata"""
+        metadata = await asyncio.to_thread(McServerDatapackMetadata(datapack_upload.path).read)
 
-        datapack_file = os.path.join(self._datapacks_dir, f"{datapack_name}.zip")
+        await datapack_upload.commit(f"{datapack_name}.zip")
 
-        async with aiofiles.open(datapack_file, "wb") as f:
-            content = await asyncio.to_thread(datapack_archive.read)
-            await f.write(content)
+        logger.info(f"Datapack {datapack_name} added (pack format {metadata['pack_format']})")
 
-        logger.info(f"Datapack {datapack_name} added")
+        return metadata
 
     async def enable(self, datapack_name: str) -> None:
         """Enable a datapack by name"""
@@ -71,3 +68,15 @@ class McServerDatapack:
         await asyncio.to_thread(os.remove, datapack_file)
 
         logger.info(f"Datapack {datapack_name} removed")
+
+    async def read_metadata(self, datapack_name: str) -> dict:
+        """Read the metadata of a datapack, enabled or not"""
+        datapack_file = os.path.join(self._datapacks_dir, f"{datapack_name}.zip")
+
+        if not os.path.exists(datapack_file):
+            datapack_file = os.path.join(self._datapacks_dir, f"{datapack_name}.zip.disabled")
+
+        if not os.path.exists(datapack_file):
+            raise McServerDatapackError(f"Datapack {datapack_name} does not exist")
+
+        return await asyncio.to_thread(McServerDatapackMetadata(datapack_file).read)
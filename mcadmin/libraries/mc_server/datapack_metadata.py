@@ -0,0 +1,171 @@
+import json
+import logging
+import re
+import zipfile
+from packaging import version
+
+
+__all__ = [
+    "McServerDatapackMetadataError",
+    "McServerDatapackMetadata",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerDatapackMetadataError(ValueError):
+    pass
+
+
+class McServerDatapackMetadata:
+    """Low level datapack metadata reader. Reads pack.mcmeta and the namespaces of a datapack zip and checks its
+    pack format against a server version"""
+
+    # first server version using each data pack format
+    pack_formats: list[tuple[str, int]] = [
+        ("1.13", 4),
+        ("1.15", 5),
+        ("1.16.2", 6),
+        ("1.17", 7),
+        ("1.18", 8),
+        ("1.18.2", 9),
+        ("1.19", 10),
+        ("1.19.4", 12),
+        ("1.20", 15),
+        ("1.20.2", 18),
+        ("1.20.3", 26),
+        ("1.20.5", 41),
+        ("1.21", 48),
+        ("1.21.2", 57),
+        ("1.21.4", 61),
+        ("1.21.5", 71),
+        ("1.21.6", 80),
+        ("1.21.7", 81),
+        ("1.21.9", 88),
+    ]
+
+    # last server version the table above is known to be accurate for
+    max_known_version: str = "1.21.10"
+
+    namespace_pattern: str = r"^[a-z0-9_.-]+$"
+
+    def __init__(self, datapack_file: str) -> None:
+        self._datapack_file: str = datapack_file
+
+    def read(self) -> dict:
+        """Read pack.mcmeta and the namespace list of the datapack. Only the central directory and pack.mcmeta are read"""
+        try:
+            with zipfile.ZipFile(self._datapack_file, "r") as zf:
+                names = zf.namelist()
+
+                if "pack.mcmeta" not in names:
+                    raise McServerDatapackMetadataError("Datapack has no pack.mcmeta at its root")
+
+                mcmeta = json.loads(zf.read("pack.mcmeta").decode("utf-8-sig"), strict=False)
+        except (zipfile.BadZipFile, UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise McServerDatapackMetadataError(f"Failed to read datapack metadata ({e})")
+
+        pack = mcmeta.get("pack") if isinstance(mcmeta, dict) else None
+
+        if not isinstance(pack, dict):
+            raise McServerDatapackMetadataError("Datapack pack.mcmeta has no pack section")
+
+        pack_format = self._format_major(pack.get("pack_format"))
+        (min_format, max_format) = self._supported_formats(pack)
+
+        min_format = min_format if min_format is not None else pack_format
+        max_format = max_format if max_format is not None else pack_format
+
+        if min_format is None or max_format is None:
+            raise McServerDatapackMetadataError("Datapack pack.mcmeta has no pack format")
+
+        namespaces = sorted({n.split("/")[1] for n in names if n.startswith("data/") and n.count("/") >= 2 and n.split("/")[1]})
+
+        return {
+            "pack_format": pack_format if pack_format is not None else max_format,
+            "supported_formats": [min_format, max_format],
+            "description": self._flatten_text(pack.get("description", ""))[:255],
+            "namespaces": namespaces,
+        }
+
+    @classmethod
+    def check(cls, metadata: dict, *, server_version: str) -> list[str]:
+        """Check datapack metadata (as returned by read) against a server version. Returns the list of issues found"""
+        issues = []
+
+        for namespace in metadata.get("namespaces") or []:
+            if not re.match(cls.namespace_pattern, namespace):
+                issues.append(f"Namespace {namespace} contains invalid characters, the datapack will fail to load")
+
+        if not metadata.get("namespaces"):
+            issues.append("Datapack has no data namespaces")
+
+        server_format = cls.get_server_format(server_version)
+        (min_format, max_format) = metadata.get("supported_formats") or [metadata.get("pack_format"), metadata.get("pack_format")]
+
+        if server_format is None or min_format is None:
+            return issues
+
+        if not min_format <= server_format <= max_format:
+            formats = str(min_format) if min_format == max_format else f"{min_format}-{max_format}"
+            issues.append(f"Datapack is made for pack format {formats}, server {server_version} uses pack format {server_format}")
+
+        return issues
+
+    @classmethod
+    def get_server_format(cls, server_version: str) -> int | None:
+        """Get the data pack format of a server version, None if unknown"""
+        try:
+            v = version.parse(server_version)
+
+            if v > version.parse(cls.max_known_version):
+                return None
+
+            server_format = None
+
+            for first_version, pack_format in cls.pack_formats:
+                if v >= version.parse(first_version):
+                    server_format = pack_format
+
+            return server_format
+        except version.InvalidVersion:
+            return None
+
+    def _supported_formats(self, pack: dict) -> tuple[int | None, int | None]:
+        # 1.21.9+ packs declare min_format / max_format
+        if "min_format" in pack or "max_format" in pack:
+            min_format = self._format_major(pack.get("min_format", pack.get("max_format")))
+            max_format = self._format_major(pack.get("max_format", pack.get("min_format")))
+            return (min_format, max_format)
+
+        supported = pack.get("supported_formats")
+
+        if isinstance(supported, int):
+            return (supported, supported)
+        elif isinstance(supported, list) and len(supported) == 2:
+            return (self._format_major(supported[0]), self._format_major(supported[1]))
+        elif isinstance(supported, dict):
+            return (self._format_major(supported.get("min_inclusive")), self._format_major(supported.get("max_inclusive")))
+
+        return (None, None)
+
+    def _format_major(self, value) -> int | None:
+        # formats can be given as [major, minor]
+        if isinstance(value, list):
+            value = value[0] if value else None
+
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _flatten_text(self, component) -> str:
+        # descriptions are text components: a string, a {"text": ...} object or a list of those
+        if isinstance(component, str):
+            return component
+        elif isinstance(component, list):
+            return "".join(self._flatten_text(c) for c in component)
+        elif isinstance(component, dict):
+            return str(component.get("text", "")) + "".join(self._flatten_text(c) for c in component.get("extra", []))
+
+        return str(component)
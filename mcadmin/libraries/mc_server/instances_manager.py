@@ -1,18 +1,26 @@
+import contextlib
 import json
 import logging
 import os
 import asyncio
 import shutil
 import aiofiles
-import zipfile
+import httpx
 import socket
-from typing import BinaryIO
+from typing import Any, Callable
 from packaging import version
 from .catalog import McServerCatalog
 from .properties_generator import McServerPropertiesGenerator
 from .backup import McServerBackup
+from .copier import McServerCopier
 from .datapack import McServerDatapack
+from .datapack_metadata import McServerDatapackMetadata
+from .java_runtime import McServerJavaRuntime
 from .mod import McServerMod
+from .mod_metadata import McServerModMetadata
+from .mod_store import McServerModStore
+from .upload import McServerUpload, McServerUploadSession
+from .world_importer import McServerWorldImporter
 
 
 __all__ = [
@@ -34,13 +42,28 @@ class McServerInstMgr:
     default_server_port: int = 25565
     default_rcon_port: int = 25575
 
-    def __init__(self, work_dir: str, server_config: dict) -> None:
+    # seconds between startup and the first version prefetch
+    prefetch_delay: int = 60
+
+    # any format the world importer can extract
+    world_signatures: list[bytes] = [sig for sigs in McServerWorldImporter.signatures.values() for sig in sigs]
+
+    def __init__(self, work_dir: str, server_config: dict, *, http_client: httpx.AsyncClient, events_queue: asyncio.Queue | None = None) -> None:
         self._work_dir: str = work_dir
         self._server_config: dict = server_config
+        self._http_client: httpx.AsyncClient = http_client
+        self._events_queue: asyncio.Queue | None = events_queue
+
+        self._mod_store: McServerModStore = McServerModStore(os.path.join(work_dir, "mods_store"))
+        self._java_runtime: McServerJavaRuntime = McServerJavaRuntime(
+            os.path.join(work_dir, "runtimes"),
+            http_client=http_client,
+            source=server_config.get("java_runtime_source"),
+        )
 
         self._link_paths: list[str] = ["banned-ips.json", "banned-players.json", "ops.json", "usercache.json", "whitelist.json"]
 
-    async def create_instance(self, instance: str, *, server_type: str, server_version: str, world_archive: BinaryIO | None = None) -> None:
+    async def create_instance(self, instance: str, *, server_type: str, server_version: str, world_archive: str | None = None) -> None:
         """Create a new instance with the given parameters"""
         instance_dir = self.get_instance_dir(instance)
 
@@ -70,7 +93,7 @@ class McServerInstMgr:
         instance_dir = self.get_instance_dir(instance, assert_exists=True)
         info = await self._get_server_info(instance_dir)
 
-        java_bin = self._get_java_bin(info.get("server_version", ""))
+        java_bin = await self._get_java_bin(info.get("server_version", ""))
         catalog = self._catalog_factory(info.get("server_type", ""), info.get("server_version", ""))
 
         jvm_args = await catalog.get_jvm_args()
@@ -78,6 +101,7 @@ class McServerInstMgr:
 
         await self._link_common_files(instance_dir, additional_links=additional_links)
         await self._gen_start_script(instance_dir, jvm_args, java_bin=java_bin)
+        await self._check_datapacks(instance, server_version=info.get("server_version", ""))
         self._link_instance_to_current(instance)
 
         logger.info(f"Instance {instance} activated successfully")
@@ -87,41 +111,105 @@ class McServerInstMgr:
         instance_dir = self.get_instance_dir(instance, assert_exists=True)
 
         await asyncio.to_thread(shutil.rmtree, instance_dir)
+        await self._mod_store.gc()
 
         logger.info(f"Directory for instance {instance} deleted")
 
-    async def create_backup(self, instance: str, backup: str) -> None:
-        """Create a backup for the given instance"""
-        instance_dir = self.get_instance_dir(instance, assert_exists=True)
-        backups_dir = self._get_backup_dir(instance)
-        mc_backup = McServerBackup(instance_dir, backups_dir)
+    async def create_backup(
+        self,
+        instance: str,
+        backup: str,
+        *,
+        lag_probe: Callable[[], float | None] | None = None,
+        consistent: bool = True,
+    ) -> dict:
+        """Create a backup for the given instance. Returns the backup stats. consistent tells whether the world is
+        guaranteed not to change during the backup (server stopped or saving suspended)"""
+        if not consistent:
+            logger.warning(f"Unable to suspend world saving, backing up instance {instance} while the server keeps saving. The backup may be inconsistent")
+
+        mc_backup = self._backup_factory(instance, lag_probe=lag_probe)
 
-        await mc_backup.backup(backup)
+        return await mc_backup.backup(backup)
 
     async def restore_backup(self, instance: str, backup: str) -> None:
         """Restore a backup for the given instance"""
-        instance_dir = self.get_instance_dir(instance, assert_exists=True)
-        backups_dir = self._get_backup_dir(instance)
-        mc_backup = McServerBackup(instance_dir, backups_dir)
+        mc_backup = self._backup_factory(instance)
 
         await mc_backup.restore(backup)
 
         logger.info(f"Instance {instance} restored from backup {backup}")
 
+    async def list_backup_contents(self, instance: str, backup: str, *, prefix: str = "") -> list[dict]:
+        """List the contents of a backup for the given instance"""
+        mc_backup = self._backup_factory(instance)
+
+        return await mc_backup.list_contents(backup, prefix=prefix)
+
+    async def restore_backup_paths(self, instance: str, backup: str, paths: list[str]) -> None:
+        """Restore only the given paths from a backup for the given instance"""
+        mc_backup = self._backup_factory(instance)
+
+        await mc_backup.restore_paths(backup, paths)
+
+        logger.info(f"Instance {instance} paths {paths} restored from backup {backup}")
+
+    async def restore_backup_chunks(self, instance: str, backup: str, dimension: str, chunk_from: tuple[int, int], chunk_to: tuple[int, int]) -> None:
+        """Restore a range of chunks of a dimension from a backup for the given instance"""
+        mc_backup = self._backup_factory(instance)
+
+        await mc_backup.restore_chunks(backup, dimension, chunk_from, chunk_to)
+
+        logger.info(f"Instance {instance} chunks restored from backup {backup}")
+
+    def get_backup_location(self, instance: str, backup: str) -> tuple[str, str]:
+        """Get the path and format of a backup for the given instance"""
+        mc_backup = self._backup_factory(instance)
+
+        return mc_backup.locate(backup)
+
+    def get_export_members(self, instance: str, backup: str | None = None) -> list[tuple[str, str]]:
+        """Get the files to export for a directory backup or the live instance data"""
+        mc_backup = self._backup_factory(instance)
+
+        return mc_backup.get_export_members(backup)
+
     async def delete_backup(self, instance: str, backup: str) -> None:
         """Delete a backup for the given instance"""
-        instance_dir = self.get_instance_dir(instance, assert_exists=True)
-        backups_dir = self._get_backup_dir(instance)
-        mc_backup = McServerBackup(instance_dir, backups_dir)
+        mc_backup = self._backup_factory(instance)
 
         await mc_backup.delete_backup(backup)
 
-    async def add_datapack(self, instance: str, datapack_name: str, *, datapack_archive: BinaryIO) -> None:
-        """Add a datapack to the given instance"""
+    def create_world_upload(self, *, max_size: int = 0) -> McServerUpload:
+        """Create an upload receiver for a world archive, to be passed to create_instance"""
+        return McServerUpload(self._get_uploads_dir(), max_size=max_size, signatures=self.world_signatures)
+
+    async def create_upload_session(self, *, filename: str, size: int, max_size: int = 0) -> McServerUploadSession:
+        """Start a resumable world archive upload, to be passed to create_instance once completed"""
+        return await McServerUploadSession.create(
+            self._get_uploads_dir(),
+            filename=filename,
+            size=size,
+            max_size=max_size,
+            signatures=self.world_signatures,
+        )
+
+    async def get_upload_session(self, session_id: str) -> McServerUploadSession:
+        """Load an existing resumable upload"""
+        return await McServerUploadSession.load(self._get_uploads_dir(), session_id, signatures=self.world_signatures)
+
+    def create_datapack_upload(self, instance: str, *, max_size: int = 0) -> McServerUpload:
+        """Create an upload receiver writing into the datapacks directory of the given instance"""
+        datapacks_dir = self._get_datapacks_dir(instance)
+
+        return McServerUpload(datapacks_dir, max_size=max_size, signatures=McServerUpload.zip_signatures)
+
+    async def add_datapack(self, instance: str, datapack_name: str, *, datapack_upload: McServerUpload) -> dict:
+        """Add a datapack to the given instance. Returns the datapack metadata"""
         datapacks_dir = self._get_datapacks_dir(instance)
         mc_datapack = McServerDatapack(datapacks_dir)
 
-        await mc_datapack.add(datapack_name, datapack_archive=datapack_archive)
+        return await mc_datapack.add(datapack_name, datapack_upload=datapack_upload)
         
     async def toggle_datapack(self, instance: str, datapack_name: str, *, enable: bool) -> None:
         """Enable or disable a datapack for the given instance"""
@@ -140,17 +228,34 @@ class McServerInstMgr:
 
         await mc_datapack.delete(datapack_name)
 
-    async def add_mod(self, instance: str, mod_name: str, *, mod_jar: BinaryIO) -> None:
+    async def read_datapack_metadata(self, instance: str, datapack_name: str) -> dict:
+        """Read the metadata of a datapack from the given instance"""
+        datapacks_dir = self._get_datapacks_dir(instance)
+        mc_datapack = McServerDatapack(datapacks_dir)
+
+        return await mc_datapack.read_metadata(datapack_name)
+
+    def check_datapack(self, metadata: dict, *, server_version: str) -> list[str]:
+        """Check datapack metadata against a server version"""
+        return McServerDatapackMetadata.check(metadata, server_version=server_version)
+
+    def create_mod_upload(self, instance: str, *, max_size: int = 0) -> McServerUpload:
+        """Create an upload receiver writing into the mods directory of the given instance"""
+        mods_dir = self._get_mods_dir(instance)
+
+        return McServerUpload(mods_dir, max_size=max_size, signatures=McServerUpload.zip_signatures)
+
+    async def add_mod(self, instance: str, mod_name: str, *, mod_upload: McServerUpload) -> None:
         """Add a mod to the given instance"""
         mods_dir = self._get_mods_dir(instance)
-        mc_mod = McServerMod(mods_dir)
+        mc_mod = McServerMod(mods_dir, self._mod_store)
 
-        await mc_mod.add(mod_name, mod_jar=mod_jar)
+        await mc_mod.add(mod_name, mod_upload=mod_upload)
         
     async def toggle_mod(self, instance: str, mod_name: str, *, enable: bool) -> None:
         """Enable or disable a mod for the given instance"""
         mods_dir = self._get_mods_dir(instance)
-        mc_mod = McServerMod(mods_dir)
+        mc_mod = McServerMod(mods_dir, self._mod_store)
 
         if enable:
             await mc_mod.enable(mod_name)
@@ -160,31 +265,122 @@ class McServerInstMgr:
     async def delete_mod(self, instance: str, mod_name: str) -> None:
         """Delete a mod from the given instance"""
         mods_dir = self._get_mods_dir(instance)
-        mc_mod = McServerMod(mods_dir)
+        mc_mod = McServerMod(mods_dir, self._mod_store)
 
         await mc_mod.delete(mod_name)
 
+    async def get_mod_sha256(self, instance: str, mod_name: str) -> str:
+        """Get the SHA-256 of a mod from the given instance"""
+        mods_dir = self._get_mods_dir(instance)
+        mc_mod = McServerMod(mods_dir, self._mod_store)
+
+        return await mc_mod.get_sha256(mod_name)
+
+    async def read_mod_metadata(self, instance: str, mod_name: str) -> list[dict]:
+        """Read the mods declared by a mod from the given instance"""
+        mods_dir = self._get_mods_dir(instance)
+        mc_mod = McServerMod(mods_dir, self._mod_store)
+
+        return await mc_mod.read_metadata(mod_name)
+
+    def check_mods(self, mods: list[dict], *, server_type: str, server_version: str) -> list[str]:
+        """Check a set of mods for missing dependencies, conflicts and incompatibilities with the server"""
+        return McServerModMetadata.check(mods, server_type=server_type, server_version=server_version)
+
     async def download_version(self, server_type: str, server_version: str) -> None:
-        catalog = self._catalog_factory(server_type, server_version)
+        if self._catalog_factory(server_type, server_version).is_installed():
+            return
+
+        # installers and the first run need java, the runtime is only resolved (and installed) here
+        java_bin = await self._get_java_bin(server_version)
+        catalog = self._catalog_factory(server_type, server_version, java_bin=java_bin)
 
         await catalog.download()
 
-    async def gen_properties(self, instance: str, *, properties: dict) -> None:
-        """Regenerate the server.properties file for the given instance"""
+    async def list_versions(self, server_type: str) -> list[str]:
+        """Get the supported release versions of a server type, newest first"""
+        catalog = self._catalog_factory(server_type, "")
+        min_version = version.parse(self.get_min_server_version())
+        versions = []
+
+        for v in await catalog.list_versions():
+            try:
+                if version.parse(v) >= min_version:
+                    versions.append(v)
+            except version.InvalidVersion:
+                continue
+
+        return versions
+
+    async def prefetch_versions(self, count: int) -> None:
+        """Install the latest count release versions of each server type ahead of time, one at a time and at low priority"""
+        for server_type in McServerCatalog.server_types.keys():
+            try:
+                versions = (await self.list_versions(server_type))[:count]
+            except Exception as e:
+                logger.warning(f"Failed to list {server_type} versions for prefetching ({e})")
+                continue
+
+            for server_version in versions:
+                if self._catalog_factory(server_type, server_version).is_installed():
+                    continue
+
+                logger.info(f"Prefetching server version {server_version} ({server_type})")
+
+                try:
+                    java_bin = await self._get_java_bin(server_version)
+                    catalog = self._catalog_factory(server_type, server_version, java_bin=java_bin)
+
+                    await catalog.download(low_priority=True)
+                except Exception as e:
+                    logger.warning(f"Failed to prefetch server version {server_version} ({server_type}): {e}")
+
+    async def run_prefetcher(self) -> None:
+        """Version prefetcher loop. This should be run in a dedicated task."""
+        count = self._server_config.get("prefetch_versions", 0)
+        interval = self._server_config.get("prefetch_interval", 21600)
+
+        logger.info(f"Starting version prefetcher (latest {count} release(s) every {interval} seconds)")
+
+        # leave the startup to the web server and the running instance
+        await asyncio.sleep(self.prefetch_delay)
+
+        while True:
+            try:
+                await self.prefetch_versions(count)
+            except Exception as e:
+                logger.exception(f"Version prefetch failed: {e}")
+
+            await asyncio.sleep(interval)
+
+    async def gen_properties(self, instance: str, *, properties: dict) -> bool:
+        """Merge the given properties into the server.properties file of the given instance. Returns whether the file changed"""
         instance_dir = self.get_instance_dir(instance, assert_exists=True)
+        info = await self._get_server_info(instance_dir)
+        catalog = self._catalog_factory(info.get("server_type", ""), info.get("server_version", ""))
+
         properties_generator = McServerPropertiesGenerator(
             instance_dir,
             server_ip=self._server_config.get("server_ip", self.default_server_ip),
             server_port=self._server_config.get("server_port", self.default_server_port),
             rcon_port=self._server_config.get("rcon_port", self.default_rcon_port),
+            defaults=catalog.get_default_properties(),
         )
 
-        await properties_generator.generate(properties)
+        return await properties_generator.generate(properties)
 
     def validate_properties(self, properties: dict) -> None:
         """Validate the given properties to ensure they conform to expected types and values for the server.properties file"""
         McServerPropertiesGenerator.validate_properties(properties)
 
+    def classify_properties(self, properties: dict, *, server_version: str) -> tuple[dict[str, str], list[str]]:
+        """Split changed properties into the ones applied live through console commands and the ones needing a restart"""
+        return McServerPropertiesGenerator.classify_properties(properties, server_version=server_version)
+
+    def is_command_error(self, response: str) -> bool:
+        """Check if a console command reply reports the command failed"""
+        return McServerPropertiesGenerator.is_command_error(response)
+
     def get_level_types(self) -> list[str]:
         """Get the list of supported level types"""
         return McServerPropertiesGenerator.level_types
@@ -227,13 +423,45 @@ class McServerInstMgr:
         """Get the capabilities of the given server type"""
         return McServerCatalog.server_types.get(server_type, {}).get("capabilities", [])
 
-    async def _import_world(self, instance_dir: str, world_archive: BinaryIO) -> None:
+    async def _import_world(self, instance_dir: str, world_archive: str) -> None:
         logger.info(f"Extracting existing world data archive")
 
-        # unzip archive
-        with zipfile.ZipFile(world_archive, "r") as zip_ref:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, zip_ref.extractall, os.path.join(instance_dir, "world"))
+        instance = os.path.basename(instance_dir)
+        loop = asyncio.get_running_loop()
+
+        # progress is reported from the extraction threads
+        def progress(data: dict) -> None:
+            loop.call_soon_threadsafe(self._publish_event, "import", {"instance": instance, **data})
+
+        importer = McServerWorldImporter(
+            os.path.join(instance_dir, "world"),
+            max_size=self._server_config.get("world_import_max_size", 0) * 1024 * 1024,
+            max_entries=self._server_config.get("world_import_max_entries", 0),
+            workers=self._server_config.get("world_import_workers", 4),
+            progress=progress,
+        )
+
+        await importer.import_archive(world_archive)
+
+    async def _check_datapacks(self, instance: str, *, server_version: str) -> None:
+        datapacks_dir = self._get_datapacks_dir(instance)
+
+        if not os.path.isdir(datapacks_dir):
+            return
+
+        # enabled datapacks only, reported before the server gets to fail on them
+        for name in sorted(os.listdir(datapacks_dir)):
+            if not name.endswith(".zip"):
+                continue
+
+            try:
+                metadata = await asyncio.to_thread(McServerDatapackMetadata(os.path.join(datapacks_dir, name)).read)
+                issues = McServerDatapackMetadata.check(metadata, server_version=server_version)
+            except ValueError as e:
+                issues = [str(e)]
+
+            for issue in issues:
+                logger.warning(f"Datapack {name}: {issue}")
 
     async def _accept_eula(self, instance_dir: str) -> None:
         logger.info(f"Accepting EULA")
@@ -290,6 +518,15 @@ class McServerInstMgr:
             content = await f.read()
             return json.loads(content)
 
+    def _get_server_type(self, instance_dir: str) -> str:
+        server_info_file = os.path.join(instance_dir, "server_info.json")
+
+        try:
+            with open(server_info_file, "r") as f:
+                return json.load(f).get("server_type", "")
+        except (OSError, ValueError):
+            return ""
+
     def _resolve_wildcard_ip(self, ip: str) -> str:
         if ip not in ("0.0.0.0", ""):
             return ip
@@ -304,6 +541,13 @@ class McServerInstMgr:
 
         return ip
 
+    def _publish_event(self, ev_type: str, data: Any) -> None:
+        if not self._events_queue:
+            return
+
+        with contextlib.suppress(asyncio.QueueFull):
+            self._events_queue.put_nowait((ev_type, data))
+
     def get_instance_dir(self, instance: str, *, assert_exists=False) -> str:
         instance_dir = os.path.join(self._work_dir, "instances", instance)
 
@@ -312,6 +556,9 @@ class McServerInstMgr:
 
         return instance_dir
 
+    def _get_uploads_dir(self) -> str:
+        return os.path.join(self._work_dir, "uploads")
+
     def _get_backup_dir(self, instance: str) -> str:
         return os.path.join(self.get_instance_dir(instance, assert_exists=True), "backups")
 
@@ -332,21 +579,44 @@ class McServerInstMgr:
 
         os.symlink(instance_dir, current_link)
 
-    def _get_java_bin(self, server_version: str) -> str:
+    async def _get_java_bin(self, server_version: str) -> str:
         if self._server_config.get("java_bin", ""):
             return self._server_config["java_bin"]
         else:
-            v = version.parse(server_version)
+            return await self._java_runtime.resolve(server_version)
+
+    def _backup_factory(self, instance: str, *, lag_probe: Callable[[], float | None] | None = None) -> McServerBackup:
+        instance_dir = self.get_instance_dir(instance, assert_exists=True)
+        backups_dir = self._get_backup_dir(instance)
+        # world and data dirs depend on the server type (bukkit based servers split the dimensions)
+        layout = McServerCatalog.get_world_layout(self._get_server_type(instance_dir))
+        copier = McServerCopier(
+            bwlimit=self._server_config.get("backup_bwlimit", 0) * 1024 * 1024,
+            idle_io=self._server_config.get("backup_idle_io", True),
+            lag_probe=lag_probe,
+        )
 
-            if v >= version.parse("1.21"):
-                return "java-21"
-            elif v >= version.parse("1.17"):
-                return "java-17"
-            else:
-                return "java-8"
+        return McServerBackup(
+            instance_dir,
+            backups_dir,
+            backup_format=self._server_config.get("backup_format", "dir"),
+            compression_level=self._server_config.get("backup_compression_level", 3),
+            compression_threads=self._server_config.get("backup_compression_threads", 0),
+            copier=copier,
+            mod_store=self._mod_store,
+            **layout,
+        )
 
-    def _catalog_factory(self, server_type: str, server_version: str) -> McServerCatalog:
+    def _catalog_factory(self, server_type: str, server_version: str, *, java_bin: str = "java") -> McServerCatalog:
         versions_dir = os.path.join(self._work_dir, "versions")
-        java_bin = self._get_java_bin(server_version)
 
-        return McServerCatalog(versions_dir, server_type, server_version, java_bin=java_bin)
+        return McServerCatalog(
+            versions_dir,
+            server_type,
+            server_version,
+            java_bin=java_bin,
+            http_client=self._http_client,
+            metadata_ttl=self._server_config.get("catalog_cache_ttl", 3600),
+            offline=self._server_config.get("catalog_offline", False),
+            mirror_dir=self._server_config.get("versions_mirror_dir"),
+        )
@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+import re
+import shutil
+import asyncio
+import platform
+import tarfile
+import weakref
+from glob import glob
+import aiofiles
+import httpx
+from packaging import version
+from .catalog.downloader import McServerDownloader
+from .catalog.error import McServerCatalogError
+
+
+__all__ = [
+    "McServerJavaRuntimeError",
+    "McServerJavaRuntime",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerJavaRuntimeError(Exception):
+    pass
+
+
+class McServerJavaRuntime:
+    """Low level Java runtime manager. Discovers the installed runtimes (probing each java binary once, the result
+    is cached on disk until the binary changes), picks the best one for a server version and installs missing
+    runtimes from an archive source"""
+
+    # (first server version, minimum java major, maximum java major). Only the latest range is left open, forge and
+    # mods of older versions break on class files newer than the java they were built for
+    java_requirements: list[tuple[str, int, int | None]] = [
+        ("1.7.10", 8, 8),
+        ("1.17", 16, 17),
+        ("1.18", 17, 17),
+        ("1.20.5", 21, None),
+    ]
+
+    # well known JDK locations, PATH is searched as well
+    search_paths: list[str] = [
+        "/opt/java-*/bin/java",
+        "/opt/java/*/bin/java",
+        "/usr/lib/jvm/*/bin/java",
+        "/usr/lib64/jvm/*/bin/java",
+        "/Library/Java/JavaVirtualMachines/*/Contents/Home/bin/java",
+    ]
+
+    # platform.machine() to archive arch names
+    archs: dict[str, str] = {
+        "x86_64": "x64",
+        "amd64": "x64",
+        "aarch64": "aarch64",
+        "arm64": "aarch64",
+    }
+
+    probes_file: str = ".probes.json"
+    probe_timeout: float = 30
+
+    _locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def __init__(self, runtimes_dir: str, *, http_client: httpx.AsyncClient, source: str | None = None) -> None:
+        self._runtimes_dir: str = runtimes_dir
+        self._http_client: httpx.AsyncClient = http_client
+        self._source: str | None = source
+
+        self._probes: dict | None = None
+        self._lock: asyncio.Lock = self._locks.setdefault(runtimes_dir, asyncio.Lock())
+
+    async def resolve(self, server_version: str) -> str:
+        """Get the java binary to run a server version with: the newest compatible runtime. A missing runtime is
+        installed from the source when one is configured"""
+        (min_major, max_major) = self.get_requirements(server_version)
+        runtime = self._pick(await self.list_runtimes(), min_major, max_major)
+
+        if not runtime and self._source:
+            await self.install(min_major)
+            runtime = self._pick(await self.list_runtimes(), min_major, max_major)
+
+        if not runtime:
+            logger.warning(f"No Java runtime compatible with server version {server_version} found (Java {min_major}+ needed). Falling back to 'java'")
+            return "java"
+
+        logger.debug(f"Using Java {runtime['version']} ({runtime['java_bin']}) for server version {server_version}")
+
+        return runtime["java_bin"]
+
+    async def list_runtimes(self) -> list[dict]:
+        """Get the installed runtimes ({java_bin, major, version}), newest first"""
+        async with self._lock:
+            return await self._list_runtimes()
+
+    async def install(self, major: int) -> str:
+        """Install the runtime of a java major version from the source. Returns its java binary"""
+        if not self._source:
+            raise McServerJavaRuntimeError("No Java runtime source configured")
+
+        arch = self.archs.get(platform.machine().lower(), platform.machine().lower())
+        source = self._source.format(major=major, arch=arch)
+        staging_dir = os.path.join(self._runtimes_dir, f".java-{major}.staging")
+
+        async with self._lock:
+            # a concurrent call may just have installed it, its dir must not be replaced under a running server
+            installed = self._pick(await self._list_runtimes(), major, major)
+
+            if installed:
+                return installed["java_bin"]
+
+            if not os.path.exists(self._runtimes_dir):
+                os.makedirs(self._runtimes_dir)
+
+            logger.info(f"Installing Java {major} runtime from {source}")
+
+            if re.match(r"^https?://", source):
+                archive = os.path.join(self._runtimes_dir, f".java-{major}.tar.gz")
+
+                try:
+                    await McServerDownloader(self._http_client).download(source, archive)
+                except McServerCatalogError as e:
+                    raise McServerJavaRuntimeError(f"Failed to download Java {major} runtime ({e})")
+            else:
+                # local mirror
+                archive = source
+
+                if not os.path.isfile(archive):
+                    raise McServerJavaRuntimeError(f"Java {major} runtime archive {archive} not found")
+
+            try:
+                java_home = await asyncio.to_thread(self._extract, archive, staging_dir)
+                java_version = await self._probe(os.path.join(java_home, "bin", "java"))
+
+                if not java_version:
+                    raise McServerJavaRuntimeError(f"Java {major} runtime from {source} is not runnable")
+
+                runtime_dir = os.path.join(self._runtimes_dir, f"java-{self._get_major(java_version)}")
+
+                if os.path.exists(runtime_dir):
+                    await asyncio.to_thread(shutil.rmtree, runtime_dir)
+
+                os.rename(java_home, runtime_dir)
+            finally:
+                if os.path.exists(staging_dir):
+                    await asyncio.to_thread(shutil.rmtree, staging_dir)
+
+                if archive != source and os.path.exists(archive):
+                    os.remove(archive)
+
+        logger.info(f"Installed Java {java_version} runtime in {runtime_dir}")
+
+        return os.path.join(runtime_dir, "bin", "java")
+
+    @classmethod
+    def get_requirements(cls, server_version: str) -> tuple[int, int | None]:
+        """Get the (minimum, maximum) java major versions able to run a server version"""
+        requirements = cls.java_requirements[0][1:]
+
+        try:
+            v = version.parse(server_version)
+        except version.InvalidVersion:
+            # snapshots and unknown versions get the newest requirements
+            return cls.java_requirements[-1][1:]
+
+        for first_version, min_major, max_major in cls.java_requirements:
+            if v >= version.parse(first_version):
+                requirements = (min_major, max_major)
+
+        return requirements
+
+    async def _list_runtimes(self) -> list[dict]:
+        await self._load_probes()
+
+        runtimes = []
+        seen = set()
+        changed = False
+
+        for java_bin in self._discover():
+            real_bin = os.path.realpath(java_bin)
+
+            if real_bin in seen:
+                continue
+
+            seen.add(real_bin)
+
+            st = os.stat(real_bin)
+            probe = self._probes.get(real_bin)
+
+            if not probe or probe["mtime"] != st.st_mtime or probe["size"] != st.st_size:
+                probe = {"mtime": st.st_mtime, "size": st.st_size, "version": await self._probe(java_bin)}
+                self._probes[real_bin] = probe
+                changed = True
+
+            if probe["version"]:
+                runtimes.append({"java_bin": java_bin, "major": self._get_major(probe["version"]), "version": probe["version"]})
+
+        if changed:
+            await self._save_probes()
+
+        return sorted(runtimes, key=lambda r: r["major"], reverse=True)
+
+    def _pick(self, runtimes: list[dict], min_major: int, max_major: int | None) -> dict | None:
+        # within the supported range newer runtimes bring better collectors and JIT improvements
+        return next((r for r in runtimes if r["major"] >= min_major and (max_major is None or r["major"] <= max_major)), None)
+
+    def _discover(self) -> list[str]:
+        candidates = glob(os.path.join(self._runtimes_dir, "*", "bin", "java"))
+
+        if os.environ.get("JAVA_HOME"):
+            candidates.append(os.path.join(os.environ["JAVA_HOME"], "bin", "java"))
+
+        for path_dir in filter(None, os.environ.get("PATH", "").split(os.pathsep)):
+            candidates.extend(glob(os.path.join(path_dir, "java")) + glob(os.path.join(path_dir, "java-*")))
+
+        for pattern in self.search_paths:
+            candidates.extend(glob(pattern))
+
+        return [c for c in candidates if os.path.isfile(c) and os.access(c, os.X_OK)]
+
+    async def _probe(self, java_bin: str) -> str:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                java_bin,
+                "-version",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:
+            logger.warning(f"Failed to probe Java runtime {java_bin} ({e})")
+            return ""
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.probe_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Failed to probe Java runtime {java_bin} (no answer in {self.probe_timeout} seconds)")
+
+            process.kill()
+            await process.wait()
+
+            return ""
+
+        # openjdk version "21.0.2" 2024-01-16 / java version "1.8.0_392"
+        match = re.search(r'version "([^"]+)"', stderr.decode(errors="replace"))
+
+        if process.returncode != 0 or not match:
+            logger.warning(f"Ignoring {java_bin}, not a usable Java runtime")
+            return ""
+
+        return match.group(1)
+
+    def _get_major(self, java_version: str) -> int:
+        parts = re.split(r"[.\-+_]", java_version)
+
+        # 1.8.0_392 is java 8
+        if parts[0] == "1" and len(parts) > 1:
+            return int(parts[1])
+
+        return int(parts[0])
+
+    def _extract(self, archive: str, staging_dir: str) -> str:
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+
+        os.makedirs(staging_dir)
+
+        try:
+            with tarfile.open(archive, "r:*") as tf:
+                # the data filter rejects absolute paths and links escaping the staging dir
+                if hasattr(tarfile, "data_filter"):
+                    tf.extractall(staging_dir, filter="data")
+                else:
+                    tf.extractall(staging_dir)
+        except (tarfile.TarError, OSError) as e:
+            raise McServerJavaRuntimeError(f"Failed to extract Java runtime archive ({e})")
+
+        # archives hold the runtime at their root or in a single top directory (jdk-21.0.2+13)
+        for java_home in [staging_dir] + glob(os.path.join(staging_dir, "*")) + glob(os.path.join(staging_dir, "*", "Contents", "Home")):
+            if os.path.isfile(os.path.join(java_home, "bin", "java")):
+                return java_home
+
+        raise McServerJavaRuntimeError("Java runtime archive has no bin/java")
+
+    async def _load_probes(self) -> None:
+        if self._probes is not None:
+            return
+
+        self._probes = {}
+        probes_file = os.path.join(self._runtimes_dir, self.probes_file)
+
+        if not os.path.exists(probes_file):
+            return
+
+        try:
+            async with aiofiles.open(probes_file, "r") as f:
+                self._probes = json.loads(await f.read())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable Java probes cache ({e})")
+
+    async def _save_probes(self) -> None:
+        if not os.path.exists(self._runtimes_dir):
+            os.makedirs(self._runtimes_dir)
+
+        probes_file = os.path.join(self._runtimes_dir, self.probes_file)
+        tmp_file = f"{probes_file}.tmp"
+
+        async with aiofiles.open(tmp_file, "w") as f:
+            await f.write(json.dumps(self._probes))
+
+        os.replace(tmp_file, probes_file)
@@ -1,8 +1,9 @@
 import logging
 import os
 import asyncio
-from typing import BinaryIO
-import aiofiles
+from .mod_metadata import McServerModMetadata, McServerModMetadataError
+from .mod_store import McServerModStore
+from .upload import McServerUpload
 
 
 __all__ = [
@@ -20,20 +21,15 @@ class McServerModError(Exception):
 class McServerMod:
     """Low level Minecraft server mod manager"""
 
-    def __init__(self, mods_dir: str) -> None:
+    def __init__(self, mods_dir: str, store: McServerModStore) -> None:
         self._mods_dir: str = mods_dir
+        self._store: McServerModStore = store
 
-    async def add(self, mod_name: str, *, mod_jar: BinaryIO) -> None:
-        """Add a mod from a jar file"""
-        if not os.path.exists(self._mods_dir):
-            logger.info(f"Creating mods directory")
-            os.makedirs(self._mods_dir)
-
+    async def add(self, mod_name: str, *, mod_upload: McServerUpload) -> None:
+        """Add a mod from an uploaded jar file. The jar goes to the shared store and is linked into the mods directory"""
         mod_file = os.path.join(self._mods_dir, f"{mod_name}.jar")
 
-        async with aiofiles.open(mod_file, "wb") as f:
-            content = await asyncio.to_thread(mod_jar.read)
-            await f.write(content)
+        await self._store.add(mod_upload.path, mod_upload.sha256, dst=mod_file)
 
         logger.info(f"Mod {mod_name} added")
         
@@ -69,5 +65,32 @@ class McServerMod:
             raise McServerModError(f"Mod {mod_name} does not exist")
 
         await asyncio.to_thread(os.remove, mod_file)
+        await self._store.gc()
+
+        logger.info(f"Mod {mod_name} removed")
+
+    async def read_metadata(self, mod_name: str) -> list[dict]:
+        """Read the mods declared by a mod jar, enabled or not"""
+        try:
+            return await asyncio.to_thread(McServerModMetadata(self._get_mod_file(mod_name)).read)
+        except McServerModMetadataError as e:
+            # a jar without readable metadata is still a valid mod, it just can't be checked
+            logger.warning(f"Mod {mod_name}: {e}")
+            return []
+
+    async def get_sha256(self, mod_name: str) -> str:
+        """Get the SHA-256 of a mod jar, enabled or not"""
+        return await asyncio.to_thread(self._store.hash_file, self._get_mod_file(mod_name))
+
+    def _get_mod_file(self, mod_name: str) -> str:
+        mod_file = os.path.join(self._mods_dir, f"{mod_name}.jar")
+
+        if os.path.exists(mod_file):
+            return mod_file
+
+        disabled_mod_file = os.path.join(self._mods_dir, f"{mod_name}.jar.disabled")
+
+        if os.path.exists(disabled_mod_file):
+            return disabled_mod_file
 
-        logger.info(f"Mod {mod_name} removed")
\ No newline at end of file
+        raise McServerModError(f"Mod {mod_name} does not exist")
\ No newline at end of file
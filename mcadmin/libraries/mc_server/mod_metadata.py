@@ -0,0 +1,289 @@
+import json
+import logging
+import re
+import zipfile
+from packaging import version
+
+try:
+    import tomllib
+except ImportError:  # python < 3.11, tomlkit comes with aerich[toml]
+    import tomlkit as tomllib  # type: ignore
+
+
+__all__ = [
+    "McServerModMetadataError",
+    "McServerModMetadata",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerModMetadataError(Exception):
+    pass
+
+
+class McServerModMetadata:
+    """Low level mod metadata reader. Reads the mod descriptors of a jar (Forge mods.toml, legacy mcmod.info,
+    fabric.mod.json) and checks dependencies and conflicts across a set of mods"""
+
+    descriptors: dict[str, str] = {
+        "META-INF/neoforge.mods.toml": "neoforge",
+        "META-INF/mods.toml": "forge",
+        "fabric.mod.json": "fabric",
+        "mcmod.info": "forge",
+    }
+
+    # dependencies provided by the server itself
+    builtin_mods: list[str] = ["minecraft", "forge", "neoforge", "fabricloader", "fabric-loader", "java", "mcp", "fml"]
+
+    # loaders each server type is able to run
+    server_loaders: dict[str, list[str]] = {
+        "vanilla": [],
+        "forge": ["forge"],
+        "fabric": ["fabric"],
+    }
+
+    def __init__(self, jar_file: str) -> None:
+        self._jar_file: str = jar_file
+
+    def read(self) -> list[dict]:
+        """Read the mods declared by the jar. Only the central directory and the descriptor members are read"""
+        try:
+            with zipfile.ZipFile(self._jar_file, "r") as zf:
+                names = set(zf.namelist())
+
+                for descriptor, loader in self.descriptors.items():
+                    if descriptor not in names:
+                        continue
+
+                    content = zf.read(descriptor).decode("utf-8", errors="replace")
+
+                    if descriptor.endswith(".toml"):
+                        manifest = zf.read("META-INF/MANIFEST.MF").decode("utf-8", errors="replace") if "META-INF/MANIFEST.MF" in names else ""
+                        return self._parse_mods_toml(content, loader, manifest)
+                    elif descriptor == "fabric.mod.json":
+                        return self._parse_fabric_json(content)
+                    else:
+                        return self._parse_mcmod_info(content)
+        except (zipfile.BadZipFile, ValueError, KeyError, TypeError) as e:
+            raise McServerModMetadataError(f"Failed to read mod metadata ({e})")
+
+        return []
+
+    @classmethod
+    def check(cls, mods: list[dict], *, server_type: str, server_version: str) -> list[str]:
+        """Check a set of mods (as returned by read) for missing dependencies, conflicts and incompatibilities.
+        Returns the list of issues found"""
+        issues = []
+        by_id: dict[str, list[dict]] = {}
+        loaders = cls.server_loaders.get(server_type, [])
+
+        for mod in mods:
+            by_id.setdefault(mod["mod_id"], []).append(mod)
+
+        for mod_id, same_mods in by_id.items():
+            if len(same_mods) > 1:
+                issues.append(f"Mod {mod_id} is installed {len(same_mods)} times")
+
+        # duplicates are reported once, the first occurrence is checked
+        for mod in (same_mods[0] for same_mods in by_id.values()):
+            label = f"{mod['name'] or mod['mod_id']} ({mod['mod_id']})"
+
+            if mod["loader"] not in loaders:
+                issues.append(f"{label} is a {mod['loader']} mod, which the {server_type} server can't load")
+
+            if mod["mc_versions"] and not cls._version_matches(server_version, mod["mc_versions"], mod["loader"]):
+                issues.append(f"{label} requires Minecraft {mod['mc_versions']}, server is {server_version}")
+
+            for dep in mod["dependencies"]:
+                if dep["mod_id"] in cls.builtin_mods or not dep["mandatory"]:
+                    continue
+
+                if dep["mod_id"] not in by_id:
+                    issues.append(f"{label} requires missing mod {dep['mod_id']} {dep['version_range']}".rstrip())
+                    continue
+
+                dep_version = by_id[dep["mod_id"]][0]["version"]
+
+                if dep["version_range"] and not cls._version_matches(dep_version, dep["version_range"], mod["loader"]):
+                    issues.append(f"{label} requires {dep['mod_id']} {dep['version_range']}, installed is {dep_version}")
+
+            for conflict in mod["conflicts"]:
+                if conflict["mod_id"] not in by_id:
+                    continue
+
+                conflict_version = by_id[conflict["mod_id"]][0]["version"]
+
+                if not conflict["version_range"] or cls._version_matches(conflict_version, conflict["version_range"], mod["loader"]):
+                    issues.append(f"{label} is incompatible with {conflict['mod_id']} {conflict_version}")
+
+        return issues
+
+    def _parse_mods_toml(self, content: str, loader: str, manifest: str) -> list[dict]:
+        data = tomllib.loads(content)
+        jar_version = self._manifest_value(manifest, "Implementation-Version")
+        mods = []
+
+        for entry in data.get("mods", []):
+            mod_id = str(entry.get("modId", ""))
+            mod_version = str(entry.get("version", ""))
+
+            # the version is usually filled in from the jar manifest at load time
+            if mod_version == "${file.jarVersion}":
+                mod_version = jar_version
+
+            dependencies = []
+            conflicts = []
+            mc_versions = ""
+
+            deps = data.get("dependencies", {})
+
+            for dep in (deps.get(mod_id, []) if isinstance(deps, dict) else []):
+                dep_id = str(dep.get("modId", ""))
+                dep_range = str(dep.get("versionRange", ""))
+                dep_type = str(dep.get("type", "required" if dep.get("mandatory", True) else "optional")).lower()
+
+                if dep_id == "minecraft":
+                    mc_versions = dep_range
+
+                if dep_type == "incompatible":
+                    conflicts.append({"mod_id": dep_id, "version_range": dep_range})
+                else:
+                    dependencies.append({"mod_id": dep_id, "version_range": dep_range, "mandatory": dep_type == "required"})
+
+            mods.append(self._gen_mod(mod_id, str(entry.get("displayName", "")), mod_version, loader, mc_versions, dependencies, conflicts))
+
+        return mods
+
+    def _parse_fabric_json(self, content: str) -> list[dict]:
+        data = json.loads(content, strict=False)
+        depends = data.get("depends", {}) or {}
+
+        dependencies = [{"mod_id": k, "version_range": self._fabric_range(v), "mandatory": True} for k, v in depends.items()]
+        dependencies += [{"mod_id": k, "version_range": self._fabric_range(v), "mandatory": False} for k, v in (data.get("recommends", {}) or {}).items()]
+        conflicts = [{"mod_id": k, "version_range": self._fabric_range(v)} for k, v in (data.get("breaks", {}) or {}).items()]
+
+        mod = self._gen_mod(
+            str(data.get("id", "")),
+            str(data.get("name", "")),
+            str(data.get("version", "")),
+            "fabric",
+            self._fabric_range(depends.get("minecraft", "")),
+            dependencies,
+            conflicts,
+        )
+
+        return [mod]
+
+    def _parse_mcmod_info(self, content: str) -> list[dict]:
+        data = json.loads(content, strict=False)
+
+        # both the bare list and the {"modList": [...]} layouts are in use
+        entries = data.get("modList", []) if isinstance(data, dict) else data
+        mods = []
+
+        for entry in entries:
+            mc_version = str(entry.get("mcversion", ""))
+            required = entry.get("requiredMods", []) or []
+            dependencies = [{"mod_id": self._strip_dep_version(d), "version_range": "", "mandatory": True} for d in required]
+
+            mods.append(self._gen_mod(str(entry.get("modid", "")), str(entry.get("name", "")), str(entry.get("version", "")), "forge", mc_version, dependencies, []))
+
+        return mods
+
+    def _gen_mod(self, mod_id: str, name: str, mod_version: str, loader: str, mc_versions: str, dependencies: list, conflicts: list) -> dict:
+        return {
+            "mod_id": mod_id,
+            "name": name,
+            "version": mod_version,
+            "loader": loader,
+            "mc_versions": mc_versions,
+            "dependencies": dependencies,
+            "conflicts": conflicts,
+        }
+
+    def _manifest_value(self, manifest: str, key: str) -> str:
+        match = re.search(rf"^{re.escape(key)}:\s*(.+?)\s*$", manifest, re.MULTILINE)
+        return match.group(1) if match else ""
+
+    def _fabric_range(self, value: str | list) -> str:
+        # a list of predicates means any of them
+        return " || ".join(value) if isinstance(value, list) else str(value)
+
+    def _strip_dep_version(self, dep: str) -> str:
+        return dep.split("@", 1)[0]
+
+    @classmethod
+    def _version_matches(cls, value: str, version_range: str, loader: str) -> bool:
+        try:
+            if loader == "fabric":
+                return any(cls._fabric_matches(value, r.strip()) for r in version_range.split("||"))
+
+            return cls._maven_matches(value, version_range)
+        except version.InvalidVersion:
+            # unparsable versions (snapshots, custom schemes) are not reported
+            return True
+
+    @classmethod
+    def _maven_matches(cls, value: str, version_range: str) -> bool:
+        version_range = version_range.strip()
+
+        if not version_range or version_range == "*":
+            return True
+
+        # a bare version is a soft requirement in maven ranges
+        if version_range[0] not in "[(":
+            return True
+
+        v = version.parse(value)
+
+        # a union of ranges: [1.0,2.0),[3.0,)
+        for (lower_inc, lower, comma, upper, upper_inc) in re.findall(r"([\[\(])\s*([^,\]\)]*)\s*(?:(,)\s*([^\]\)]*))?\s*([\]\)])", version_range):
+            if not comma and lower:
+                # [1.0] is an exact version
+                if v == version.parse(lower):
+                    return True
+                continue
+
+            if lower and (v < version.parse(lower) or (lower_inc == "(" and v == version.parse(lower))):
+                continue
+
+            if upper and (v > version.parse(upper) or (upper_inc == ")" and v == version.parse(upper))):
+                continue
+
+            return True
+
+        return False
+
+    @classmethod
+    def _fabric_matches(cls, value: str, predicate: str) -> bool:
+        if not predicate or predicate == "*":
+            return True
+
+        # space separated predicates must all match
+        for p in predicate.split():
+            match = re.match(r"^(>=|<=|>|<|=|~|\^)?(.+)$", p)
+            (op, wanted) = (match.group(1) or "=", match.group(2)) if match else ("=", p)
+
+            if wanted.endswith(".x") or wanted.endswith(".*"):
+                (op, wanted) = ("~", wanted[:-2])
+
+            v = version.parse(value)
+            w = version.parse(wanted)
+
+            if op == ">=" and not v >= w:
+                return False
+            elif op == "<=" and not v <= w:
+                return False
+            elif op == ">" and not v > w:
+                return False
+            elif op == "<" and not v < w:
+                return False
+            elif op == "=" and v != w:
+                return False
+            elif op == "~" and not (v >= w and v.release[:2] == (w.release + (0,))[:2]):
+                return False
+            elif op == "^" and not (v >= w and v.release[:1] == w.release[:1]):
+                return False
+
+        return True
@@ -0,0 +1,195 @@
+import errno
+import hashlib
+import logging
+import os
+import asyncio
+import shutil
+
+
+__all__ = [
+    "McServerModStoreError",
+    "McServerModStore",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerModStoreError(Exception):
+    pass
+
+
+class McServerModStore:
+    """Low level content-addressed jar store, shared by all instances. Each jar is stored once by its SHA-256 and
+    hardlinked wherever it is used (instance mods dirs, backup pins), so the link count of a stored jar is its
+    reference count and unreferenced jars are removed by gc"""
+
+    chunk_size: int = 1024 * 1024
+
+    # uploads in progress (.upload-*.tmp) and link temp files share the mods dir and must never be snapshotted
+    mod_exts: tuple[str, ...] = (".jar", ".jar.disabled")
+
+    def __init__(self, store_dir: str) -> None:
+        self._store_dir: str = store_dir
+
+        # keeps gc from removing a jar between it being stored and linked
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    def get_path(self, sha256: str) -> str:
+        return os.path.join(self._store_dir, sha256[:2], f"{sha256}.jar")
+
+    async def add(self, src: str, sha256: str, *, dst: str) -> None:
+        """Move the src file into the store (or drop it if the jar is already stored) and link the stored jar to dst"""
+        async with self._lock:
+            await asyncio.to_thread(self._add, src, sha256, dst)
+
+    async def snapshot(self, mods_dir: str) -> dict[str, str]:
+        """Get the {filename: sha256} manifest of a mods directory. Jars not yet in the store are moved into it"""
+        if not os.path.isdir(mods_dir):
+            return {}
+
+        async with self._lock:
+            return await asyncio.to_thread(self._snapshot, mods_dir)
+
+    async def pin(self, manifest: dict[str, str], pins_dir: str) -> None:
+        """Reference the jars of a manifest from pins_dir, so they outlive the mods directory they came from"""
+        async with self._lock:
+            await asyncio.to_thread(self._pin, manifest, pins_dir)
+
+    async def checkout(self, manifest: dict[str, str], dest_dir: str, *, pins_dir: str | None = None) -> None:
+        """Populate dest_dir with links to the jars of a manifest. Jars missing from the store are recovered from pins_dir"""
+        async with self._lock:
+            await asyncio.to_thread(self._checkout, manifest, dest_dir, pins_dir)
+
+    async def gc(self) -> int:
+        """Remove the stored jars which are not linked anywhere anymore. Returns the number of removed jars"""
+        async with self._lock:
+            removed = await asyncio.to_thread(self._gc)
+
+        if removed:
+            logger.info(f"Removed {removed} unreferenced jar(s) from the mod store")
+
+        return removed
+
+    def hash_file(self, path: str) -> str:
+        """Get the SHA-256 of a file"""
+        digest = hashlib.sha256()
+
+        with open(path, "rb") as f:
+            while chunk := f.read(self.chunk_size):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    def _add(self, src: str, sha256: str, dst: str) -> None:
+        stored = self.get_path(sha256)
+
+        if os.path.exists(stored):
+            os.remove(src)
+        else:
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            os.replace(src, stored)
+
+        self._link(stored, dst)
+
+    def _snapshot(self, mods_dir: str) -> dict[str, str]:
+        inodes = self._index()
+        manifest = {}
+
+        for name in sorted(os.listdir(mods_dir)):
+            if name.startswith(".") or not name.endswith(self.mod_exts):
+                continue
+
+            path = os.path.join(mods_dir, name)
+            st = os.lstat(path)
+
+            if not os.path.isfile(path) or os.path.islink(path):
+                continue
+
+            sha256 = inodes.get((st.st_dev, st.st_ino))
+
+            # jars added before the store existed (or copied across filesystems) are adopted here
+            if not sha256:
+                sha256 = self.hash_file(path)
+                stored = self.get_path(sha256)
+
+                if os.path.exists(stored):
+                    self._link(stored, path)
+                else:
+                    os.makedirs(os.path.dirname(stored), exist_ok=True)
+                    self._link(path, stored)
+
+                inodes[(st.st_dev, st.st_ino)] = sha256
+
+            manifest[name] = sha256
+
+        return manifest
+
+    def _pin(self, manifest: dict[str, str], pins_dir: str) -> None:
+        os.makedirs(pins_dir, exist_ok=True)
+
+        for sha256 in set(manifest.values()):
+            self._link(self.get_path(sha256), os.path.join(pins_dir, f"{sha256}.jar"))
+
+    def _checkout(self, manifest: dict[str, str], dest_dir: str, pins_dir: str | None) -> None:
+        os.makedirs(dest_dir, exist_ok=True)
+
+        for name, sha256 in manifest.items():
+            stored = self.get_path(sha256)
+
+            if not os.path.exists(stored):
+                pinned = os.path.join(pins_dir, f"{sha256}.jar") if pins_dir else ""
+
+                if not os.path.exists(pinned):
+                    raise McServerModStoreError(f"Jar {sha256} for {name} is missing from the mod store")
+
+                os.makedirs(os.path.dirname(stored), exist_ok=True)
+                self._link(pinned, stored)
+
+            self._link(stored, os.path.join(dest_dir, os.path.basename(name)))
+
+    def _gc(self) -> int:
+        removed = 0
+
+        if not os.path.isdir(self._store_dir):
+            return removed
+
+        for root, dirs, files in os.walk(self._store_dir):
+            for f in files:
+                path = os.path.join(root, f)
+
+                if os.lstat(path).st_nlink == 1:
+                    os.remove(path)
+                    removed += 1
+
+        return removed
+
+    def _index(self) -> dict[tuple[int, int], str]:
+        inodes = {}
+
+        if not os.path.isdir(self._store_dir):
+            return inodes
+
+        for root, dirs, files in os.walk(self._store_dir):
+            for f in files:
+                st = os.lstat(os.path.join(root, f))
+                inodes[(st.st_dev, st.st_ino)] = f.removesuffix(".jar")
+
+        return inodes
+
+    def _link(self, src: str, dst: str) -> None:
+        tmp = f"{dst}.link"
+
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+
+        try:
+            os.link(src, tmp)
+        except OSError as e:
+            # no hardlinks across filesystems, the jar is copied and simply not deduplicated
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+            logger.warning(f"Unable to hardlink {src} ({e}). Copying instead")
+            shutil.copy2(src, tmp)
+
+        os.replace(tmp, dst)
@@ -1,6 +1,8 @@
 import logging
 import os
+import re
 import aiofiles
+from packaging import version
 
 
 __all__ = [
@@ -43,38 +45,129 @@ class McServerPropertiesGenerator:
         "rcon.password": {"empty": True},
     }
 
+    # properties a running server applies through a console command, any other change needs a restart
+    runtime_properties: dict[str, str] = {
+        "difficulty": "difficulty {value}",
+        "gamemode": "defaultgamemode {value}",
+        "white-list": "whitelist {value}",
+        "pvp": "gamerule pvp {value}",
+    }
+
+    # first server version knowing the command. Older versions accept "gamerule pvp" as a custom rule without effect
+    command_min_versions: dict[str, str] = {
+        "pvp": "1.21.9",
+    }
+
+    command_values: dict[str, dict[str, str]] = {
+        "white-list": {"true": "on", "false": "off"},
+    }
+
+    # replies of commands the server rejected (unknown command, or gamerule on versions without it)
+    command_error_pattern: re.Pattern = re.compile(r"\b(?:unknown|incorrect|invalid|no game rule)\b", re.IGNORECASE)
+
     level_types: list[str] = ["default", "flat", "large_biomes", "amplified"]
 
     min_server_version: str = "1.7.10"
 
-    def __init__(self, instance_dir: str, *, server_ip: str, server_port: int, rcon_port: int) -> None:
+    def __init__(self, instance_dir: str, *, server_ip: str, server_port: int, rcon_port: int, defaults: dict | None = None) -> None:
         self._instance_dir: str = instance_dir
+        self._defaults: dict = defaults or {}
         self._enforced_properties: dict = {
             "server-port": str(server_port),
             "rcon.port": str(rcon_port),
             "server-ip": server_ip,
         }
 
-    async def generate(self, properties: dict) -> None:
-        """Generate server.properties file with the given properties"""
+    async def generate(self, properties: dict) -> bool:
+        """Merge the given properties into the server.properties file, keeping the keys (and order) the server wrote.
+        The file is only written when its content changes. Returns whether it was written"""
         logger.info(f"Generating server.properties")
 
         self.validate_properties(properties)
 
         properties_file = os.path.join(self._instance_dir, "server.properties")
+        enforced = dict(self._enforced_properties)
+        current = None
 
         if properties.get("rcon.password"):
-            self._enforced_properties["enable-rcon"] = "true"
+            enforced["enable-rcon"] = "true"
 
-        async with aiofiles.open(properties_file, "w") as f:
-            for key, value in self._enforced_properties.items():
-                await f.write(f"{key}={value}\n")
+        if os.path.exists(properties_file):
+            async with aiofiles.open(properties_file, "r") as f:
+                current = await f.read()
 
-            for key, value in properties.items():
-                await f.write(f"{key}={value}\n")
+        merged = {**enforced, **properties}
+
+        # keys the server version doesn't know are left out, when its defaults are known
+        if self._defaults:
+            merged = {key: value for key, value in merged.items() if key in self._defaults or key in enforced}
+
+        lines = current.splitlines() if current is not None else self._render_defaults()
+        content = self._merge(lines, merged)
+
+        if content == current:
+            logger.info(f"server.properties is up to date")
+            return False
+
+        tmp_file = f"{properties_file}.tmp"
+
+        async with aiofiles.open(tmp_file, "w") as f:
+            await f.write(content)
+
+        os.replace(tmp_file, properties_file)
 
         logger.info(f"server.properties generated successfully")
 
+        return True
+
+    @classmethod
+    def parse(cls, content: str) -> dict:
+        """Parse the content of a server.properties file"""
+        properties = {}
+
+        for line in content.splitlines():
+            entry = cls._parse_line(line)
+
+            if entry:
+                properties[entry[0]] = cls._unescape(entry[1])
+
+        return properties
+
+    @classmethod
+    def classify_properties(cls, properties: dict, *, server_version: str) -> tuple[dict[str, str], list[str]]:
+        """Split changed properties into the ones a running server of the given version can apply ({key: command})
+        and the ones needing a restart"""
+        commands = {}
+        restart_keys = []
+
+        for key, value in properties.items():
+            if key not in cls.runtime_properties or not cls._supports_command(key, server_version):
+                restart_keys.append(key)
+                continue
+
+            value = cls.command_values.get(key, {}).get(value, value)
+            commands[key] = cls.runtime_properties[key].format(value=value)
+
+        return (commands, restart_keys)
+
+    @classmethod
+    def _supports_command(cls, key: str, server_version: str) -> bool:
+        min_version = cls.command_min_versions.get(key)
+
+        if not min_version:
+            return True
+
+        try:
+            return version.parse(server_version) >= version.parse(min_version)
+        except version.InvalidVersion:
+            # snapshots can't be compared, a restart is always right
+            return False
+
+    @classmethod
+    def is_command_error(cls, response: str) -> bool:
+        """Check if a console command reply reports the command failed"""
+        return bool(cls.command_error_pattern.search(response))
+
     @classmethod
     def validate_properties(cls, properties: dict) -> None:
         """Validate the given properties to ensure they conform to expected types and values for the server.properties file"""
@@ -99,3 +192,65 @@ class McServerPropertiesGenerator:
 
             if prop_type == "bool" and value not in ["true", "false"]:
                 raise McServerPropertyError(f"Property '{key}' must be a boolean")
+
+    def _merge(self, lines: list[str], properties: dict) -> str:
+        pending = dict(properties)
+        seen = set()
+        merged = []
+
+        for line in lines:
+            entry = self._parse_line(line)
+
+            if entry:
+                (key, raw_value) = entry
+
+                # the last occurrence wins when loading, duplicates would override the merged value
+                if key in seen:
+                    continue
+
+                seen.add(key)
+
+                if key in pending:
+                    value = pending.pop(key)
+
+                    # untouched lines are kept verbatim so an unchanged file renders byte-identical
+                    if self._unescape(raw_value) != value:
+                        line = f"{key}={self._escape(value)}"
+
+            merged.append(line)
+
+        merged.extend(f"{key}={self._escape(value)}" for key, value in pending.items())
+
+        return "\n".join(merged) + "\n"
+
+    def _render_defaults(self) -> list[str]:
+        return ["#Minecraft server properties"] + [f"{key}={self._escape(value)}" for key, value in self._defaults.items()]
+
+    @classmethod
+    def _parse_line(cls, line: str) -> tuple[str, str] | None:
+        line = line.lstrip()
+
+        if not line or line[0] in "#!" or "=" not in line:
+            return None
+
+        (key, value) = line.split("=", 1)
+
+        # trailing whitespace is part of the value
+        return (key.strip(), value.lstrip())
+
+    @classmethod
+    def _unescape(cls, value: str) -> str:
+        # java properties escapes, the server writes level-type=minecraft\:normal
+        escapes = {"n": "\n", "t": "\t", "r": "\r", "f": "\f"}
+
+        def replace(match: re.Match) -> str:
+            if match.group(1):
+                return chr(int(match.group(1), 16))
+
+            return escapes.get(match.group(2), match.group(2))
+
+        return re.sub(r"\\(?:u([0-9a-fA-F]{4})|(.))", replace, value)
+
+    @classmethod
+    def _escape(cls, value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n")
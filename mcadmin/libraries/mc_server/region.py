@@ -0,0 +1,121 @@
+import logging
+import os
+import struct
+
+
+__all__ = [
+    "McServerRegionError",
+    "McServerRegionFile",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerRegionError(Exception):
+    pass
+
+
+class McServerRegionFile:
+    """Low level Anvil region file (r.<x>.<z>.mca) reader / writer. Works on single chunks, without rewriting the whole file"""
+
+    sector_size: int = 4096
+    chunks_per_side: int = 32
+    external_flag: int = 0x80
+
+    def __init__(self, path: str) -> None:
+        self._path: str = path
+
+    @classmethod
+    def region_name(cls, region_x: int, region_z: int) -> str:
+        return f"r.{region_x}.{region_z}.mca"
+
+    @classmethod
+    def chunk_to_region(cls, chunk_x: int, chunk_z: int) -> tuple[int, int]:
+        return (chunk_x // cls.chunks_per_side, chunk_z // cls.chunks_per_side)
+
+    def read_chunk(self, chunk_x: int, chunk_z: int) -> tuple[bytes, int, bytes | None] | None:
+        """Read the raw chunk payload, its timestamp and the external (.mcc) payload if any. Returns None if the chunk is not generated"""
+        if not os.path.exists(self._path):
+            return None
+
+        index = self._chunk_index(chunk_x, chunk_z)
+
+        with open(self._path, "rb") as f:
+            (offset, sectors, timestamp) = self._read_header_entry(f, index)
+
+            if not offset or not sectors:
+                return None
+
+            f.seek(offset * self.sector_size)
+            (length,) = struct.unpack(">I", f.read(4))
+
+            if length > sectors * self.sector_size:
+                raise McServerRegionError(f"Corrupted chunk {chunk_x},{chunk_z} in {self._path}")
+
+            payload = struct.pack(">I", length) + f.read(length)
+
+        external = None
+
+        # oversized chunks are stored next to the region file and only flagged in the payload
+        if payload[4] & self.external_flag:
+            with open(self._external_path(chunk_x, chunk_z), "rb") as f:
+                external = f.read()
+
+        return (payload, timestamp, external)
+
+    def write_chunk(self, chunk_x: int, chunk_z: int, chunk: tuple[bytes, int, bytes | None] | None) -> None:
+        """Write a chunk previously returned by read_chunk. None removes the chunk"""
+        index = self._chunk_index(chunk_x, chunk_z)
+
+        if not os.path.exists(self._path):
+            if chunk is None:
+                return
+
+            with open(self._path, "wb") as f:
+                f.write(b"\x00" * self.sector_size * 2)
+
+        with open(self._path, "r+b") as f:
+            (offset, sectors, _) = self._read_header_entry(f, index)
+
+            if chunk is None:
+                self._write_header_entry(f, index, 0, 0, 0)
+                return
+
+            (payload, timestamp, external) = chunk
+            needed = -(-len(payload) // self.sector_size)
+
+            # reuse the current sectors when the chunk fits, otherwise append to the end of the file
+            if not offset or sectors < needed:
+                f.seek(0, os.SEEK_END)
+                offset = -(-f.tell() // self.sector_size)
+
+            f.seek(offset * self.sector_size)
+            f.write(payload + b"\x00" * (needed * self.sector_size - len(payload)))
+
+            self._write_header_entry(f, index, offset, needed, timestamp)
+
+        if external is not None:
+            with open(self._external_path(chunk_x, chunk_z), "wb") as f:
+                f.write(external)
+
+    def _read_header_entry(self, f, index: int) -> tuple[int, int, int]:
+        f.seek(index * 4)
+        location = f.read(4)
+
+        f.seek(self.sector_size + index * 4)
+        (timestamp,) = struct.unpack(">I", f.read(4))
+
+        return (int.from_bytes(location[:3], "big"), location[3], timestamp)
+
+    def _write_header_entry(self, f, index: int, offset: int, sectors: int, timestamp: int) -> None:
+        f.seek(index * 4)
+        f.write(offset.to_bytes(3, "big") + bytes([sectors]))
+
+        f.seek(self.sector_size + index * 4)
+        f.write(struct.pack(">I", timestamp))
+
+    def _chunk_index(self, chunk_x: int, chunk_z: int) -> int:
+        return (chunk_x % self.chunks_per_side) + (chunk_z % self.chunks_per_side) * self.chunks_per_side
+
+    def _external_path(self, chunk_x: int, chunk_z: int) -> str:
+        return os.path.join(os.path.dirname(self._path), f"c.{chunk_x}.{chunk_z}.mcc")
@@ -6,6 +6,7 @@ import asyncio
 import aiofiles
 import re
 import shlex
+import time
 from datetime import datetime, timezone
 from typing import Any
 
@@ -67,12 +68,17 @@ class McServerRunner:
         self._proc = None
         self._proc_wait_task = None
         self._proc_stdout_task = None
+        self._log_waiters: list[tuple[re.Pattern, asyncio.Future]] = []
+        self._last_lag_at: float | None = None
+        self._idle_restart: bool = False
 
         self._log_patterns = {
             "initialized": re.compile(r"\bDone \(\d+\.\d+s\)!", re.IGNORECASE),
             "join": re.compile(r"\bjoined the game\b", re.IGNORECASE),
             "leave": re.compile(r"\b(?:left the game|lost connection)\b", re.IGNORECASE),
             "stats": re.compile(r"(?:There are\s+(?P<n1>\d+)\s+of a max of\s+\d+\s+players online:|Players\s*\((?P<n2>\d+)\):)", re.IGNORECASE),
+            "saved": re.compile(r"\bSaved the game\b", re.IGNORECASE),
+            "lag": re.compile(r"\bCan't keep up!", re.IGNORECASE),
         }
 
     async def run(self) -> None:
@@ -114,6 +120,33 @@ class McServerRunner:
         await self._tasks_queue.put(evt)
         return await asyncio.wait_for(evt.reply, timeout=60)
 
+    def restart_when_idle(self) -> None:
+        """Restart the Minecraft server as soon as no players are online"""
+        self._idle_restart = True
+        self._check_idle_restart()
+
+    def expect_log(self, pattern: str) -> asyncio.Future:
+        """Get a future resolved with the next server log line matching the given log pattern"""
+        if pattern not in self._log_patterns:
+            raise McServerRunnerError(f"Unknown log pattern: {pattern}")
+
+        future = asyncio.get_running_loop().create_future()
+
+        self._log_waiters.append((self._log_patterns[pattern], future))
+
+        return future
+
+    def match_log(self, pattern: str, line: str) -> bool:
+        """Check if the given line matches the given log pattern"""
+        if pattern not in self._log_patterns:
+            raise McServerRunnerError(f"Unknown log pattern: {pattern}")
+
+        return bool(self._log_patterns[pattern].search(line))
+
+    def get_last_lag_time(self) -> float | None:
+        """Get the monotonic time of the last "Can't keep up!" server warning"""
+        return self._last_lag_at
+
     def get_server_status(self) -> str:
         """Get the current server status"""
         if self._server_stats.get("started") and self._server_stats.get("initialized"):
@@ -140,6 +173,7 @@ class McServerRunner:
         stats["started_at"] = self._server_stats.get("started_at", 0)
         stats["pid"] = self._server_stats.get("pid", 0)
         stats["players"] = self._server_stats.get("players", 0)
+        stats["restart_pending"] = self._idle_restart
 
         return stats
 
@@ -236,6 +270,9 @@ class McServerRunner:
 
         logger.info(f"Starting MC server")
 
+        # a fresh start applies whatever a pending restart was waiting for
+        self._idle_restart = False
+
         cmd = ["./mcadmin-start.sh", "nogui"]
 
         self._proc = await asyncio.create_subprocess_exec(
@@ -327,6 +364,8 @@ class McServerRunner:
     async def _process_server_log(self, line: str) -> None:
         logger.debug(f"MC Log: {line}")
 
+        self._resolve_log_waiters(line)
+
         if self._log_patterns["initialized"].search(line):
             logger.info(f"MC server ready")
             await self._set_server_stats(initialized=True)
@@ -347,9 +386,32 @@ class McServerRunner:
             logger.info(f"Player count updated to {player_cnt}")
             await self._set_server_stats(players=int(player_cnt))
 
+        # remember when the server last fell behind so background jobs can back off
+        elif self._log_patterns["lag"].search(line):
+            logger.debug(f"MC server is lagging")
+            self._last_lag_at = time.monotonic()
+
         else:
             return
 
+    def _resolve_log_waiters(self, line: str) -> None:
+        if not self._log_waiters:
+            return
+
+        waiters = []
+
+        for pattern, future in self._log_waiters:
+            if future.done():
+                continue
+
+            if pattern.search(line):
+                future.set_result(line)
+                continue
+
+            waiters.append((pattern, future))
+
+        self._log_waiters = waiters
+
     async def _cancel_stdout_reader_task(self) -> None:
         if not self._proc_stdout_task or self._proc_stdout_task.done():
             return
@@ -374,6 +436,16 @@ class McServerRunner:
         os.replace(tmp, path)
 
         self._publish_event("stats", self.get_server_stats())
+        self._check_idle_restart()
+
+    def _check_idle_restart(self) -> None:
+        if not self._idle_restart or self.get_server_status() != "running" or self._server_stats.get("players", 0):
+            return
+
+        logger.info("No players online, restarting MC server")
+
+        self._idle_restart = False
+        self._tasks_queue.put_nowait(McServerRunnerEvent("restart"))
 
     def _publish_event(self, ev_type: str, data: Any) -> None:
         if not self._events_queue:
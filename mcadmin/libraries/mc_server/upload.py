@@ -0,0 +1,271 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import asyncio
+import secrets
+import tempfile
+import time
+import weakref
+from typing import AsyncIterator
+import aiofiles
+
+
+__all__ = [
+    "McServerUploadError",
+    "McServerUpload",
+    "McServerUploadSession",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerUploadError(ValueError):
+    pass
+
+
+class McServerUpload:
+    """Low level upload receiver. Streams uploaded data into a temporary file in the target directory"""
+
+    zip_signatures: list[bytes] = [b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08"]
+
+    def __init__(self, target_dir: str, *, max_size: int = 0, signatures: list[bytes] | None = None) -> None:
+        self._target_dir: str = target_dir
+        self._max_size: int = max_size
+        self._signatures: list[bytes] = signatures or []
+
+        self._path: str | None = None
+        self._size: int = 0
+        self._sha256: str = ""
+
+    @property
+    def path(self) -> str:
+        if not self._path:
+            raise McServerUploadError("No data received")
+
+        return self._path
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256
+
+    async def receive(self, chunks: AsyncIterator[bytes]) -> None:
+        """Write the given chunks to the temporary file, hashing them on the fly"""
+        if self._path:
+            raise McServerUploadError("Upload already received")
+
+        if not os.path.exists(self._target_dir):
+            os.makedirs(self._target_dir)
+
+        (fd, self._path) = tempfile.mkstemp(prefix=".upload-", suffix=".tmp", dir=self._target_dir)
+        os.close(fd)
+
+        digest = hashlib.sha256()
+        head = b""
+
+        async with aiofiles.open(self._path, "wb") as f:
+            async for chunk in chunks:
+                self._size += len(chunk)
+
+                if self._max_size and self._size > self._max_size:
+                    raise McServerUploadError(f"Upload exceeds the maximum size of {self._max_size} bytes")
+
+                if self._signatures and len(head) < 4:
+                    head += chunk[: 4 - len(head)]
+
+                    if len(head) == 4 and not any(head.startswith(sig) for sig in self._signatures):
+                        raise McServerUploadError("Upload has an unexpected file format")
+
+                digest.update(chunk)
+                await f.write(chunk)
+
+        if self._signatures and len(head) < 4:
+            raise McServerUploadError("Upload has an unexpected file format")
+
+        self._sha256 = digest.hexdigest()
+
+        logger.info(f"Received upload of {self._size} bytes (sha256 {self._sha256})")
+
+    async def commit(self, filename: str) -> str:
+        """Atomically move the received file to its final name in the target directory"""
+        dst = os.path.join(self._target_dir, filename)
+
+        await asyncio.to_thread(os.replace, self.path, dst)
+        self._path = None
+
+        return dst
+
+    async def discard(self) -> None:
+        """Remove the temporary file, if it was not committed"""
+        if not self._path:
+            return
+
+        if os.path.exists(self._path):
+            await asyncio.to_thread(os.remove, self._path)
+
+        self._path = None
+
+
+class McServerUploadSession:
+    """Low level resumable upload session. Chunks are appended at a given offset directly to a partial file and the
+    session state is kept in a json file next to it, so an upload survives restarts and can be resumed at any time"""
+
+    session_id_pattern: str = r"^[0-9a-f]{32}$"
+    session_ttl: int = 7 * 24 * 3600
+
+    _locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def __init__(self, uploads_dir: str, session_id: str, *, signatures: list[bytes] | None = None) -> None:
+        if not re.match(self.session_id_pattern, session_id):
+            raise McServerUploadError(f"Invalid upload session id {session_id}")
+
+        self._uploads_dir: str = uploads_dir
+        self._id: str = session_id
+        self._signatures: list[bytes] = signatures or []
+
+        self._info: dict = {}
+
+    @classmethod
+    async def create(cls, uploads_dir: str, *, filename: str, size: int, max_size: int = 0, signatures: list[bytes] | None = None) -> "McServerUploadSession":
+        """Start a new upload session for a file of the given size"""
+        if size <= 0:
+            raise McServerUploadError("Upload size must be greater than 0")
+
+        if max_size and size > max_size:
+            raise McServerUploadError(f"Upload exceeds the maximum size of {max_size} bytes")
+
+        if not os.path.exists(uploads_dir):
+            os.makedirs(uploads_dir)
+
+        await asyncio.to_thread(cls._purge_expired, uploads_dir)
+
+        session = cls(uploads_dir, secrets.token_hex(16), signatures=signatures)
+        session._info = {"filename": filename, "size": size, "created_at": int(time.time())}
+
+        async with aiofiles.open(session.path, "wb"):
+            pass
+
+        await session._save_info()
+
+        logger.info(f"Upload session {session.id} created for {filename} ({size} bytes)")
+
+        return session
+
+    @classmethod
+    async def load(cls, uploads_dir: str, session_id: str, *, signatures: list[bytes] | None = None) -> "McServerUploadSession":
+        """Load an existing upload session"""
+        session = cls(uploads_dir, session_id, signatures=signatures)
+
+        if not os.path.exists(session._info_path) or not os.path.exists(session.path):
+            raise McServerUploadError(f"Upload session {session_id} does not exist")
+
+        async with aiofiles.open(session._info_path, "r") as f:
+            session._info = json.loads(await f.read())
+
+        return session
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self._uploads_dir, f"{self._id}.part")
+
+    @property
+    def filename(self) -> str:
+        return self._info.get("filename", "")
+
+    @property
+    def size(self) -> int:
+        return self._info.get("size", 0)
+
+    @property
+    def offset(self) -> int:
+        # the partial file is the source of truth, whatever reached the disk before a crash counts as received
+        return os.path.getsize(self.path)
+
+    @property
+    def completed(self) -> bool:
+        return self.offset == self.size
+
+    async def append(self, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Append the given chunks at offset, which must match the current offset. Returns the new offset"""
+        lock = self._locks.setdefault(self._id, asyncio.Lock())
+
+        if lock.locked():
+            raise McServerUploadError(f"Upload session {self._id} is already receiving data")
+
+        async with lock:
+            if offset != self.offset:
+                raise McServerUploadError(f"Upload offset mismatch (expected {self.offset}, got {offset})")
+
+            start_offset = offset
+
+            async with aiofiles.open(self.path, "ab") as f:
+                try:
+                    async for chunk in chunks:
+                        if offset + len(chunk) > self.size:
+                            raise McServerUploadError(f"Upload exceeds the declared size of {self.size} bytes")
+
+                        await f.write(chunk)
+                        offset += len(chunk)
+                finally:
+                    await f.flush()
+                    await asyncio.to_thread(os.fsync, f.fileno())
+
+            if self._signatures and start_offset < 4 <= offset:
+                async with aiofiles.open(self.path, "rb") as f:
+                    head = await f.read(4)
+
+                if not any(head.startswith(sig) for sig in self._signatures):
+                    await asyncio.to_thread(os.truncate, self.path, start_offset)
+                    raise McServerUploadError("Upload has an unexpected file format")
+
+        return offset
+
+    async def discard(self) -> None:
+        """Remove the session and its partial file"""
+        for path in (self.path, self._info_path):
+            if os.path.exists(path):
+                await asyncio.to_thread(os.remove, path)
+
+        logger.info(f"Upload session {self._id} removed")
+
+    @property
+    def _info_path(self) -> str:
+        return os.path.join(self._uploads_dir, f"{self._id}.json")
+
+    async def _save_info(self) -> None:
+        tmp_file = self._info_path + ".tmp"
+
+        async with aiofiles.open(tmp_file, "w") as f:
+            await f.write(json.dumps(self._info))
+
+        await asyncio.to_thread(os.replace, tmp_file, self._info_path)
+
+    @classmethod
+    def _purge_expired(cls, uploads_dir: str) -> None:
+        now = time.time()
+
+        for name in os.listdir(uploads_dir):
+            path = os.path.join(uploads_dir, name)
+            stem = name.split(".", 1)[0]
+
+            if not os.path.isfile(path):
+                continue
+
+            # a session is only expired once both its state and its partial file are stale
+            if re.match(cls.session_id_pattern, stem):
+                related = [os.path.join(uploads_dir, f"{stem}{ext}") for ext in (".part", ".json")]
+            else:
+                related = [path]
+
+            if now - max(os.path.getmtime(p) for p in related if os.path.exists(p)) > cls.session_ttl:
+                logger.info(f"Removing expired upload file {name}")
+                os.remove(path)
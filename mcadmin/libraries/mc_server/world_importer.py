@@ -0,0 +1,298 @@
+import logging
+import os
+import asyncio
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable
+import zstandard
+
+
+__all__ = [
+    "McServerWorldImporterError",
+    "McServerWorldImporter",
+]
+
+logger = logging.getLogger(__name__)
+
+
+class McServerWorldImporterError(Exception):
+    pass
+
+
+class McServerWorldImporter:
+    """Low level world archive importer. Extracts zip, tar.gz and tar.zst archives with parallel workers,
+    enforcing size, entry and path limits"""
+
+    signatures: dict[str, list[bytes]] = {
+        "zip": [b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08"],
+        "tar.gz": [b"\x1f\x8b"],
+        "tar.zst": [b"\x28\xb5\x2f\xfd"],
+    }
+
+    chunk_size: int = 1024 * 1024
+
+    # tar members up to this size are handed to the writer threads, bigger ones are written by the reader
+    small_file_size: int = 4 * 1024 * 1024
+
+    progress_interval: float = 0.5
+
+    def __init__(
+        self,
+        dest_dir: str,
+        *,
+        max_size: int = 0,
+        max_entries: int = 0,
+        workers: int = 4,
+        progress: Callable[[dict], None] | None = None,
+    ) -> None:
+        self._dest_dir: str = dest_dir
+        self._max_size: int = max_size
+        self._max_entries: int = max_entries
+        self._workers: int = max(1, workers)
+        self._progress: Callable[[dict], None] | None = progress
+
+        self._lock: threading.Lock = threading.Lock()
+        self._abort: threading.Event = threading.Event()
+        self._written: int = 0
+        self._entries: int = 0
+        self._last_progress: float = 0
+
+    @classmethod
+    def detect_format(cls, archive_file: str) -> str:
+        """Detect the archive format from its magic bytes"""
+        with open(archive_file, "rb") as f:
+            head = f.read(4)
+
+        for archive_format, signatures in cls.signatures.items():
+            if any(head.startswith(sig) for sig in signatures):
+                return archive_format
+
+        raise McServerWorldImporterError("Unsupported world archive format (expected zip, tar.gz or tar.zst)")
+
+    async def import_archive(self, archive_file: str) -> None:
+        """Extract the archive into the destination directory. The destination only appears once extraction succeeded"""
+        archive_format = self.detect_format(archive_file)
+        staging_dir = self._dest_dir + ".importing"
+
+        logger.info(f"Importing {archive_format} world archive")
+
+        if os.path.exists(staging_dir):
+            await asyncio.to_thread(shutil.rmtree, staging_dir)
+
+        os.makedirs(staging_dir)
+
+        try:
+            if archive_format == "zip":
+                await asyncio.to_thread(self._extract_zip, archive_file, staging_dir)
+            else:
+                await asyncio.to_thread(self._extract_tar, archive_file, staging_dir, archive_format)
+        except BaseException:
+            self._abort.set()
+            self._report("failed", 0, force=True)
+            await asyncio.to_thread(shutil.rmtree, staging_dir, ignore_errors=True)
+            raise
+
+        if os.path.exists(self._dest_dir):
+            await asyncio.to_thread(shutil.rmtree, self._dest_dir)
+
+        os.rename(staging_dir, self._dest_dir)
+
+        self._report("completed", 100, force=True)
+
+        logger.info(f"World archive imported ({self._entries} entries, {self._written} bytes)")
+
+    def _extract_zip(self, archive_file: str, staging_dir: str) -> None:
+        with zipfile.ZipFile(archive_file, "r") as zf:
+            infos = zf.infolist()
+
+        if self._max_entries and len(infos) > self._max_entries:
+            raise McServerWorldImporterError(f"World archive has too many entries ({len(infos)} > {self._max_entries})")
+
+        # declared sizes are checked upfront, the actual written bytes are checked again while extracting
+        total_size = sum(info.file_size for info in infos)
+
+        if self._max_size and total_size > self._max_size:
+            raise McServerWorldImporterError(f"World archive is too large once extracted ({total_size} > {self._max_size} bytes)")
+
+        files = []
+
+        for info in infos:
+            path = self._safe_path(staging_dir, info.filename)
+
+            # the unix mode is stored in the upper bits of external_attr, links are never extracted
+            if (info.external_attr >> 16) & 0o170000 == 0o120000:
+                logger.warning(f"Skipping link {info.filename} in world archive")
+                continue
+
+            if info.is_dir():
+                os.makedirs(path, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                files.append((info, path))
+
+        # biggest members first, so a single large region file doesn't end up last on one worker
+        files.sort(key=lambda f: f[0].file_size, reverse=True)
+        members = iter(files)
+        members_lock = threading.Lock()
+
+        def worker() -> None:
+            with zipfile.ZipFile(archive_file, "r") as zf:
+                while not self._abort.is_set():
+                    with members_lock:
+                        (info, path) = next(members, (None, None))
+
+                    if not info:
+                        return
+
+                    with zf.open(info) as src, open(path, "wb") as dst:
+                        self._copy_member(src, dst)
+
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    os.utime(path, (mtime, mtime))
+
+                    self._entry_done(total_size)
+
+        self._run_workers([worker] * self._workers)
+
+    def _extract_tar(self, archive_file: str, staging_dir: str, archive_format: str) -> None:
+        archive_size = os.path.getsize(archive_file)
+
+        with open(archive_file, "rb") as raw, ThreadPoolExecutor(max_workers=self._workers) as pool:
+            counter = _CountingReader(raw)
+
+            if archive_format == "tar.zst":
+                stream = zstandard.ZstdDecompressor().stream_reader(counter)
+                tar = tarfile.open(fileobj=stream, mode="r|")
+            else:
+                tar = tarfile.open(fileobj=counter, mode="r|gz")
+
+            # bounds the amount of small file data buffered for the writers
+            slots = threading.Semaphore(self._workers * 2)
+            errors = []
+
+            def write(path: str, data: bytes, mtime: float) -> None:
+                try:
+                    with open(path, "wb") as dst:
+                        dst.write(data)
+
+                    os.utime(path, (mtime, mtime))
+                except Exception as e:
+                    errors.append(e)
+                    self._abort.set()
+                finally:
+                    slots.release()
+
+            with tar:
+                for member in tar:
+                    if self._abort.is_set():
+                        break
+
+                    # stream mode keeps every member around otherwise, which adds up on worlds with many files
+                    tar.members = []
+
+                    self._entries += 1
+
+                    if self._max_entries and self._entries > self._max_entries:
+                        raise McServerWorldImporterError(f"World archive has more than {self._max_entries} entries")
+
+                    path = self._safe_path(staging_dir, member.name)
+
+                    if member.isdir():
+                        os.makedirs(path, exist_ok=True)
+                        continue
+
+                    if not member.isreg():
+                        logger.warning(f"Skipping non regular file {member.name} in world archive")
+                        continue
+
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                    src = tar.extractfile(member)
+
+                    if member.size <= self.small_file_size:
+                        data = src.read()
+                        self._add_written(len(data))
+
+                        slots.acquire()
+                        pool.submit(write, path, data, member.mtime)
+                    else:
+                        with open(path, "wb") as dst:
+                            self._copy_member(src, dst)
+
+                        os.utime(path, (member.mtime, member.mtime))
+
+                    self._report("extracting", counter.count * 100 // max(archive_size, 1))
+
+        if errors:
+            raise errors[0]
+
+    def _run_workers(self, workers: list[Callable[[], None]]) -> None:
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            futures = [pool.submit(w) for w in workers]
+
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                self._abort.set()
+                raise
+
+    def _copy_member(self, src: BinaryIO, dst: BinaryIO) -> None:
+        while chunk := src.read(self.chunk_size):
+            if self._abort.is_set():
+                raise McServerWorldImporterError("World import aborted")
+
+            self._add_written(len(chunk))
+            dst.write(chunk)
+
+    def _add_written(self, size: int) -> None:
+        with self._lock:
+            self._written += size
+
+            if self._max_size and self._written > self._max_size:
+                raise McServerWorldImporterError(f"World archive exceeds the maximum extracted size of {self._max_size} bytes")
+
+    def _entry_done(self, total_size: int) -> None:
+        with self._lock:
+            self._entries += 1
+
+        self._report("extracting", self._written * 100 // max(total_size, 1))
+
+    def _report(self, status: str, progress: int, *, force: bool = False) -> None:
+        if not self._progress:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+
+            if not force and now - self._last_progress < self.progress_interval:
+                return
+
+            self._last_progress = now
+
+        self._progress({"status": status, "progress": min(progress, 100), "entries": self._entries, "bytes": self._written})
+
+    def _safe_path(self, base_dir: str, name: str) -> str:
+        # absolute member names are taken as relative to the world directory, like tar does
+        name = name.replace("\\", "/").lstrip("/")
+        path = os.path.normpath(os.path.join(base_dir, name))
+
+        if not (path == base_dir or path.startswith(base_dir + os.sep)):
+            raise McServerWorldImporterError(f"World archive member {name} points outside of the world directory")
+
+        return path
+
+
+class _CountingReader:
+    def __init__(self, fileobj: BinaryIO) -> None:
+        self._fileobj: BinaryIO = fileobj
+        self.count: int = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        self.count += len(data)
+        return data
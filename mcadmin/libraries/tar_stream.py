@@ -0,0 +1,82 @@
+import os
+import stat
+import tarfile
+from typing import Iterator
+
+__all__ = ["TarStream"]
+
+
+class TarStream:
+    """Uncompressed tar stream built on the fly from a set of paths. The stream size is known upfront,
+    so it can be sent with a Content-Length and the file members can be sent with sendfile"""
+
+    block_size: int = tarfile.BLOCKSIZE
+
+    def __init__(self, members: list[tuple[str, str]]) -> None:
+        self._members: list[tuple[str, str]] = members
+        self._entries: list[tuple[str, str, os.stat_result]] = []
+
+    def prepare(self) -> int:
+        """Scan the members and return the total stream size. This is blocking and should be run in a thread"""
+        self._entries = []
+        size = 0
+
+        for src, arcname in self._members:
+            if not os.path.exists(src):
+                continue
+
+            self._add_entry(src, arcname)
+
+            for root, dirs, files in os.walk(src):
+                dirs.sort()
+
+                for name in dirs + sorted(files):
+                    path = os.path.join(root, name)
+                    self._add_entry(path, os.path.join(arcname, os.path.relpath(path, src)))
+
+        for path, arcname, st in self._entries:
+            size += len(self._gen_header(arcname, st))
+            size += self._padded_size(st.st_size) if stat.S_ISREG(st.st_mode) else 0
+
+        # end of archive marker
+        size += self.block_size * 2
+
+        return size
+
+    def __iter__(self) -> Iterator[tuple[bytes, str | None, int]]:
+        """Iterate over (header, file path, file size) entries. File data must be padded to the block size by the caller"""
+        for path, arcname, st in self._entries:
+            if stat.S_ISREG(st.st_mode):
+                yield (self._gen_header(arcname, st), path, st.st_size)
+            else:
+                yield (self._gen_header(arcname, st), None, 0)
+
+    def end_marker(self) -> bytes:
+        return b"\0" * self.block_size * 2
+
+    def padding(self, size: int) -> bytes:
+        return b"\0" * (self._padded_size(size) - size)
+
+    def _add_entry(self, path: str, arcname: str) -> None:
+        st = os.lstat(path)
+
+        # only regular files and directories are exported, links and special files are skipped
+        if not stat.S_ISREG(st.st_mode) and not stat.S_ISDIR(st.st_mode):
+            return
+
+        self._entries.append((path, arcname, st))
+
+    def _gen_header(self, arcname: str, st: os.stat_result) -> bytes:
+        info = tarfile.TarInfo(arcname)
+        info.mtime = int(st.st_mtime)
+        info.mode = stat.S_IMODE(st.st_mode)
+
+        if stat.S_ISREG(st.st_mode):
+            info.size = st.st_size
+        else:
+            info.type = tarfile.DIRTYPE
+
+        return info.tobuf(format=tarfile.PAX_FORMAT)
+
+    def _padded_size(self, size: int) -> int:
+        return -(-size // self.block_size) * self.block_size
@@ -43,6 +43,8 @@ class McServerWebadminManager:
 
         setup_di(self._di, config=self._load_config(file=config_file), data_directory=self._data_directory)
 
+        self._cleanup.push("http_client_close", self._di.http_client.aclose)
+
     def run(self, **kwargs) -> None:
         command = kwargs.get("command")
         subcommand = kwargs.get("subcommand")
@@ -232,6 +234,9 @@ class McServerWebadminManager:
         tasks.append(asyncio.create_task(self._async_run_webserver(), name="web_server"))
         tasks.append(asyncio.create_task(self._async_run_mc_server_runner(), name="mc_server_runner"))
 
+        if self._di.mc_server_config.get("prefetch_versions"):
+            tasks.append(asyncio.create_task(self._async_run_mc_server_prefetcher(), name="mc_server_prefetcher"))
+
         (done, pending) = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
 
         logger.info("Task(s) exited")
@@ -248,7 +253,7 @@ class McServerWebadminManager:
         logger.info("Starting webserver")
 
         server = web.Application(
-            client_max_size=1024**3, # 1GB max upload size
+            client_max_size=self._di.web_server_config.get("max_upload_size") * 1024**2,
         )
 
         server["di"] = self._di
@@ -278,6 +283,9 @@ class McServerWebadminManager:
     async def _async_run_mc_server_runner(self):
         await self._di.mc_server_runner.run()
 
+    async def _async_run_mc_server_prefetcher(self):
+        await self._di.mc_server_inst_mgr.run_prefetcher()
+
     async def _init_db(self):
         db_path = os.path.join(self._data_directory, "app.db")
 
@@ -0,0 +1,26 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "mod_metadata" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "sha256" VARCHAR(64) NOT NULL UNIQUE,
+    "mod_id" VARCHAR(255) NOT NULL,
+    "name" VARCHAR(255) NOT NULL,
+    "version" VARCHAR(100) NOT NULL,
+    "loader" VARCHAR(50) NOT NULL,
+    "mc_versions" VARCHAR(255) NOT NULL,
+    "mods" JSON NOT NULL,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_mod_metadat_mod_id_dcdfb4" ON "mod_metadata" ("mod_id");
+ALTER TABLE "instance_mods" ADD "sha256" VARCHAR(64);
+CREATE INDEX IF NOT EXISTS "idx_instance_mo_sha256_d58ef6" ON "instance_mods" ("sha256");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_instance_mo_sha256_d58ef6";
+        ALTER TABLE "instance_mods" DROP COLUMN "sha256";
+        DROP TABLE IF EXISTS "mod_metadata";"""
@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "instance_datapacks" ADD "pack_format" INT;
+        ALTER TABLE "instance_datapacks" ADD "supported_formats" JSON;
+        ALTER TABLE "instance_datapacks" ADD "description" VARCHAR(255);
+        ALTER TABLE "instance_datapacks" ADD "namespaces" JSON;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "instance_datapacks" DROP COLUMN "pack_format";
+        ALTER TABLE "instance_datapacks" DROP COLUMN "supported_formats";
+        ALTER TABLE "instance_datapacks" DROP COLUMN "description";
+        ALTER TABLE "instance_datapacks" DROP COLUMN "namespaces";"""
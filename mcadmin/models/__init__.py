@@ -5,6 +5,7 @@ from .global_properties import GlobalProperties
 from .instance_backups import InstanceBackups
 from .instance_datapacks import InstanceDatapacks
 from .instance_mods import InstanceMods
+from .mod_metadata import ModMetadata
 from .app_config import AppConfig
 from .oidc_providers import OIDCProviders
 from .user_identities import UserIdentities
@@ -17,6 +18,7 @@ __all__ = [
     "InstanceBackups",
     "InstanceDatapacks",
     "InstanceMods",
+    "ModMetadata",
     "AppConfig",
     "OIDCProviders",
     "UserIdentities",
@@ -5,6 +5,10 @@ class InstanceDatapacks(models.Model):
     instance_id = fields.IntField(index=True)
     name = fields.CharField(max_length=255)
     enabled = fields.BooleanField(default=True)
+    pack_format = fields.IntField(null=True)
+    supported_formats = fields.JSONField(null=True)
+    description = fields.CharField(max_length=255, null=True)
+    namespaces = fields.JSONField(null=True)
     added_at = fields.DatetimeField(auto_now_add=True)
     modified_at = fields.DatetimeField(auto_now=True)
 
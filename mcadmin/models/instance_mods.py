@@ -4,6 +4,7 @@ class InstanceMods(models.Model):
     id = fields.IntField(pk=True)
     instance_id = fields.IntField(index=True)
     name = fields.CharField(max_length=255)
+    sha256 = fields.CharField(max_length=64, null=True, index=True)
     enabled = fields.BooleanField(default=True)
     added_at = fields.DatetimeField(auto_now_add=True)
     modified_at = fields.DatetimeField(auto_now=True)
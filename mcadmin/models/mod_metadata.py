@@ -0,0 +1,18 @@
+from tortoise import fields, models
+
+class ModMetadata(models.Model):
+    id = fields.IntField(pk=True)
+    sha256 = fields.CharField(max_length=64, unique=True)
+    mod_id = fields.CharField(max_length=255, index=True)
+    name = fields.CharField(max_length=255)
+    version = fields.CharField(max_length=100)
+    loader = fields.CharField(max_length=50)
+    mc_versions = fields.CharField(max_length=255)
+    mods = fields.JSONField(default=list)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "mod_metadata"
+
+    def __str__(self):
+        return str(self.id)
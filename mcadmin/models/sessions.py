@@ -10,7 +10,7 @@ class Sessions(models.Model):
     data = fields.TextField()
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
-    expiry = fields.DatetimeField(null=True)
+    expiry = fields.DatetimeField(null=True, index=True)
 
     class Meta:
         table = "sessions"
@@ -6,6 +6,7 @@ from ipaddress import ip_address
 
 class McServerConfigSchema(BaseSettings):
     java_bin: Optional[str] = None
+    java_runtime_source: Optional[str] = None
     java_min_memory: str = Field(default="1024M", min_length=1)
     java_max_memory: str = Field(default="1024M", min_length=1)
     server_additional_args: Optional[list[str]] = []
@@ -15,6 +16,19 @@ class McServerConfigSchema(BaseSettings):
     display_ip: Optional[IPvAnyAddress] = None
     display_host: Optional[str] = None
     display_port: Optional[int] = Field(default=None, ge=0, le=65535)
+    backup_format: str = Field(default="dir", pattern=r"^(dir|archive)$")
+    backup_compression_level: int = Field(default=3, ge=1, le=22)
+    backup_compression_threads: int = Field(default=0, ge=0)
+    backup_bwlimit: int = Field(default=0, ge=0)
+    backup_idle_io: bool = True
+    world_import_max_size: int = Field(default=65536, ge=1)
+    world_import_max_entries: int = Field(default=1000000, ge=1)
+    world_import_workers: int = Field(default=4, ge=1)
+    catalog_cache_ttl: int = Field(default=3600, ge=0)
+    catalog_offline: bool = False
+    versions_mirror_dir: Optional[str] = None
+    prefetch_versions: int = Field(default=0, ge=0)
+    prefetch_interval: int = Field(default=21600, ge=60)
 
     model_config = SettingsConfigDict(env_prefix="MCADMIN_")
 
@@ -24,6 +38,8 @@ class McServerConfigSchema(BaseSettings):
         display_ip = values.get("display_ip")
         display_host = values.get("display_host")
         display_port = values.get("display_port")
+        versions_mirror_dir = values.get("versions_mirror_dir")
+        java_runtime_source = values.get("java_runtime_source")
 
         if isinstance(additional_args, str):
             values["server_additional_args"] = [arg.strip() for arg in additional_args.split(",") if arg.strip()]
@@ -37,6 +53,12 @@ class McServerConfigSchema(BaseSettings):
         if not display_port:
             values["display_port"] = None
 
+        if not versions_mirror_dir:
+            values["versions_mirror_dir"] = None
+
+        if not java_runtime_source:
+            values["java_runtime_source"] = None
+
         return values
 
 
@@ -45,6 +67,11 @@ class WebServerConfigSchema(BaseSettings):
     port: int = Field(default=8000, ge=0, le=65535)
     trusted_proxies: Optional[list[IPvAnyAddress | IPvAnyNetwork]] = []
     base_url: str = Field(default="/")
+    max_upload_size: int = Field(default=1024, ge=1)
+    max_world_upload_size: int = Field(default=16384, ge=1)
+    session_cache_size: int = Field(default=1024, ge=0)
+    session_cache_ttl: int = Field(default=60, ge=0)
+    session_flush_interval: int = Field(default=60, ge=0)
 
     model_config = SettingsConfigDict(env_prefix="MCADMIN_WEB_")
 
@@ -1,16 +1,17 @@
 import re
-from pydantic import BaseModel, Field, field_validator
-from aiohttp import web
-from typing import Any, Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional
 
 server_version_pattern = r"^(?:\d+\.\d+(?:\.\d+)?(?:-(?:pre|rc)\d+)?|\d{2}w\d{2}[a-z])$"
-zip_signatures = [b'PK\x03\x04', b'PK\x05\x06', b'PK\x07\x08']
+world_archive_exts = (".zip", ".tar.gz", ".tgz", ".tar.zst")
+# chunks per axis of a partial restore (4 regions)
+max_chunk_span = 128
 
 
 class CreateInstanceSchema(BaseModel):
     name: str = Field(title="Instance Name", max_length=30)
     server_version: str = Field(title="Server Version")
-    world_archive: Optional[Any] = None
+    world_archive: Optional[str] = Field(default=None, title="World archive")
 
     @field_validator("server_version")
     @classmethod
@@ -22,17 +23,21 @@ class CreateInstanceSchema(BaseModel):
     @field_validator("world_archive")
     @classmethod
     def check_world_archive(cls, v):
-        if not v:
-            return v
-        
-        if not isinstance(v, web.FileField):
-            raise ValueError("World archive must be a file")
-        elif not v.filename.endswith(".zip"):
-            raise ValueError("World archive must be a .zip file")
-        elif not any(v.file.read(len(sig)) == sig for sig in zip_signatures):
-            raise ValueError("World archive is not a valid zip file")
-        v.file.seek(0)
-        
+        if v and not v.endswith(world_archive_exts):
+            raise ValueError("World archive must be a .zip, .tar.gz or .tar.zst file")
+
+        return v
+
+class CreateWorldUploadSchema(BaseModel):
+    filename: str = Field(title="Filename")
+    size: int = Field(title="Size", gt=0)
+
+    @field_validator("filename")
+    @classmethod
+    def check_filename(cls, v):
+        if not v.endswith(world_archive_exts):
+            raise ValueError("World archive must be a .zip, .tar.gz or .tar.zst file")
+
         return v
 
 class UpdateInstanceSchema(BaseModel):
@@ -48,30 +53,50 @@ class UpdateInstanceSchema(BaseModel):
 
 
 class AddInstanceDatapackSchema(BaseModel):
-    datapack_archive: Any
+    datapack_archive: str = Field(title="Datapack archive")
 
     @field_validator("datapack_archive")
     @classmethod
     def check_datapack_archive(cls, v):
-        if not isinstance(v, web.FileField):
-            raise ValueError("Datapack archive must be a file")
-        elif not v.filename.endswith(".zip"):
+        if not v.endswith(".zip"):
             raise ValueError("Datapack archive must be a .zip file")
-        elif not any(v.file.read(len(sig)) == sig for sig in zip_signatures):
-            raise ValueError("Datapack archive is not a valid zip file")
-        v.file.seek(0)
 
         return v
 
 class AddInstanceModSchema(BaseModel):
-    mod_jar: Any
+    mod_jar: str = Field(title="Mod jar")
 
     @field_validator("mod_jar")
     @classmethod
     def check_mod_jar(cls, v):
-        if not isinstance(v, web.FileField):
-            raise ValueError("Mod jar must be a file")
-        elif not v.filename.endswith(".jar"):
+        if not v.endswith(".jar"):
             raise ValueError("Mod jar must be a .jar file")
 
         return v
+
+
+class RestoreBackupPartialSchema(BaseModel):
+    paths: Optional[str] = Field(default=None, title="Paths")
+    dimension: Optional[str] = Field(default=None, title="Dimension")
+    chunk_from: Optional[str] = Field(default=None, title="From Chunk")
+    chunk_to: Optional[str] = Field(default=None, title="To Chunk")
+
+    @field_validator("chunk_from", "chunk_to")
+    @classmethod
+    def check_chunk(cls, v):
+        if v and not re.match(r"^-?\d+,\s*-?\d+$", v):
+            raise ValueError("Chunk must have the format 'x,z'")
+        return v
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if not self.paths and not (self.dimension and self.chunk_from and self.chunk_to):
+            raise ValueError("Select paths or a dimension and chunk range to restore")
+
+        if self.chunk_from and self.chunk_to:
+            chunk_from = [int(c) for c in self.chunk_from.split(",")]
+            chunk_to = [int(c) for c in self.chunk_to.split(",")]
+
+            if any(abs(t - f) >= max_chunk_span for f, t in zip(chunk_from, chunk_to)):
+                raise ValueError(f"Chunk range can't span more than {max_chunk_span} chunks per axis")
+        return self
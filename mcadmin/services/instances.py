@@ -1,13 +1,16 @@
 import asyncio
-from typing import BinaryIO
+import contextlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from tortoise.transactions import in_transaction
 from mcadmin.models.instances import Instances
 from mcadmin.models.global_properties import GlobalProperties
 from mcadmin.models.instance_backups import InstanceBackups
 from mcadmin.models.instance_datapacks import InstanceDatapacks
 from mcadmin.models.instance_mods import InstanceMods
+from mcadmin.models.mod_metadata import ModMetadata
 from mcadmin.services.server import ServerService
-from mcadmin.libraries.mc_server import McServerRunner, McServerInstMgr
+from mcadmin.libraries.mc_server import McServerRunner, McServerInstMgr, McServerUpload, McServerUploadSession, McServerModError
 
 
 class InstancesService:
@@ -25,7 +28,16 @@ class InstancesService:
 
         self._log_subscribers: list[asyncio.Queue] = []
 
-    async def create_instance(self, *, world_archive: BinaryIO | None = None, **kwargs) -> Instances:
+    def create_world_upload(self, *, max_size: int = 0) -> McServerUpload:
+        return self._mc_server_inst_mgr.create_world_upload(max_size=max_size)
+
+    async def create_upload_session(self, *, filename: str, size: int, max_size: int = 0) -> McServerUploadSession:
+        return await self._mc_server_inst_mgr.create_upload_session(filename=filename, size=size, max_size=max_size)
+
+    async def get_upload_session(self, session_id: str) -> McServerUploadSession:
+        return await self._mc_server_inst_mgr.get_upload_session(session_id)
+
+    async def create_instance(self, *, world_upload: McServerUpload | McServerUploadSession | None = None, **kwargs) -> Instances:
         await self._mc_server_inst_mgr.download_version(kwargs["server_type"], kwargs["server_version"])
 
         async with in_transaction():
@@ -35,7 +47,7 @@ class InstancesService:
 
             await self._mc_server_inst_mgr.create_instance(
                 instance_name,
-                world_archive=world_archive,
+                world_archive=world_upload.path if world_upload else None,
                 server_type=instance.server_type,
                 server_version=instance.server_version,
             )
@@ -99,25 +111,47 @@ class InstancesService:
     async def get_property(self, key: str) -> GlobalProperties | None:
         return await GlobalProperties.get_or_none(key=key)
 
-    async def set_properties(self, properties: dict) -> None:
+    async def set_properties(self, properties: dict, *, restart: str = "now") -> str:
+        """Save the global properties and apply them to the running server: live through console commands when
+        possible, otherwise with a restart (right away, or once no players are online). Returns how they were applied"""
         server_status = self._server_service.get_server_status()
         active_instance = await Instances.get_or_none(active=True)
-
-        if server_status == "running":
-            await self._server_service.stop_server()
+        changed = {}
 
         async with in_transaction():
+            previous = await self.get_joined_properties(active_instance) if active_instance else {}
+
             for key, value in properties.items():
                 await GlobalProperties.update_or_create(key=key, defaults={"value": value})
 
             if active_instance:
                 instance = str(active_instance.id)
                 properties = await self.get_joined_properties(active_instance)
+                changed = {key: value for key, value in properties.items() if previous.get(key) != value}
 
-                await self._mc_server_inst_mgr.gen_properties(instance, properties=properties)
+                # an identical file means the server already runs with these properties
+                if not await self._mc_server_inst_mgr.gen_properties(instance, properties=properties):
+                    changed = {}
 
-        if server_status == "running":
-            await self._server_service.start_server()
+        if server_status != "running" or not changed:
+            return "saved"
+
+        (commands, restart_keys) = self._mc_server_inst_mgr.classify_properties(changed, server_version=active_instance.server_version)
+
+        # a restart applies everything anyway
+        if not restart_keys:
+            restart_keys = await self._apply_property_commands(commands)
+
+        if not restart_keys:
+            return "applied"
+
+        if restart == "idle":
+            self._server_service.restart_when_idle()
+            return "restart_pending"
+
+        await self._server_service.restart_server()
+
+        return "restarted"
 
     async def set_property(self, key: str, value: str) -> None:
         await GlobalProperties.update_or_create(key=key, defaults={"value": value})
@@ -133,6 +167,15 @@ class InstancesService:
 
     async def create_backup(self, instance: Instances, backup_type: str) -> InstanceBackups:
         metadata = await self._gen_backup_metadata(instance)
+        server_status = self._server_service.get_server_status()
+
+        # take a consistent snapshot of a running world without stopping the server
+        if instance.active and server_status == "running":
+            saves_suspended = self._server_service.saves_suspended()
+            lag_probe = self._mc_server_runner.get_last_lag_time
+        else:
+            saves_suspended = contextlib.nullcontext(True)
+            lag_probe = None
 
         async with in_transaction():
             backup = await InstanceBackups.create(instance_id=instance.id, type=backup_type, metadata=metadata)
@@ -140,7 +183,11 @@ class InstancesService:
             instance_name = str(instance.id)
             backup_name = str(backup.id)
 
-            await self._mc_server_inst_mgr.create_backup(instance_name, backup_name)
+            async with saves_suspended as consistent:
+                stats = await self._mc_server_inst_mgr.create_backup(instance_name, backup_name, lag_probe=lag_probe, consistent=consistent)
+
+            backup.metadata = {**metadata, "stats": stats, "consistent": consistent}
+            await backup.save()
 
         return backup
 
@@ -170,6 +217,72 @@ class InstancesService:
         if server_status == "running":
             await self._server_service.start_server()
 
+    async def list_backup_contents(self, instance: Instances, backup: InstanceBackups, *, prefix: str = "") -> list[dict]:
+        if instance.id != backup.instance_id:
+            raise ValueError("Backup does not belong to the specified instance")
+
+        return await self._mc_server_inst_mgr.list_backup_contents(str(instance.id), str(backup.id), prefix=prefix)
+
+    async def restore_backup_partial(
+        self,
+        instance: Instances,
+        backup: InstanceBackups,
+        *,
+        paths: list[str] | None = None,
+        dimension: str = "",
+        chunk_from: tuple[int, int] | None = None,
+        chunk_to: tuple[int, int] | None = None,
+    ) -> None:
+        if instance.id != backup.instance_id:
+            raise ValueError("Backup does not belong to the specified instance")
+
+        server_status = self._server_service.get_server_status()
+
+        # the server would overwrite restored region files with the chunks it holds in memory
+        if instance.active and server_status == "running":
+            await self._server_service.stop_server()
+
+        try:
+            instance_name = str(instance.id)
+            backup_name = str(backup.id)
+
+            if paths:
+                await self._mc_server_inst_mgr.restore_backup_paths(instance_name, backup_name, paths)
+
+            if dimension and chunk_from and chunk_to:
+                await self._mc_server_inst_mgr.restore_backup_chunks(instance_name, backup_name, dimension, chunk_from, chunk_to)
+        finally:
+            if instance.active and server_status == "running":
+                await self._server_service.start_server()
+
+    def get_backup_download(self, instance: Instances, backup: InstanceBackups) -> tuple[str, list[tuple[str, str]]]:
+        """Get either the stored archive path, or the members of a tar to build for a directory backup"""
+        if instance.id != backup.instance_id:
+            raise ValueError("Backup does not belong to the specified instance")
+
+        instance_name = str(instance.id)
+        backup_name = str(backup.id)
+
+        (backup_path, backup_format) = self._mc_server_inst_mgr.get_backup_location(instance_name, backup_name)
+
+        if backup_format == "archive":
+            return (backup_path, [])
+
+        return ("", self._mc_server_inst_mgr.get_export_members(instance_name, backup_name))
+
+    @asynccontextmanager
+    async def export_instance(self, instance: Instances) -> AsyncIterator[list[tuple[str, str]]]:
+        server_status = self._server_service.get_server_status()
+
+        # world saving stays off while the export is streamed, so the exported files are consistent
+        if instance.active and server_status == "running":
+            saves_suspended = self._server_service.saves_suspended()
+        else:
+            saves_suspended = contextlib.nullcontext()
+
+        async with saves_suspended:
+            yield self._mc_server_inst_mgr.get_export_members(str(instance.id))
+
     async def get_backup(self, instance: Instances, backup_id: int) -> InstanceBackups | None:
         return await InstanceBackups.get_or_none(instance_id=instance.id, id=backup_id)
 
@@ -191,14 +304,20 @@ class InstancesService:
     async def get_datapack(self, instance: Instances, datapack_id: int) -> InstanceDatapacks | None:
         return await InstanceDatapacks.get_or_none(instance_id=instance.id, id=datapack_id)
 
-    async def add_datapack(self, instance: Instances, *, datapack_archive: BinaryIO, **kwargs) -> InstanceDatapacks:
+    def create_datapack_upload(self, instance: Instances, *, max_size: int = 0) -> McServerUpload:
+        return self._mc_server_inst_mgr.create_datapack_upload(str(instance.id), max_size=max_size)
+
+    async def add_datapack(self, instance: Instances, *, datapack_upload: McServerUpload, **kwargs) -> InstanceDatapacks:
         async with in_transaction():
             datapack = await InstanceDatapacks.create(instance_id=instance.id, **kwargs)
 
             instance_name = str(instance.id)
             datapack_name = str(datapack.id)
 
-            await self._mc_server_inst_mgr.add_datapack(instance_name, datapack_name, datapack_archive=datapack_archive)
+            metadata = await self._mc_server_inst_mgr.add_datapack(instance_name, datapack_name, datapack_upload=datapack_upload)
+
+            datapack.update_from_dict(metadata)
+            await datapack.save()
 
         return datapack
     
@@ -230,20 +349,39 @@ class InstancesService:
 
             await self._mc_server_inst_mgr.delete_datapack(instance_name, datapack_name)
 
+    async def check_datapacks(self, instance: Instances, datapacks: list[InstanceDatapacks]) -> dict[int, list[str]]:
+        issues = {}
+
+        for datapack in datapacks:
+            try:
+                await self._index_datapack(instance, datapack)
+            except ValueError as e:
+                issues[datapack.id] = [str(e)]
+                continue
+
+            metadata = {"supported_formats": datapack.supported_formats, "pack_format": datapack.pack_format, "namespaces": datapack.namespaces}
+            issues[datapack.id] = self._mc_server_inst_mgr.check_datapack(metadata, server_version=instance.server_version)
+
+        return issues
+
     async def list_mods(self, instance: Instances) -> list[InstanceMods]:
         return await InstanceMods.filter(instance_id=instance.id).order_by("-added_at")
 
     async def get_mod(self, instance: Instances, mod_id: int) -> InstanceMods | None:
         return await InstanceMods.get_or_none(instance_id=instance.id, id=mod_id)
 
-    async def add_mod(self, instance: Instances, *, mod_jar: BinaryIO, **kwargs) -> InstanceMods:
+    def create_mod_upload(self, instance: Instances, *, max_size: int = 0) -> McServerUpload:
+        return self._mc_server_inst_mgr.create_mod_upload(str(instance.id), max_size=max_size)
+
+    async def add_mod(self, instance: Instances, *, mod_upload: McServerUpload, **kwargs) -> InstanceMods:
         async with in_transaction():
-            mod = await InstanceMods.create(instance_id=instance.id, **kwargs)
+            mod = await InstanceMods.create(instance_id=instance.id, sha256=mod_upload.sha256, **kwargs)
 
             instance_name = str(instance.id)
             mod_name = str(mod.id)
 
-            await self._mc_server_inst_mgr.add_mod(instance_name, mod_name, mod_jar=mod_jar)
+            await self._mc_server_inst_mgr.add_mod(instance_name, mod_name, mod_upload=mod_upload)
+            await self._index_mod(instance, mod)
 
         return mod
     
@@ -275,6 +413,23 @@ class InstancesService:
 
             await self._mc_server_inst_mgr.delete_mod(instance_name, mod_name)
 
+    async def get_mods_metadata(self, instance: Instances, mods: list[InstanceMods]) -> dict[str, ModMetadata]:
+        for mod in mods:
+            # a missing or unreadable jar only loses its own metadata
+            with contextlib.suppress(McServerModError, OSError):
+                await self._index_mod(instance, mod)
+
+        return {m.sha256: m for m in await ModMetadata.filter(sha256__in=[mod.sha256 for mod in mods if mod.sha256])}
+
+    async def check_mods(self, instance: Instances) -> list[str]:
+        mods = await InstanceMods.filter(instance_id=instance.id, enabled=True)
+        metadata = await self.get_mods_metadata(instance, mods)
+
+        declared_mods = [m for mod in mods if mod.sha256 in metadata for m in metadata[mod.sha256].mods]
+        unreadable = [f"Mod {mod.name} could not be read" for mod in mods if mod.sha256 not in metadata]
+
+        return unreadable + self._mc_server_inst_mgr.check_mods(declared_mods, server_type=instance.server_type, server_version=instance.server_version)
+
     def get_level_types(self) -> list[str]:
         return self._mc_server_inst_mgr.get_level_types()
 
@@ -312,17 +467,73 @@ class InstancesService:
         if server_status == "running":
             await self._server_service.start_server()
 
+    async def _index_datapack(self, instance: Instances, datapack: InstanceDatapacks) -> None:
+        # datapacks added before the metadata was cached are read on first use
+        if datapack.pack_format is not None:
+            return
+
+        metadata = await self._mc_server_inst_mgr.read_datapack_metadata(str(instance.id), str(datapack.id))
+
+        datapack.update_from_dict(metadata)
+        await datapack.save(update_fields=list(metadata.keys()))
+
+    async def _index_mod(self, instance: Instances, mod: InstanceMods) -> None:
+        instance_name = str(instance.id)
+        mod_name = str(mod.id)
+
+        # mods added before the metadata index existed are hashed on first use
+        if not mod.sha256:
+            mod.sha256 = await self._mc_server_inst_mgr.get_mod_sha256(instance_name, mod_name)
+            await mod.save(update_fields=["sha256"])
+
+        # metadata is keyed by content, so the same jar is only ever parsed once
+        if await ModMetadata.exists(sha256=mod.sha256):
+            return
+
+        mods = await self._mc_server_inst_mgr.read_mod_metadata(instance_name, mod_name)
+        main_mod = mods[0] if mods else {}
+
+        await ModMetadata.get_or_create(
+            sha256=mod.sha256,
+            defaults={
+                "mod_id": main_mod.get("mod_id", ""),
+                "name": main_mod.get("name", ""),
+                "version": main_mod.get("version", ""),
+                "loader": main_mod.get("loader", ""),
+                "mc_versions": main_mod.get("mc_versions", ""),
+                "mods": mods,
+            },
+        )
+
+    async def _apply_property_commands(self, commands: dict[str, str]) -> list[str]:
+        # returns the properties which could not be applied live
+        try:
+            responses = await self._server_service.run_commands(list(commands.values()))
+        except Exception:
+            # RCON unavailable, a restart applies them
+            return list(commands.keys())
+
+        return [key for key, response in zip(commands.keys(), responses) if self._mc_server_inst_mgr.is_command_error(response)]
+
     async def _gen_backup_metadata(self, instance: Instances) -> dict:
         metadata = {}
         datapacks_fields = ["name", "added_at"]
-        mods_fields = ["name", "added_at"]
+        # sha256 keeps restored rows linked to the jars pinned by the backup, without re-hashing them
+        mods_fields = ["name", "added_at", "sha256", "enabled"]
 
         metadata["instance"] = {"server_version": instance.server_version, "server_type": instance.server_type}
         metadata["datapacks"] = [{field: str(getattr(dp, field)) for field in datapacks_fields} for dp in await InstanceDatapacks.filter(instance_id=instance.id)]
-        metadata["mods"] = [{field: str(getattr(mod, field)) for field in mods_fields} for mod in await InstanceMods.filter(instance_id=instance.id)]
+        metadata["mods"] = [{field: self._to_metadata_value(getattr(mod, field)) for field in mods_fields} for mod in await InstanceMods.filter(instance_id=instance.id)]
 
         return metadata
 
+    def _to_metadata_value(self, value):
+        # metadata is stored as JSON, dates are kept as strings
+        if value is None or isinstance(value, (bool, int, str)):
+            return value
+
+        return str(value)
+
     async def _restore_from_metadata(self, instance: Instances, backup: InstanceBackups) -> None:
         metadata = backup.metadata
 
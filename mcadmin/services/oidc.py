@@ -7,7 +7,9 @@ from mcadmin.models.oidc_providers import OIDCProviders
 
 
 class OIDCService:
-    def __init__(self):
+    def __init__(self, *, http_client: httpx.AsyncClient):
+        self._http_client: httpx.AsyncClient = http_client
+
         self._cached_oidc_issuer_meta: dict = {}
 
     async def create_oidc_provider(self, **kwargs) -> OIDCProviders:
@@ -163,18 +165,16 @@ class OIDCService:
         await OIDCProviders.filter(auto_launch=True).exclude(id=oidc_provider.id).update(auto_launch=False)
 
     async def _fetch_oidc_provider_jwks(self, jwks_uri: str) -> dict:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(jwks_uri)
-            response.raise_for_status()
-            return response.json()
+        response = await self._http_client.get(jwks_uri)
+        response.raise_for_status()
+        return response.json()
 
     async def _discover_oidc_provider_meta(self, issuer_url: str) -> dict:
         well_known_url = issuer_url + ".well-known/openid-configuration"
 
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(well_known_url)
-            response.raise_for_status()
-            return response.json()
+        response = await self._http_client.get(well_known_url)
+        response.raise_for_status()
+        return response.json()
 
     def _gen_oidc_client(self, provider_config: dict) -> AsyncOAuth2Client:
         return AsyncOAuth2Client(
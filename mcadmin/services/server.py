@@ -1,9 +1,10 @@
 import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncIterator, Awaitable, Callable
+from tortoise.exceptions import DoesNotExist
 from mcadmin.models.global_properties import GlobalProperties
 from mcadmin.libraries.mc_server import McServerRunner, McServerInstMgr
-from mcadmin.libraries.mc_rcon import MCRcon
+from mcadmin.libraries.mc_rcon import MCRcon, MCRconError
 
 
 class ServerService:
@@ -13,6 +14,10 @@ class ServerService:
 
         self._log_subscribers: list[asyncio.Queue] = []
 
+        # overlapping backups share a single save-off / save-on
+        self._saves_lock: asyncio.Lock = asyncio.Lock()
+        self._saves_suspensions: int = 0
+
     def get_server_status(self) -> str:
         return self._mc_server_runner.get_server_status()
 
@@ -28,6 +33,9 @@ class ServerService:
     async def restart_server(self) -> None:
         await self._mc_server_runner.restart_server()
 
+    def restart_when_idle(self) -> None:
+        self._mc_server_runner.restart_when_idle()
+
     @asynccontextmanager
     async def rcon_connect(self) -> AsyncIterator[Callable[[str], Awaitable[str]]]:
         connect_info = self._mc_server_inst_mgr.get_rcon_connect_info()
@@ -40,5 +48,52 @@ class ServerService:
         finally:
             await conn.disconnect()
 
+    async def run_commands(self, commands: list[str]) -> list[str]:
+        """Run console commands through RCON. Returns their replies"""
+        async with self.rcon_connect() as command:
+            return [await command(cmd) for cmd in commands]
+
+    @asynccontextmanager
+    async def saves_suspended(self, *, timeout: int = 60) -> AsyncIterator[bool]:
+        """Flush all pending chunks to disk and keep world saving disabled for the duration of the context.
+        Yields whether saving could be suspended, the world keeps saving when RCON isn't available"""
+        async with self._saves_lock:
+            try:
+                if not self._saves_suspensions:
+                    await self._suspend_saves(timeout)
+            except (DoesNotExist, MCRconError, OSError, asyncio.TimeoutError):
+                suspended = False
+            else:
+                suspended = True
+                self._saves_suspensions += 1
+
+        try:
+            yield suspended
+        finally:
+            if suspended:
+                async with self._saves_lock:
+                    self._saves_suspensions -= 1
+
+                    # saving is only enabled again once the last overlapping backup is done
+                    if not self._saves_suspensions:
+                        await self.run_commands(["save-on"])
+
+    async def _suspend_saves(self, timeout: int) -> None:
+        async with self.rcon_connect() as command:
+            await command("save-off")
+
+            try:
+                saved = self._mc_server_runner.expect_log("saved")
+                response = await command("save-all flush")
+
+                # newer versions reply once the flush is done, older ones only log it
+                if self._mc_server_runner.match_log("saved", response):
+                    saved.cancel()
+                else:
+                    await asyncio.wait_for(saved, timeout=timeout)
+            except BaseException:
+                await command("save-on")
+                raise
+
     def get_server_connect_info(self) -> dict:
         return self._mc_server_inst_mgr.get_server_connect_info()
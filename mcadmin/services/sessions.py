@@ -1,9 +1,10 @@
 from mcadmin.models.sessions import Sessions
+from mcadmin.libraries.aiohttp_sess_sqlite import SqliteTortoiseStorage
 
 
 class SessionsService:
-    def __init__(self):
-        pass
+    def __init__(self, *, sessions_storage: SqliteTortoiseStorage):
+        self._sessions_storage: SqliteTortoiseStorage = sessions_storage
 
     async def get_user_sessions(self, user_id: int) -> list[Sessions] | None:
         sessions = await Sessions.filter(user_id=user_id).order_by("-created_at")
@@ -12,9 +13,11 @@ class SessionsService:
 
     async def delete_user_session(self, user_id: int, session_id: int) -> None:
         await Sessions.filter(user_id=user_id, id=session_id).delete()
+        self._sessions_storage.invalidate(user_id=user_id, session_id=session_id)
 
     async def delete_all_user_sessions(self, user_id: int) -> None:
         await Sessions.filter(user_id=user_id).delete()
+        self._sessions_storage.invalidate(user_id=user_id)
         
     async def get_user_session(self, user_id: int, session_id: int) -> Sessions | None:
-        return await Sessions.get_or_none(user_id=user_id, id=session_id)
\ No newline at end of file
+        return await Sessions.get_or_none(user_id=user_id, id=session_id)
@@ -3,9 +3,12 @@ import asyncio
 from mcadmin.services.auth_config import AuthConfigService
 from mcadmin.services.oidc import OIDCService
 from mcadmin.utils.hash import hash_str
+from mcadmin.utils.http import create_http_client
 from mcadmin.libraries.mc_server import McServerRunner, McServerInstMgr
 from mcadmin.libraries.di_container import DiContainer
 from mcadmin.libraries.queue_dispatcher import QueueDispatcher
+from mcadmin.libraries.aiohttp_sess_sqlite import SqliteTortoiseStorage
+from mcadmin.models.sessions import Sessions
 from mcadmin.services.users import UsersService
 from mcadmin.services.sessions import SessionsService
 from mcadmin.services.server import ServerService
@@ -54,16 +57,33 @@ def setup_di(deps: DiContainer, *, config: dict, data_directory: str = "") -> No
     deps.base_url = base_url
     # queues
     deps.mc_server_ev_queue = asyncio.Queue()
+    # clients
+    deps.http_client = create_http_client()
 
     # libraries
     deps.mc_server_runner = McServerRunner(os.path.join(data_directory, "mc/current"), deps.mc_server_config, events_queue=deps.mc_server_ev_queue)
-    deps.mc_server_inst_mgr = McServerInstMgr(os.path.join(data_directory, "mc"), deps.mc_server_config)
+    deps.mc_server_inst_mgr = McServerInstMgr(
+        os.path.join(data_directory, "mc"),
+        deps.mc_server_config,
+        http_client=deps.http_client,
+        events_queue=deps.mc_server_ev_queue,
+    )
     deps.mc_server_ev_dispatcher = QueueDispatcher(deps.mc_server_ev_queue)
+    deps.sessions_storage = SqliteTortoiseStorage(
+        Sessions,
+        cookie_name="mc-webadmin-sess",
+        max_age=14 * 24 * 60 * 60,
+        httponly=True,
+        samesite="Lax",
+        cache_size=web_server_config["session_cache_size"],
+        cache_ttl=web_server_config["session_cache_ttl"],
+        flush_interval=web_server_config["session_flush_interval"],
+    )
 
     # services
     deps.users_service = UsersService()
-    deps.sessions_service = SessionsService()
+    deps.sessions_service = SessionsService(sessions_storage=deps.sessions_storage)
     deps.server_service = ServerService(mc_server_runner=deps.mc_server_runner, mc_server_inst_mgr=deps.mc_server_inst_mgr)
     deps.instances_service = InstancesService(server_service=deps.server_service, mc_server_runner=deps.mc_server_runner, mc_server_inst_mgr=deps.mc_server_inst_mgr)
     deps.auth_config_service = AuthConfigService()
-    deps.oidc_service = OIDCService()
+    deps.oidc_service = OIDCService(http_client=deps.http_client)
@@ -3,8 +3,6 @@ import aiohttp_jinja2
 import jinja2
 import aiohttp_session
 from aiohttp import web
-from mcadmin.libraries.aiohttp_sess_sqlite import SqliteTortoiseStorage
-from mcadmin.models.sessions import Sessions
 from mcadmin.middlewares import setup as _setup_middlewares
 from mcadmin.endpoints import setup as _setup_endpoints
 from mcadmin.utils.web import shutdown_websockets
@@ -42,16 +40,7 @@ def _setup_jinja(app: web.Application) -> None:
 
 
 def _setup_sess(app: web.Application) -> None:
-    aiohttp_session.setup(
-        app,
-        SqliteTortoiseStorage(
-            Sessions,
-            cookie_name="mc-webadmin-sess",
-            max_age=14 * 24 * 60 * 60,
-            httponly=True,
-            samesite="Lax",
-        ),
-    )
+    aiohttp_session.setup(app, app["di"].sessions_storage)
 
 
 def _setup_variables(app: web.Application) -> None:
@@ -60,8 +49,11 @@ def _setup_variables(app: web.Application) -> None:
 
 def _setup_on_startup(app: web.Application) -> None:
     app.on_startup.append(lambda x: app["di"].mc_server_ev_dispatcher.start())
+    app.on_startup.append(lambda x: app["di"].sessions_storage.start_gc())
 
 
 def _setup_on_shutdown(app: web.Application) -> None:
     app.on_shutdown.append(shutdown_websockets)
     app.on_shutdown.append(lambda x: app["di"].mc_server_ev_dispatcher.stop())
+    app.on_shutdown.append(lambda x: app["di"].sessions_storage.stop_gc())
+    app.on_shutdown.append(lambda x: app["di"].sessions_storage.flush())
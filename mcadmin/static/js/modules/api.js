@@ -104,6 +104,68 @@
             return this.fetch("instances", "POST", data);
         },
 
+        async uploadWorldArchive(file, on_progress = null) {
+            const chunk_size = 8 * 1024 * 1024;
+            const max_retries = 5;
+            const storage_key = `world-upload:${file.name}:${file.size}:${file.lastModified}`;
+
+            let upload_id = localStorage.getItem(storage_key);
+            let offset = 0;
+
+            // resume a previous upload of the same file, if the server still has it
+            if (upload_id) {
+                try {
+                    offset = (await this.fetch(`world-uploads/${upload_id}`)).offset;
+                } catch (error) {
+                    upload_id = null;
+                }
+            }
+
+            if (!upload_id) {
+                upload_id = (await this.fetch("world-uploads", "POST", { filename: file.name, size: file.size })).upload_id;
+                localStorage.setItem(storage_key, upload_id);
+            }
+
+            let retries = 0;
+
+            while (offset < file.size) {
+                if (on_progress) {
+                    on_progress(offset, file.size);
+                }
+
+                try {
+                    const response = await fetch(`${McServerWebadmin["API_URL"]}world-uploads/${upload_id}`, {
+                        method: "PATCH",
+                        headers: {
+                            "Content-Type": "application/offset+octet-stream",
+                            "Upload-Offset": offset,
+                        },
+                        body: file.slice(offset, offset + chunk_size),
+                    });
+                    const response_data = await response.json();
+
+                    if (response_data.status === "error") {
+                        throw new Error(response_data.message);
+                    }
+
+                    offset = response_data.offset;
+                    retries = 0;
+                } catch (error) {
+                    if (++retries > max_retries) {
+                        throw error;
+                    }
+
+                    await new Promise((resolve) => setTimeout(resolve, 1000 * retries));
+
+                    offset = (await this.fetch(`world-uploads/${upload_id}`)).offset;
+                }
+            }
+
+            localStorage.removeItem(storage_key);
+
+            return upload_id;
+        },
+
         async activateInstance(instance_id) {
             return this.fetch(`instances/${instance_id}/activate`, "POST");
         },
@@ -160,6 +222,10 @@
             return this.fetch(`instances/${instance_id}/mods`);
         },
 
+        async checkInstanceMods(instance_id) {
+            return this.fetch(`instances/${instance_id}/mods/check`);
+        },
+
         async addInstanceMod(instance_id, data) {
             return this.fetch(`instances/${instance_id}/mods`, "POST", data);
         },
@@ -8,6 +8,7 @@
             loaded: false,
             instance_id: null,
             instance_mods: null,
+            mods_issues: [],
             add_mod_modal: null,
             add_mod_form: {},
             adding_mod: false,
@@ -33,6 +34,7 @@
         methods: {
             async fetchInstanceMods() {
                 this.instance_mods = await api.getInstanceMods(this.instance_id);
+                this.mods_issues = (await api.checkInstanceMods(this.instance_id)).issues;
             },
 
             async addMod() {
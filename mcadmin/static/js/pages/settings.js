@@ -16,9 +16,12 @@
             update_instance_form: {},
             update_instance_ref: null,
             creating_instance: false,
+            world_upload_progress: null,
+            world_import_progress: null,
             updating_instance: false,
             updating_server_status: false,
             updating_global_properties: false,
+            defer_properties_restart: false,
             activating_instance: false,
             stats_ws: null,
             stats_ws_unsubscribe: null,
@@ -111,11 +114,39 @@
                 }
             },
 
+            async subscribeToWorldImport() {
+                try {
+                    return await ws.getWebSocket("instances/import").subscribe((ev, data) => {
+                        if (ev == 'message' && data.data.status == 'extracting') {
+                            this.world_import_progress = data.data.progress;
+                        }
+                    });
+                } catch (err) {
+                    return null;
+                }
+            },
+
             async createInstance() {
+                let import_ws_unsubscribe = null;
+
                 try {
                     this.creating_instance = true;
 
-                    const response = await api.createInstance(this.create_instance_form);
+                    const data = { ...this.create_instance_form };
+
+                    // world archives are sent ahead in resumable chunks, only the upload id goes with the form
+                    if (data.world_archive) {
+                        data.world_upload_id = await api.uploadWorldArchive(data.world_archive, (loaded, total) => {
+                            this.world_upload_progress = Math.floor((loaded / total) * 100);
+                        });
+
+                        delete data.world_archive;
+                        this.world_upload_progress = null;
+
+                        import_ws_unsubscribe = await this.subscribeToWorldImport();
+                    }
+
+                    const response = await api.createInstance(data);
 
                     notify.success(response.message);
 
@@ -126,6 +157,12 @@
                     notify.error(`Error creating instance: ${error.message}`);
                 } finally {
                     this.creating_instance = false;
+                    this.world_upload_progress = null;
+                    this.world_import_progress = null;
+
+                    if (import_ws_unsubscribe) {
+                        import_ws_unsubscribe();
+                    }
                 }
             },
 
@@ -198,7 +235,7 @@
                 try {
                     this.updating_global_properties = true;
 
-                    const response = await api.updateGlobalProperties(this.global_properties);
+                    const response = await api.updateGlobalProperties({ ...this.global_properties, restart: this.defer_properties_restart ? "idle" : "now" });
 
                     notify.success(response.message);
 
@@ -0,0 +1,17 @@
+import importlib.util
+import httpx
+
+__all__ = ["create_http_client"]
+
+
+def create_http_client() -> httpx.AsyncClient:
+    # connect failures are retried by the transport, pooled connections are kept alive between requests
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+    http2 = importlib.util.find_spec("h2") is not None
+
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=httpx.Timeout(30, connect=10),
+        transport=httpx.AsyncHTTPTransport(retries=3, limits=limits, http2=http2),
+        http2=http2,
+    )
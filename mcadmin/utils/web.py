@@ -1,9 +1,20 @@
 import asyncio
 from types import SimpleNamespace
-from aiohttp import web
+from typing import AsyncIterator
+from aiohttp import web, BodyPartReader
 from mcadmin.libraries.queue_dispatcher import EventQueue
+from mcadmin.libraries.tar_stream import TarStream
+from mcadmin.libraries.mc_server import McServerUpload
 
-__all__ = ["get_di", "shutdown_websockets", "drain_queue_into_websocket"]
+__all__ = [
+    "get_di",
+    "shutdown_websockets",
+    "drain_queue_into_websocket",
+    "get_max_upload_size",
+    "iter_part_chunks",
+    "read_multipart",
+    "stream_tar_response",
+]
 
 
 async def shutdown_websockets(app: web.Application) -> None:
@@ -31,9 +42,88 @@ def get_di(request: web.Request) -> SimpleNamespace:
     return request.app["di"]
 
 
-def get_filename(file_obj: web.FileField, *, strip_ext: bool = False) -> str:
-    filename = getattr(file_obj, "filename", "unknown")
+def get_max_upload_size(request: web.Request) -> int:
+    return get_di(request).web_server_config["max_upload_size"] * 1024 * 1024
+
+
+def get_filename(file_obj: web.FileField | str, *, strip_ext: bool = False) -> str:
+    filename = file_obj if isinstance(file_obj, str) else getattr(file_obj, "filename", "unknown")
 
     if strip_ext:
         filename = filename.rsplit(".", 1)[0]
     return filename
+
+
+async def iter_part_chunks(part: BodyPartReader, *, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """Read a multipart part in fixed size chunks, without buffering the whole body"""
+    while chunk := await part.read_chunk(chunk_size):
+        yield chunk
+
+
+async def read_multipart(request: web.Request, uploads: dict[str, McServerUpload]) -> dict[str, str]:
+    """Read a multipart body, streaming the file parts into their upload receivers. File fields are returned as their filename"""
+    data = {}
+    reader = await request.multipart()
+
+    async for part in reader:
+        if not isinstance(part, BodyPartReader) or not part.name:
+            continue
+
+        if part.name not in uploads:
+            data[part.name] = await part.text()
+            continue
+
+        # empty file inputs are still sent, with no filename
+        if not part.filename:
+            continue
+
+        await uploads[part.name].receive(iter_part_chunks(part))
+        data[part.name] = part.filename
+
+    return data
+
+
+async def stream_tar_response(request: web.Request, tar_stream: TarStream, *, filename: str, chunk_size: int = 1024 * 1024) -> web.StreamResponse:
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "application/x-tar",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+    )
+
+    response.content_length = await asyncio.to_thread(tar_stream.prepare)
+
+    await response.prepare(request)
+
+    loop = asyncio.get_running_loop()
+
+    for header, path, size in tar_stream:
+        await response.write(header)
+
+        if path is None:
+            continue
+
+        transport = request.transport
+
+        if transport is None or transport.is_closing():
+            raise ConnectionResetError("Connection lost")
+
+        # file data goes straight from the page cache to the socket, same as web.FileResponse
+        try:
+            with open(path, "rb") as f:
+                sent = await loop.sendfile(transport, f, 0, size)
+        except FileNotFoundError:
+            sent = 0
+
+        # the file shrunk or vanished since it was scanned, keep the announced member size
+        while sent < size:
+            fill = min(chunk_size, size - sent)
+            await response.write(b"\0" * fill)
+            sent += fill
+
+        await response.write(tar_stream.padding(size))
+
+    await response.write(tar_stream.end_marker())
+    await response.write_eof()
+
+    return response